@@ -1,22 +1,173 @@
 from rest_framework import generics, permissions, status, viewsets
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from .models import Notification, Post, Save_Post, Reacts, Share, Comment, Profile, User
-from .serializer import NotificationSerializer, PostListSerializer, ProfileSerializer, CommentSerializer
-from .mixins import NotificationMixin
+from rest_framework.parsers import MultiPartParser, FormParser
+from .models import Notification, Post, Save_Post, Reacts, Share, Comment, Profile, User, UploadSession
+from .serializer import (
+    NotificationSerializer,
+    PostListSerializer,
+    ProfileSerializer,
+    CommentSerializer,
+    UploadSessionSerializer,
+    sparse_fieldset
+)
+from .db_routing import replica_reads
+from .feed import POST_COLUMNS, FeedSerializer, fast_feed_enabled, feed_rows
+from .mixins import NotificationMixin, StreamingUploadMixin
+from .renderers import FastJSONParser
+from .timelines import fan_out_post, follow, timeline_page, unfollow
+from .uploads import (
+    UploadRejected,
+    chunk_max_size,
+    parse_content_range,
+    post_image_max_size,
+    profile_image_max_size,
+    write_chunk
+)
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.utils.urls import replace_query_param
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+import base64
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+class KeysetPagination(BasePagination):
+    """
+    Pages through a queryset newest first by (created_at, id).
+
+    Each page continues strictly after the last row of the previous one, so
+    deep pages cost the same as the first one and rows inserted meanwhile
+    never shift or repeat items. The position is passed as an opaque
+    ``cursor`` query parameter.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created_at, _, pk = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').partition('|')
+            position = (parse_datetime(created_at), int(pk))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, created_at, pk):
+        return base64.urlsafe_b64encode(f'{created_at.isoformat()}|{pk}'.encode('ascii')).decode('ascii')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        if position is not None:
+            created_at, pk = position
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+            )
+        rows = list(queryset.order_by('-created_at', '-pk')[:page_size + 1])
+        self.next_position = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            self.next_position = (last.created_at, last.pk)
+        return rows
+
+    def paginate_positions(self, fetch, request):
+        """
+        Paginate a source that yields (created_at, id) positions itself.
+
+        ``fetch(before, limit)`` must return up to ``limit`` positions older
+        than ``before``, newest first.
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        positions = fetch(self.decode_cursor(request), page_size + 1)
+        self.next_position = positions[page_size - 1] if len(positions) > page_size else None
+        return positions[:page_size]
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(*self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data
+        })
+
+def feed_queryset(fields=None, exclude=None):
+    """
+    Posts with the related rows the feed serializer reads, fetched in bulk.
+
+    Given a sparse fieldset, only the relations of the selected fields are
+    prefetched.
+    """
+    return Post.objects.all()\
+        .select_related('author')\
+        .prefetch_related(*PostListSerializer.related_lookups(fields, exclude))
+
+def serialize_feed_posts(post_ids, request, sparse):
+    """Feed items for the given posts, in the given order"""
+    if fast_feed_enabled():
+        return FeedSerializer(feed_rows(post_ids), {'request': request}, **sparse).data
+    posts = feed_queryset(**sparse).in_bulk(post_ids)
+    return PostListSerializer(
+        [posts[post_id] for post_id in post_ids if post_id in posts],
+        many=True,
+        context={'request': request},
+        **sparse
+    ).data
+
+def split_posts_field(sparse):
+    """
+    Separate the ``posts`` pseudo-field of a profile's sparse fieldset.
+
+    Returns:
+        tuple: (ProfileSerializer kwargs, whether to include the posts)
+    """
+    include_posts = 'posts' in sparse.get('fields', ['posts']) and 'posts' not in sparse.get('exclude', [])
+    profile_kwargs = {param: [name for name in names if name != 'posts'] for param, names in sparse.items()}
+    return profile_kwargs, include_posts
+
+def filter_by_tags(queryset, tags):
+    """Filter posts by a ``tags`` query parameter"""
+    if tags:
+        # Support both single tag and comma-separated tags
+        tag_list = [tag.strip() for tag in tags.split(',') if tag.strip()]
+        if tag_list:
+            queryset = queryset.filter(tags__name__in=tag_list).distinct()
+    return queryset
+
 class PostInteractionViewSet(NotificationMixin, viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
-    parser_classes = (MultiPartParser, FormParser, JSONParser)
+    parser_classes = (MultiPartParser, FormParser, FastJSONParser)
 
     def retrieve(self, request, pk=None):
         """Handle GET requests"""
@@ -133,33 +284,36 @@ class PostInteractionViewSet(NotificationMixin, viewsets.ViewSet):
             status=status.HTTP_200_OK
         )
 
-class PostListApi(NotificationMixin, generics.ListCreateAPIView):
+class PostListApi(NotificationMixin, StreamingUploadMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
-    parser_classes = (MultiPartParser, FormParser, JSONParser)
+    parser_classes = (MultiPartParser, FormParser, FastJSONParser)
     serializer_class = PostListSerializer
     pagination_class = StandardResultsSetPagination
 
+    def get_upload_limits(self):
+        return {'image': post_image_max_size()}
+
     def get_queryset(self):
-        queryset = Post.objects.all()\
-            .select_related('author')\
-            .prefetch_related('post_comment', 'post_react', 'post_share', 'post_save')\
-            .order_by('-created_at')
-        
-        # Filter by tags if provided
-        tags = self.request.query_params.get('tags', None)
-        if tags:
-            # Support both single tag and comma-separated tags
-            tag_list = [tag.strip() for tag in tags.split(',') if tag.strip()]
-            if tag_list:
-                queryset = queryset.filter(tags__name__in=tag_list).distinct()
-        
-        return queryset
+        queryset = feed_queryset(**sparse_fieldset(self.request)).order_by('-created_at')
+        return filter_by_tags(queryset, self.request.query_params.get('tags', None))
+
+    def get_serializer(self, *args, **kwargs):
+        return super().get_serializer(*args, **kwargs, **sparse_fieldset(self.request))
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        fan_out_post(post)
 
+    @replica_reads
     def list(self, request, *args, **kwargs):
-        response = super().list(request, *args, **kwargs)
+        if fast_feed_enabled():
+            sparse = sparse_fieldset(request)
+            queryset = filter_by_tags(Post.objects.order_by('-created_at'), request.query_params.get('tags', None))
+            page = self.paginate_queryset(queryset.values(*POST_COLUMNS))
+            data = FeedSerializer(page, self.get_serializer_context(), **sparse).data
+            response = self.get_paginated_response(data)
+        else:
+            response = super().list(request, *args, **kwargs)
         if not isinstance(response.data, dict):
             response.data = {
                 'posts': response.data
@@ -168,13 +322,14 @@ class PostListApi(NotificationMixin, generics.ListCreateAPIView):
 
 class PostDetailApi(NotificationMixin, viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
-    parser_classes = (MultiPartParser, FormParser, JSONParser)
+    parser_classes = (MultiPartParser, FormParser, FastJSONParser)
     serializer_class = PostListSerializer
 
     def retrieve(self, request, pk=None):
         try:
-            post = Post.objects.get(id=pk)
-            serializer = PostListSerializer(post, context={'request': request})
+            sparse = sparse_fieldset(request)
+            post = feed_queryset(**sparse).get(id=pk)
+            serializer = PostListSerializer(post, context={'request': request}, **sparse)
             return Response({
                 'post': serializer.data
             })
@@ -186,54 +341,105 @@ class PostDetailApi(NotificationMixin, viewsets.ViewSet):
 
 class PostSavedListApi(NotificationMixin, viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
-    parser_classes = (MultiPartParser, FormParser, JSONParser)
+    parser_classes = (MultiPartParser, FormParser, FastJSONParser)
     serializer_class = PostListSerializer
 
+    pagination_class = KeysetPagination
+
+    @replica_reads
     def list(self, request):
-        user = request.user
+        """Posts saved by the current user, most recently saved first"""
         try:
-            if hasattr(user, 'user_save'):
-                saved_posts = user.user_save.all()
-                posts = Post.objects.filter(post_save__in=saved_posts).order_by('-created_at')
-                serializer = PostListSerializer(posts, many=True, context={'request': request})
-                return Response({
-                    'saved_posts': serializer.data
-                })
-            else:
-                return Response({
-                    'saved_posts': []
-                })
+            paginator = self.pagination_class()
+            saves = paginator.paginate_queryset(
+                Save_Post.objects.filter(user=request.user).only('id', 'post_id', 'created_at'),
+                request
+            )
+            post_ids = [save.post_id for save in saves]
+            return Response({
+                'saved_posts': serialize_feed_posts(post_ids, request, sparse_fieldset(request)),
+                'next': paginator.get_next_link()
+            })
+        except (NotFound, ValidationError):
+            raise
         except Exception as e:
             return Response({
                 'error': str(e),
                 'saved_posts': []
             })
 
+class HomeTimelineApi(NotificationMixin, APIView):
+    """Posts from the users the current user follows, newest first"""
+    permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get(self, request):
+        paginator = self.pagination_class()
+        positions = paginator.paginate_positions(
+            lambda before, limit: timeline_page(request.user, before, limit),
+            request
+        )
+        post_ids = [post_id for _, post_id in positions]
+        return Response({
+            'posts': serialize_feed_posts(post_ids, request, sparse_fieldset(request)),
+            'next': paginator.get_next_link()
+        })
+
+class FollowApi(NotificationMixin, APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get_followee(self, username):
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            return None
+
+    def post(self, request, username):
+        """Follow a user"""
+        followee = self.get_followee(username)
+        if followee is None:
+            return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+        if followee == request.user:
+            return Response({'error': 'You cannot follow yourself'}, status=status.HTTP_400_BAD_REQUEST)
+        created = follow(request.user, followee)
+        followee.refresh_from_db(fields=['followers_count'])
+        return Response(
+            {'following': True, 'followers_count': followee.followers_count},
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+    def delete(self, request, username):
+        """Unfollow a user"""
+        followee = self.get_followee(username)
+        if followee is None:
+            return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+        unfollow(request.user, followee)
+        followee.refresh_from_db(fields=['followers_count'])
+        return Response({'following': False, 'followers_count': followee.followers_count})
+
 class ProfileListApi(NotificationMixin, APIView):
     permission_classes = [IsAuthenticated]
-    parser_classes = (MultiPartParser, FormParser, JSONParser)
+    parser_classes = (MultiPartParser, FormParser, FastJSONParser)
 
+    @replica_reads
     def get(self, request, username):
         try:
             user = User.objects.get(username=username)
             profile = user.user_profile
+            profile_kwargs, include_posts = split_posts_field(sparse_fieldset(request))
 
             # Serialize profile data
-            profile_serializer = ProfileSerializer(profile)
-
-            # Get user posts
-            user_posts = Post.objects.filter(author=user).order_by('-created_at')
-            posts_data = PostListSerializer(
-                user_posts,
-                many=True,
-                context={'request': request}
-            ).data
-
-            # Combine all data
+            profile_serializer = ProfileSerializer(profile, **profile_kwargs)
             response_data = profile_serializer.data
-            response_data.update({
-                'posts': posts_data,
-            })
+
+            # Get user posts; the sparse fieldset selects profile fields, so posts are complete
+            if include_posts:
+                user_posts = feed_queryset().filter(author=user).order_by('-created_at')
+                response_data['posts'] = PostListSerializer(
+                    user_posts,
+                    many=True,
+                    context={'request': request}
+                ).data
 
             return Response(response_data)
 
@@ -252,51 +458,131 @@ class ProfileListApi(NotificationMixin, APIView):
 
 class NotificationAPI(NotificationMixin, viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
-    parser_classes = (MultiPartParser, FormParser, JSONParser)
+    parser_classes = (MultiPartParser, FormParser, FastJSONParser)
     serializer_class = NotificationSerializer
 
+    @replica_reads
     def list(self, request):
         """Get all unread notifications for current user"""
+        sparse = sparse_fieldset(request)
         notifications = Notification.objects.filter(
             user=request.user,
             is_read=False
-        ).select_related('sender', 'sender__user_profile', 'post')
+        )
+        lookups = NotificationSerializer.related_lookups(**sparse)
+        if lookups:
+            notifications = notifications.select_related(*lookups)
         
         serializer = NotificationSerializer(
             notifications, 
             many=True, 
-            context={'request': request}
+            context={'request': request},
+            **sparse
         )
         return Response(serializer.data)
 
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
         """Mark specific notification as read"""
-        try:
-            notification = Notification.objects.select_for_update().get(
-                id=pk,
-                user=request.user
-            )
-            notification.delete()
-            return Response(status=status.HTTP_200_OK)
-        except Notification.DoesNotExist:
+        updated = Notification.objects.filter(id=pk, user=request.user).update(is_read=True)
+        if not updated:
             return Response(
                 {"error": "Notification not found"},
                 status=status.HTTP_404_NOT_FOUND
             )
+        return Response(status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'])
-    def mark_all_read(self, request):
-        """Mark all notifications as read"""
-        Notification.objects.filter(
+    def mark_many_read(self, request):
+        """Mark the notifications listed in ``ids`` as read with one UPDATE"""
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            return Response(
+                {'error': 'ids must be a list of notification IDs'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        updated = Notification.objects.filter(
             user=request.user,
+            id__in=ids,
             is_read=False
-        ).select_for_update().delete()
-        return Response(status=status.HTTP_200_OK)
+        ).update(is_read=True)
+        return Response({'updated': updated})
+
+    @action(detail=False, methods=['post'])
+    def mark_all_read(self, request):
+        """
+        Mark all notifications up to a high-water mark as read.
+
+        ``up_to`` is the ``created_at`` of the newest notification the client
+        has seen; notifications created or revived after it stay unread. An
+        aggregate that gains an actor keeps its ID but moves to a new
+        ``created_at``, so the mark is a time, not an ID. Without it,
+        everything up to the time of the request is marked.
+        """
+        up_to = request.data.get('up_to')
+        notifications = Notification.objects.filter(user=request.user, is_read=False)
+        if up_to is not None:
+            try:
+                seen_at = parse_datetime(up_to)
+            except (TypeError, ValueError):
+                seen_at = None
+            if seen_at is None:
+                return Response(
+                    {'error': 'up_to must be an ISO 8601 timestamp'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if timezone.is_naive(seen_at):
+                seen_at = timezone.make_aware(seen_at)
+            notifications = notifications.filter(created_at__lte=seen_at)
+        updated = notifications.update(is_read=True)
+        return Response({'updated': updated}, status=status.HTTP_200_OK)
 
-class CreateProfileApi(APIView):
-    parser_classes = (MultiPartParser, FormParser, JSONParser)
+class NotificationInboxApi(APIView):
+    """
+    Keyset-paginated notification inbox.
+
+    ``status`` selects unread (default) or read notifications; either way a
+    page is one range scan over the (user, is_read, -created_at) index, so
+    a long read history does not slow down the unread listing.
+    """
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get(self, request):
+        read_status = request.query_params.get('status', 'unread')
+        if read_status not in ('unread', 'read'):
+            return Response(
+                {'error': "status must be 'unread' or 'read'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        paginator = self.pagination_class()
+        sparse = sparse_fieldset(request)
+        notifications = paginator.paginate_queryset(
+            Notification.objects.filter(
+                user=request.user,
+                is_read=read_status == 'read'
+            ).select_related('post'),
+            request
+        )
+        serializer = NotificationSerializer(notifications, many=True, context={'request': request}, **sparse)
+        return Response({
+            'results': serializer.data,
+            'next': paginator.get_next_link(),
+            'unread_notifications_count': Notification.objects.filter(
+                user=request.user,
+                is_read=False
+            ).count()
+        })
+
+class CreateProfileApi(StreamingUploadMixin, APIView):
+    parser_classes = (MultiPartParser, FormParser, FastJSONParser)
+    permission_classes = [IsAuthenticated]
+
+    def get_upload_limits(self):
+        return {
+            'profile_image': profile_image_max_size(),
+            'profile_picture': profile_image_max_size(),
+        }
 
     def post(self, request, *args, **kwargs):
         try:
@@ -341,10 +627,16 @@ class CreateProfileApi(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-class EditProfileApi(NotificationMixin, APIView):
-    parser_classes = (MultiPartParser, FormParser, JSONParser)
+class EditProfileApi(NotificationMixin, StreamingUploadMixin, APIView):
+    parser_classes = (MultiPartParser, FormParser, FastJSONParser)
     permission_classes = [IsAuthenticated]
 
+    def get_upload_limits(self):
+        return {
+            'profile_image': profile_image_max_size(),
+            'profile_picture': profile_image_max_size(),
+        }
+
     def put(self, request, *args, **kwargs):
         try:
             # Check if profile exists
@@ -355,6 +647,8 @@ class EditProfileApi(NotificationMixin, APIView):
                 )
 
             profile = request.user.user_profile
+            request.user.track_changes()
+            profile.track_changes()
 
             # Update user fields (first_name, last_name)
             user_updated = False
@@ -366,19 +660,12 @@ class EditProfileApi(NotificationMixin, APIView):
                 user_updated = True
             
             if user_updated:
-                request.user.save()
+                request.user.save_changes()
 
             # Update profile data
-            if 'job_title' in request.data:
-                profile.job_title = request.data['job_title']
-            if 'job_status' in request.data:
-                profile.job_status = request.data['job_status']
-            if 'brief' in request.data:
-                profile.brief = request.data['brief']
-            if 'years_of_experience' in request.data:
-                profile.years_of_experience = request.data['years_of_experience']
-            if 'phone_number' in request.data:
-                profile.phone_number = request.data['phone_number']
+            for field in ('job_title', 'job_status', 'brief', 'years_of_experience', 'phone_number'):
+                if field in request.data:
+                    setattr(profile, field, request.data[field])
 
             # Handle profile image update (supporting both profile_image and profile_picture field names)
             profile_image_key = None
@@ -388,13 +675,13 @@ class EditProfileApi(NotificationMixin, APIView):
                 profile_image_key = 'profile_picture'
             
             if profile_image_key:
-                # Delete old image if it exists
+                # Release the old image; unreferenced files are removed by cleanup_orphaned_media
                 if profile.profile_image:
-                    profile.profile_image.delete()
+                    profile.profile_image.delete(save=False)
                 profile.profile_image = request.FILES[profile_image_key]
 
-            # Save the updated profile
-            profile.save()
+            # Save only the fields that changed
+            profile.save_changes()
 
             # Return the updated profile data
             serializer = ProfileSerializer(profile)
@@ -412,10 +699,13 @@ class EditProfileApi(NotificationMixin, APIView):
     def patch(self, request, *args, **kwargs):
         return self.put(request, *args, **kwargs)
 
-class PostEditApi(NotificationMixin, APIView):
-    parser_classes = (MultiPartParser, FormParser, JSONParser)
+class PostEditApi(NotificationMixin, StreamingUploadMixin, APIView):
+    parser_classes = (MultiPartParser, FormParser, FastJSONParser)
     permission_classes = [IsAuthenticated]
 
+    def get_upload_limits(self):
+        return {'image': post_image_max_size()}
+
     def get_post(self, post_id, user):
         try:
             # Get post and verify ownership or admin status
@@ -440,6 +730,19 @@ class PostEditApi(NotificationMixin, APIView):
                 {'error': 'Only the post owner can edit this post'},
                 status=status.HTTP_403_FORBIDDEN
             )
+        post.track_changes()
+
+        upload = None
+        if request.data.get('upload_id'):
+            upload = UploadSession.objects.filter(
+                id=request.data['upload_id'],
+                user=request.user
+            ).first()
+            if upload is None or not upload.is_complete:
+                return Response(
+                    {'error': 'Upload not found or not complete'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
 
         try:
             # Update post data
@@ -452,11 +755,19 @@ class PostEditApi(NotificationMixin, APIView):
 
             # Handle image update
             if 'image' in request.FILES:
-                # Delete old image if it exists
+                # Release the old image; unreferenced files are removed by cleanup_orphaned_media
                 if post.image:
-                    post.image.delete()
+                    post.image.delete(save=False)
                 post.image = request.FILES['image']
+            elif upload:
+                if post.image:
+                    post.image.delete(save=False)
+                with upload.open_file() as image:
+                    post.image.save(image.name, image, save=False)
+                upload.discard()
             else:
+                if post.image:
+                    post.image.delete(save=False)
                 post.image = ""
 
             # Handle tags if provided
@@ -471,8 +782,8 @@ class PostEditApi(NotificationMixin, APIView):
                     tags = []
                 post.tags.add(*tags)
 
-            # Save the updated post
-            post.save()
+            # Save only the fields that changed
+            post.save_changes()
 
             # Return the updated post data
             serializer = PostListSerializer(post, context={'request': request})
@@ -499,9 +810,9 @@ class PostEditApi(NotificationMixin, APIView):
             )
 
         try:
-            # Delete the image if it exists
+            # Release the image; unreferenced files are removed by cleanup_orphaned_media
             if post.image:
-                post.image.delete()
+                post.image.delete(save=False)
 
             # Delete the post
             post.delete()
@@ -523,7 +834,7 @@ class CommentViewSet(NotificationMixin, viewsets.ViewSet):
     Provides edit and delete functionality with ownership validation.
     """
     permission_classes = [IsAuthenticated]
-    parser_classes = (MultiPartParser, FormParser, JSONParser)
+    parser_classes = (MultiPartParser, FormParser, FastJSONParser)
 
     def get_comment(self, comment_id, user):
         """Get comment and verify ownership"""
@@ -556,9 +867,10 @@ class CommentViewSet(NotificationMixin, viewsets.ViewSet):
             )
 
         try:
-            # Update comment content
+            # Update comment content, skipping the write if it is unchanged
+            comment.track_changes()
             comment.content = content
-            comment.save()
+            comment.save_changes()
 
             # Return updated comment data
             serializer = CommentSerializer(comment, context={'request': request})
@@ -597,6 +909,114 @@ class CommentViewSet(NotificationMixin, viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+class ChunkedUploadApi(APIView):
+    """
+    Start a resumable chunked image upload
+
+    POST /api/uploads/
+    {
+        "filename": "photo.jpg",
+        "content_type": "image/jpeg",
+        "size": 7340032
+    }
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = (FastJSONParser, FormParser)
+
+    def post(self, request):
+        serializer = UploadSessionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {'errors': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        session = serializer.save(user=request.user)
+        return Response(
+            UploadSessionSerializer(session).data,
+            status=status.HTTP_201_CREATED
+        )
+
+class ChunkedUploadDetailApi(APIView):
+    """
+    Send, resume or abort a chunked upload
+
+    GET    /api/uploads/<upload_id>/  -> current offset to resume from
+    PUT    /api/uploads/<upload_id>/  raw chunk with "Content-Range: bytes start-end/total"
+    DELETE /api/uploads/<upload_id>/  abort and discard the upload
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = ()  # The chunk body is streamed to disk, never parsed
+
+    def get_session(self, upload_id, user):
+        return UploadSession.objects.filter(id=upload_id, user=user).first()
+
+    def get(self, request, upload_id):
+        session = self.get_session(upload_id, request.user)
+        if not session:
+            return Response(
+                {'error': 'Upload not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(UploadSessionSerializer(session).data)
+
+    def put(self, request, upload_id):
+        session = self.get_session(upload_id, request.user)
+        if not session:
+            return Response(
+                {'error': 'Upload not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        content_range = parse_content_range(request.META.get('HTTP_CONTENT_RANGE', ''))
+        if not content_range:
+            return Response(
+                {'error': 'A valid Content-Range header is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        start, end, total = content_range
+        length = end - start + 1
+
+        if total != session.size:
+            return Response(
+                {'error': 'Content-Range total does not match the upload size'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if start != session.offset:
+            # Tell the client where to resume from
+            return Response(
+                {'error': 'Chunk does not start at the current offset', 'offset': session.offset},
+                status=status.HTTP_409_CONFLICT
+            )
+        if length > chunk_max_size():
+            return Response(
+                {'error': f'Chunks cannot exceed {chunk_max_size()} bytes'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            written = write_chunk(session, request._request, length)
+        except UploadRejected as e:
+            if session.offset == 0:
+                session.discard()
+            return Response(
+                {'error': e.message, 'offset': session.offset},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        session.offset += written
+        session.save(update_fields=['offset', 'updated_at'])
+        return Response(UploadSessionSerializer(session).data)
+
+    def delete(self, request, upload_id):
+        session = self.get_session(upload_id, request.user)
+        if not session:
+            return Response(
+                {'error': 'Upload not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        session.discard()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 class ModifyToolkitTokensView(APIView):
     """
     API endpoint for modifying user's toolkit tokens
@@ -608,7 +1028,7 @@ class ModifyToolkitTokensView(APIView):
     }
     """
     permission_classes = [IsAuthenticated]
-    parser_classes = (JSONParser,)
+    parser_classes = (FastJSONParser,)
 
     def post(self, request):
         operation = request.data.get('operation')
@@ -642,7 +1062,7 @@ class ModifyToolkitTokensView(APIView):
                     )
                 user.toolkit_tokens -= amount
 
-            user.save()
+            user.save(update_fields=['toolkit_tokens'])
 
             return Response(
                 {'toolkit_tokens': user.toolkit_tokens},
@@ -0,0 +1,180 @@
+"""
+Async versions of the read-heavy endpoints, for the ASGI server.
+
+Each view loads its rows, and everything the serializers read from related
+tables, with the async ORM before serializing. The DRF serializers then
+render from memory, so a request waiting on the database does not hold a
+thread; any query a serializer would still make raises
+``SynchronousOnlyOperation`` instead of silently blocking the event loop.
+
+Responses match the synchronous endpoints in ``api.py`` field for field.
+"""
+import math
+from functools import wraps
+
+from django.db.models import Count
+from django.http import HttpResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .api import StandardResultsSetPagination, feed_queryset, filter_by_tags, split_posts_field
+from .author_cards import get_resolver
+from .models import Notification, Profile, User
+from .realtime import authenticate
+from .renderers import FastJSONRenderer
+from .serializer import (
+    SENDER_REACTIONS_KEY,
+    NotificationSerializer,
+    PostListSerializer,
+    ProfileSerializer,
+    sparse_fieldset,
+)
+
+
+def render(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def authenticated(view):
+    """Authenticate the request like the DRF views do, without a thread"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return render({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+        user = await authenticate(request)
+        if user is None:
+            return render({'detail': 'Authentication credentials were not provided.'}, status=401)
+        request.user = user
+        try:
+            return await view(request, *args, **kwargs)
+        except ValidationError as exc:  # Unknown fields in a sparse fieldset
+            return render(exc.detail, status=400)
+    return wrapper
+
+
+async def serialize_posts(posts, request, many=True, **sparse):
+    context = {'request': request}
+    serializer = PostListSerializer(posts, many=many, context=context, **sparse)
+    if (serializer.child if many else serializer).renders_cards():
+        await get_resolver(context).aprime(PostListSerializer.get_author_ids(posts if many else [posts]))
+    return serializer.data
+
+
+async def serialize_notifications(notifications, request, context=None, **sparse):
+    """Serialized notifications; pass one ``context`` to share cards and reactions between calls"""
+    if context is None:
+        context = {'request': request}
+    serializer = NotificationSerializer(notifications, many=True, context=context, **sparse)
+    if serializer.child.renders_cards():
+        await get_resolver(context).aprime(NotificationSerializer.get_author_ids(notifications))
+    if serializer.child.renders_reactions() and SENDER_REACTIONS_KEY not in context:
+        context[SENDER_REACTIONS_KEY] = {
+            (user_id, post_id): react
+            async for user_id, post_id, react in NotificationSerializer.sender_reactions_queryset(notifications)
+        }
+    return serializer.data
+
+
+async def unread_notifications(user):
+    queryset = Notification.objects.filter(user=user, is_read=False).order_by('-created_at')
+    lookups = NotificationSerializer.related_lookups()
+    if lookups:
+        queryset = queryset.select_related(*lookups)
+    return [notification async for notification in queryset]
+
+
+async def add_notifications(request, data, notification_data=None):
+    """Attach the unread notifications like ``NotificationMixin`` does"""
+    if notification_data is None:
+        notification_data = await serialize_notifications(await unread_notifications(request.user), request)
+    if not isinstance(data, dict):
+        data = {'results': data}
+    data['notifications'] = notification_data
+    data['unread_notifications_count'] = len(notification_data)
+    return data
+
+
+@authenticated
+async def post_list(request):
+    """Async ``PostListApi.list``: the paginated global feed"""
+    pagination = StandardResultsSetPagination
+    sparse = sparse_fieldset(request)
+    queryset = filter_by_tags(feed_queryset(**sparse).order_by('-created_at'), request.GET.get('tags'))
+
+    try:
+        page_size = min(int(request.GET.get(pagination.page_size_query_param, pagination.page_size)),
+                        pagination.max_page_size)
+        if page_size < 1:
+            raise ValueError
+    except ValueError:
+        page_size = pagination.page_size
+    count = await queryset.acount()
+    num_pages = max(1, math.ceil(count / page_size))
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        page = 0
+    if not 1 <= page <= num_pages:
+        return render({'detail': 'Invalid page.'}, status=404)
+
+    offset = (page - 1) * page_size
+    posts = [post async for post in queryset[offset:offset + page_size]]
+
+    url = request.build_absolute_uri()
+    previous_url = None
+    if page > 1:
+        previous_url = remove_query_param(url, 'page') if page == 2 else replace_query_param(url, 'page', page - 1)
+    data = {
+        'count': count,
+        'next': replace_query_param(url, 'page', page + 1) if page < num_pages else None,
+        'previous': previous_url,
+        'results': await serialize_posts(posts, request, **sparse),
+    }
+    return render(await add_notifications(request, data))
+
+
+@authenticated
+async def post_detail(request, pk):
+    """Async ``PostDetailApi.retrieve``"""
+    sparse = sparse_fieldset(request)
+    post = await feed_queryset(**sparse).filter(id=pk).afirst()
+    if post is None:
+        return render({'error': 'Post not found'}, status=404)
+    data = {'post': await serialize_posts(post, request, many=False, **sparse)}
+    return render(await add_notifications(request, data))
+
+
+@authenticated
+async def profile_detail(request, username):
+    """Async ``ProfileListApi.get``: a profile with the user's posts"""
+    user = await User.objects.filter(username=username).afirst()
+    if user is None:
+        return render({'error': 'User not found'}, status=404)
+    profile_kwargs, include_posts = split_posts_field(sparse_fieldset(request))
+    profiles = Profile.objects.filter(user=user)
+    if 'posts_count' in ProfileSerializer.select_fields(**profile_kwargs):
+        profiles = profiles.annotate(user_posts_count=Count('user__user_posts'))
+    profile = await profiles.afirst()
+    if profile is None:
+        return render({'error': 'Profile not found for this user'}, status=404)
+    profile.user = user
+
+    data = ProfileSerializer(profile, **profile_kwargs).data
+    if include_posts:
+        posts = [post async for post in feed_queryset().filter(author=user).order_by('-created_at')]
+        data['posts'] = await serialize_posts(posts, request)
+    return render(await add_notifications(request, data))
+
+
+@authenticated
+async def notification_list(request):
+    """Async ``NotificationAPI.list``: the unread notifications"""
+    sparse = sparse_fieldset(request)
+    # The attached notifications are complete, so one fetch serves both lists
+    notifications = await unread_notifications(request.user)
+    context = {'request': request}
+    notification_data = await serialize_notifications(notifications, request, context)
+    if not sparse:
+        return render(await add_notifications(request, notification_data, notification_data))
+    data = await serialize_notifications(notifications, request, context, **sparse)
+    return render(await add_notifications(request, data, notification_data))
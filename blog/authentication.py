@@ -0,0 +1,159 @@
+"""
+API authentication without a database round trip per request.
+
+``CachedTokenAuthentication`` is DRF's token authentication with the
+token and a snapshot of its user kept in the shared cache for
+``AUTH_TOKEN_CACHE_TIMEOUT`` seconds, so a warm request runs no query. The
+snapshot holds only the id and the fields in ``USER_CLAIMS``; every other
+field is deferred and loaded, in one query, on first read, so counters that
+queryset updates bump without signals (``followers_count``) are never
+stale. Entries are dropped when the token is deleted or replaced (logout,
+rotation) and when a save changes the user's password or snapshot fields
+(``is_active`` included); see blog/signals.py. Queryset updates of those
+fields are seen once the entry expires.
+
+``StatelessJWTAuthentication`` is the option for ``API_AUTH = 'jwt'``: the
+access token carries the user id, username and flags, and the user is built
+from those claims with every other field deferred, so requests that only need
+``request.user.pk`` never touch the database. The first deferred field read
+loads all of them in one query. Such tokens can't be revoked before
+``SIMPLE_JWT['ACCESS_TOKEN_LIFETIME']`` runs out.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+# Claims copied into access tokens and cached token snapshots, read back without a query
+USER_CLAIMS = ('username', 'is_active', 'is_staff', 'is_superuser')
+
+
+def cache_timeout():
+    return getattr(settings, 'AUTH_TOKEN_CACHE_TIMEOUT', 60)
+
+
+def cache_key(key):
+    # Keep raw token keys out of the cache's key space
+    return f'auth_token:v1:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def user_key(user_id):
+    # Points at the cached token of a user, so user changes need no token query
+    return f'auth_token_user:v1:{user_id}'
+
+
+def deferred_user(user_id, values):
+    """
+    A ``User`` with the id and ``values`` loaded and every other field
+    deferred; the first deferred field read loads all of them in one query.
+    """
+    User = get_user_model()
+    loaded = dict(values)
+    loaded[User._meta.pk.attname] = user_id
+    # from_db() expects the values in field order
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in loaded]
+    user = User.from_db(None, names, [loaded[name] for name in names])
+    user.load_deferred_together = True
+    return user
+
+
+def cache_entries(token):
+    """The cache entries of a token: (user id, created, user snapshot) and the user's key"""
+    snapshot = {field: getattr(token.user, field) for field in USER_CLAIMS}
+    return {
+        cache_key(token.key): (token.user_id, token.created, snapshot),
+        user_key(token.user_id): token.key,
+    }
+
+
+def from_cache_entry(key, entry):
+    user_id, created, snapshot = entry
+    token = Token(key=key, user_id=user_id, created=created)
+    token.user = deferred_user(user_id, snapshot)
+    return token
+
+
+def get_token(key):
+    """The token with its user, from the cache if possible"""
+    entry = cache.get(cache_key(key))
+    if entry is not None:
+        return from_cache_entry(key, entry)
+    token = Token.objects.select_related('user').filter(key=key).first()
+    if token is not None:
+        cache.set_many(cache_entries(token), cache_timeout())
+    return token
+
+
+async def aget_token(key):
+    entry = await cache.aget(cache_key(key))
+    if entry is not None:
+        return from_cache_entry(key, entry)
+    token = await Token.objects.select_related('user').filter(key=key).afirst()
+    if token is not None:
+        await cache.aset_many(cache_entries(token), cache_timeout())
+    return token
+
+
+def invalidate(key):
+    cache.delete(cache_key(key))
+
+
+def invalidate_user(user_id):
+    key = cache.get(user_key(user_id))
+    if key is not None:
+        cache.delete_many([cache_key(key), user_key(user_id)])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """``TokenAuthentication`` backed by the shared cache"""
+
+    def authenticate_credentials(self, key):
+        token = get_token(key)
+        if token is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return (token.user, token)
+
+
+class UserClaimsTokenSerializer(TokenObtainPairSerializer):
+    """Adds the claims ``StatelessJWTAuthentication`` needs to issued tokens"""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+
+def user_from_claims(validated_token):
+    """
+    A ``User`` with the id and claimed fields loaded and every other field
+    deferred, so it works as a foreign key value without a query.
+    """
+    try:
+        user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise exceptions.AuthenticationFailed(_('Token contained no recognizable user identification'))
+    if any(claim not in validated_token for claim in USER_CLAIMS):
+        # Issued before the claims were added
+        raise exceptions.AuthenticationFailed(_('Token is missing user claims.'))
+    if not validated_token['is_active']:
+        raise exceptions.AuthenticationFailed(_('User is inactive'), code='user_inactive')
+    return deferred_user(user_id, {claim: validated_token[claim] for claim in USER_CLAIMS})
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWT authentication that builds the user from the token claims"""
+
+    def get_user(self, validated_token):
+        return user_from_claims(validated_token)
@@ -0,0 +1,152 @@
+"""
+Shared author "cards" for serializers that embed a user.
+
+A card holds what every embedded author shows: username, first and last name
+and the avatar URL. Cards are resolved in bulk once per response and cached
+per user, so serializing a feed page costs at most one query for all of its
+authors, commenters and notification senders, and none once they are cached.
+The cache entry is dropped whenever the user's names or profile image change.
+Cards are always read from ``default``, even in views reading from a replica,
+so a lagging replica can't put a stale card in the cache.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .image_processing import DEFAULT_AVATAR_VARIANT
+
+CONTEXT_KEY = '_author_cards'
+CACHE_KEY_PREFIX = 'author_card:v1:'
+
+
+def cache_timeout():
+    return getattr(settings, 'AUTHOR_CARD_CACHE_TIMEOUT', 60 * 60)
+
+
+def cache_key(user_id):
+    return f'{CACHE_KEY_PREFIX}{user_id}'
+
+
+def invalidate(user_id):
+    """Drop the cached card of a user"""
+    cache.delete(cache_key(user_id))
+
+
+def card_rows(user_ids):
+    """Query for the columns a card is built from"""
+    from .models import User
+
+    return User.objects.using(DEFAULT_DB_ALIAS).filter(pk__in=user_ids).values(
+        'id',
+        'username',
+        'first_name',
+        'last_name',
+        'user_profile__profile_image',
+        'user_profile__profile_image_variants',
+    )
+
+
+def card_from_row(row):
+    """Card with the avatar URL relative to the site"""
+    from .models import Profile
+
+    image = row['user_profile__profile_image']
+    variants = row['user_profile__profile_image_variants'] or {}
+    profile_picture = None
+    if image:
+        storage = Profile._meta.get_field('profile_image').storage
+        profile_picture = storage.url(variants.get(DEFAULT_AVATAR_VARIANT) or image)
+    return {
+        'username': row['username'],
+        'first_name': row['first_name'],
+        'last_name': row['last_name'],
+        'profile_picture': profile_picture,
+    }
+
+
+def build_cards(user_ids):
+    """
+    Load cards for the given users from the database in one query.
+
+    Returns:
+        dict: user id -> card, with the avatar URL relative to the site
+    """
+    return {row['id']: card_from_row(row) for row in card_rows(user_ids)}
+
+
+class AuthorCardResolver:
+    """
+    Per-response card lookup.
+
+    ``prime()`` fetches all cards a response will need in one go; ``get()``
+    falls back to fetching a single card for anything that was not primed.
+    """
+
+    def __init__(self, request=None):
+        self.request = request
+        self.cards = {}
+        self._base_url = None
+
+    def missing(self, user_ids):
+        return {user_id for user_id in user_ids if user_id is not None} - set(self.cards)
+
+    def add_cached(self, user_ids, cached):
+        for user_id in user_ids:
+            card = cached.get(cache_key(user_id))
+            if card is not None:
+                self.cards[user_id] = card
+        return user_ids - set(self.cards)
+
+    def prime(self, user_ids):
+        missing = self.missing(user_ids)
+        if not missing:
+            return
+        missing = self.add_cached(missing, cache.get_many([cache_key(user_id) for user_id in missing]))
+        if missing:
+            loaded = build_cards(missing)
+            cache.set_many(
+                {cache_key(user_id): card for user_id, card in loaded.items()},
+                cache_timeout()
+            )
+            self.cards.update(loaded)
+
+    async def aprime(self, user_ids):
+        """``prime()`` for async views, using the async cache and ORM APIs"""
+        missing = self.missing(user_ids)
+        if not missing:
+            return
+        missing = self.add_cached(missing, await cache.aget_many([cache_key(user_id) for user_id in missing]))
+        if missing:
+            loaded = {row['id']: card_from_row(row) async for row in card_rows(missing)}
+            await cache.aset_many(
+                {cache_key(user_id): card for user_id, card in loaded.items()},
+                cache_timeout()
+            )
+            self.cards.update(loaded)
+
+    def absolute_url(self, url):
+        if not url or not self.request:
+            return url
+        if url.startswith('/'):
+            if self._base_url is None:
+                self._base_url = self.request.build_absolute_uri('/')[:-1]
+            return self._base_url + url
+        return self.request.build_absolute_uri(url)
+
+    def get(self, user_id):
+        """Card for a user with an absolute avatar URL, or None if the user does not exist"""
+        if user_id not in self.cards:
+            self.prime([user_id])
+        card = self.cards.get(user_id)
+        if card is None:
+            return None
+        return dict(card, profile_picture=self.absolute_url(card['profile_picture']))
+
+
+def get_resolver(context):
+    """The resolver shared by all serializers rendering one response"""
+    resolver = context.get(CONTEXT_KEY)
+    if resolver is None:
+        resolver = AuthorCardResolver(context.get('request'))
+        context[CONTEXT_KEY] = resolver
+    return resolver
@@ -0,0 +1,131 @@
+"""
+gzip and Brotli compression.
+
+``CompressionMiddleware`` compresses API responses (JSON and other text
+types) of at least ``COMPRESSION_MIN_SIZE`` bytes with the best encoding the
+client's ``Accept-Encoding`` allows. Brotli needs the optional ``brotli``
+package; without it responses are gzipped. HTML is left alone, so pages
+carrying CSRF tokens are not exposed to BREACH-style attacks.
+
+Static files are compressed once, at the strongest settings, by
+``blog.storage.CompressedManifestStaticFilesStorage`` during
+``collectstatic`` and served as they are (see ``blog.serving``).
+"""
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+# File name suffixes of precompressed copies
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+COMPRESSIBLE_TYPES = (
+    'application/json',
+    'application/javascript',
+    'text/javascript',
+    'text/css',
+    'text/plain',
+    'image/svg+xml',
+)
+
+
+def min_size():
+    return getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+
+def available_encodings():
+    """Encodings this process can produce, preferred first"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def parse_accept_encoding(header):
+    """
+    Quality values of an ``Accept-Encoding`` header.
+
+    Returns:
+        dict: coding -> q, with ``*`` standing for unlisted codings
+    """
+    qualities = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[coding] = q
+    return qualities
+
+
+def choose_encoding(header, encodings=None):
+    """
+    The encoding to use for a client, or None to send the content as is.
+
+    Among the ``encodings`` (default: all available) the client accepts, the
+    one with the highest quality wins; ties go to the earlier one.
+    """
+    qualities = parse_accept_encoding(header or '')
+    best, best_q = None, 0.0
+    for encoding in encodings if encodings is not None else available_encodings():
+        q = qualities.get(encoding, qualities.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(data, encoding, static=False):
+    """
+    Compress bytes with ``'br'`` or ``'gzip'``.
+
+    ``static`` selects the slow, strongest settings used for files that are
+    compressed once at build time.
+    """
+    if encoding == 'br':
+        quality = 11 if static else getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+        return brotli.compress(data, quality=quality)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=9, mtime=0) if static else compress_string(data)
+    raise ValueError(f'Unsupported encoding: {encoding}')
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compress text responses above the size threshold, negotiated per request"""
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in getattr(settings, 'COMPRESSION_CONTENT_TYPES', COMPRESSIBLE_TYPES):
+            return response
+        if len(response.content) < min_size():
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None:
+            return response
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        response.headers['Content-Encoding'] = encoding
+        # The bytes differ from the uncompressed ones, so a strong ETag no longer holds
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,123 @@
+"""
+Read replica routing.
+
+When ``DATABASES`` has a ``REPLICA_DATABASE`` alias, view methods decorated
+with ``@replica_reads`` (the feed, profile, saved posts and notification
+lists) read from it. All other reads, and every write, go to ``default``.
+
+A replica lags behind the primary, so a user who wrote something is pinned
+to ``default`` for ``REPLICA_PIN_SECONDS`` seconds and sees their own reaction
+or comment. Writes are noticed by ``ReplicaRouter.db_for_write`` and the pin
+is set by ``ReplicaRoutingMiddleware``. The pin is kept in the cache, so use
+a shared cache when more than one process serves requests. Reads later in
+the same request as a write also go to ``default``.
+"""
+import contextvars
+import functools
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+_state = contextvars.ContextVar('db_routing_state', default=None)
+
+
+class RoutingState:
+    """Where the current request reads from, and whether it has written"""
+
+    __slots__ = ('read_alias', 'wrote')
+
+    def __init__(self):
+        self.read_alias = None
+        self.wrote = False
+
+
+def replica_alias():
+    """The configured replica alias, or None without a replica"""
+    alias = getattr(settings, 'REPLICA_DATABASE', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+
+def pin_key(user_id):
+    return f'db_routing:pinned:{user_id}'
+
+
+def pin_to_primary(user):
+    cache.set(pin_key(user.pk), True, pin_seconds())
+
+
+def is_pinned(user):
+    return bool(user and user.is_authenticated and cache.get(pin_key(user.pk)))
+
+
+def read_database_for(request):
+    """The alias a ``@replica_reads`` view reads from for this request"""
+    alias = replica_alias()
+    if alias is None or is_pinned(getattr(request, 'user', None)):
+        return DEFAULT_DB_ALIAS
+    return alias
+
+
+def replica_reads(view_method):
+    """Route the reads of a read-only view method ``(self, request, ...)`` to the replica"""
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        state = _state.get()
+        token = None
+        if state is None:  # Called outside ReplicaRoutingMiddleware
+            state = RoutingState()
+            token = _state.set(state)
+        previous = state.read_alias
+        state.read_alias = read_database_for(request)
+        try:
+            return view_method(self, request, *args, **kwargs)
+        finally:
+            state.read_alias = previous
+            if token is not None:
+                _state.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Reads of ``@replica_reads`` views go to the replica, everything else to ``default``"""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.wrote:
+            return None
+        return state.read_alias
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    """Track writes per request and pin users who wrote to the primary"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RoutingState()
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote and replica_alias() is not None:
+            # DRF sets the user it authenticated on the Django request
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                pin_to_primary(user)
+        return response
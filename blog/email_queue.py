@@ -0,0 +1,242 @@
+"""
+Outbound email queue.
+
+Views call ``enqueue()``, which stores the message as an ``OutboundEmail``
+row and returns immediately; the SMTP conversation happens later in a
+sender. A sender claims a batch of due emails, delivers them over a single
+authenticated connection of the configured ``EMAIL_BACKEND`` (kept open
+while the queue is busy) and reschedules failures with exponential
+backoff until ``EMAIL_QUEUE_MAX_ATTEMPTS`` is reached.
+
+By default each process runs a sender thread that wakes up when an email is
+queued; with ``EMAIL_QUEUE_BACKGROUND = False`` the queue is drained by the
+``send_queued_emails`` command instead. Claims make it safe to run several
+senders against the same table.
+"""
+import logging
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+
+def batch_size():
+    return getattr(settings, 'EMAIL_QUEUE_BATCH_SIZE', 20)
+
+
+def max_attempts():
+    return getattr(settings, 'EMAIL_QUEUE_MAX_ATTEMPTS', 5)
+
+
+def retry_delay(attempts):
+    """Seconds to wait before the next attempt, doubling after every failure"""
+    base = getattr(settings, 'EMAIL_QUEUE_RETRY_DELAY', 30)
+    return min(base * 2 ** (attempts - 1), getattr(settings, 'EMAIL_QUEUE_MAX_RETRY_DELAY', 3600))
+
+
+def claim_timeout():
+    """Claims older than this are considered abandoned by a crashed sender"""
+    return timezone.timedelta(seconds=getattr(settings, 'EMAIL_QUEUE_CLAIM_TIMEOUT', 600))
+
+
+def processing_in_background():
+    return getattr(settings, 'EMAIL_QUEUE_BACKGROUND', True)
+
+
+def enqueue(message):
+    """
+    Queue an ``EmailMessage`` (HTML alternatives included) for delivery.
+
+    Returns:
+        OutboundEmail: The queued email
+    """
+    html_body = ''
+    for content, mimetype in getattr(message, 'alternatives', []):
+        if mimetype == 'text/html':
+            html_body = content
+    email = OutboundEmail.objects.create(
+        subject=message.subject,
+        body=message.body,
+        html_body=html_body,
+        from_email=message.from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(message.to),
+    )
+    if processing_in_background():
+        transaction.on_commit(sender.wake)
+    return email
+
+
+def build_message(email, connection=None):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=email.to,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def claim_batch(limit=None):
+    """
+    Claim up to ``limit`` due emails for this sender.
+
+    Returns:
+        list: The claimed ``OutboundEmail`` rows
+    """
+    now = timezone.now()
+    # Release emails held by senders that died mid-delivery
+    OutboundEmail.objects.filter(
+        status=OutboundEmail.STATUS_SENDING,
+        claimed_at__lt=now - claim_timeout()
+    ).update(status=OutboundEmail.STATUS_PENDING, claim=None)
+
+    due = list(
+        OutboundEmail.objects.filter(
+            status=OutboundEmail.STATUS_PENDING,
+            next_attempt_at__lte=now
+        ).order_by('next_attempt_at', 'pk').values_list('pk', flat=True)[:limit or batch_size()]
+    )
+    if not due:
+        return []
+    claim = uuid.uuid4()
+    OutboundEmail.objects.filter(pk__in=due, status=OutboundEmail.STATUS_PENDING).update(
+        status=OutboundEmail.STATUS_SENDING,
+        claim=claim,
+        claimed_at=now
+    )
+    return list(OutboundEmail.objects.filter(claim=claim).order_by('next_attempt_at', 'pk'))
+
+
+def record_failure(email, error):
+    email.attempts += 1
+    email.last_error = str(error)[:2000]
+    email.claim = None
+    if email.attempts >= max_attempts():
+        email.status = OutboundEmail.STATUS_FAILED
+        logger.error("Giving up on email %s after %s attempts: %s", email.pk, email.attempts, error)
+    else:
+        email.status = OutboundEmail.STATUS_PENDING
+        email.next_attempt_at = timezone.now() + timezone.timedelta(seconds=retry_delay(email.attempts))
+    email.save(update_fields=['attempts', 'last_error', 'claim', 'status', 'next_attempt_at'])
+
+
+def send_batch(emails, connection):
+    """
+    Deliver claimed emails over an open connection.
+
+    Returns:
+        int: Number of emails sent
+    """
+    sent = 0
+    for email in emails:
+        try:
+            # Reopens a dropped SMTP connection; a no-op when open and for other backends
+            connection.open()
+            connection.send_messages([build_message(email, connection)])
+        except Exception as e:
+            record_failure(email, e)
+            # The server may have dropped us; reconnect for the next email
+            connection.close()
+            continue
+        email.status = OutboundEmail.STATUS_SENT
+        email.attempts += 1
+        email.sent_at = timezone.now()
+        email.claim = None
+        email.save(update_fields=['status', 'attempts', 'sent_at', 'claim'])
+        sent += 1
+    return sent
+
+
+def drain(connection=None, max_batches=None):
+    """
+    Send due emails batch by batch until none are left.
+
+    Returns:
+        int: Number of emails sent
+    """
+    own_connection = connection is None
+    if own_connection:
+        connection = get_connection(fail_silently=False)
+    sent = batches = 0
+    try:
+        while max_batches is None or batches < max_batches:
+            emails = claim_batch()
+            if not emails:
+                break
+            sent += send_batch(emails, connection)
+            batches += 1
+    finally:
+        if own_connection:
+            connection.close()
+    return sent
+
+
+class EmailSender:
+    """
+    Background thread draining the queue of this process.
+
+    The SMTP connection stays open between batches and is closed after
+    ``EMAIL_QUEUE_IDLE_TIMEOUT`` seconds without work.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopping = False
+
+    def wake(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.stopping = False
+                self.thread = threading.Thread(target=self.run, name='email-sender', daemon=True)
+                self.thread.start()
+        self.event.set()
+
+    def run(self):
+        idle_timeout = getattr(settings, 'EMAIL_QUEUE_IDLE_TIMEOUT', 30)
+        poll_interval = getattr(settings, 'EMAIL_QUEUE_POLL_INTERVAL', 5)
+        connection = get_connection(fail_silently=False)
+        idle = 0
+        try:
+            while not self.stopping:
+                self.event.clear()
+                try:
+                    sent = drain(connection)
+                except Exception:
+                    logger.exception("Email sender failed")
+                    sent = 0
+                finally:
+                    close_old_connections()
+                if sent:
+                    idle = 0
+                    continue
+                # Keep polling for retries that become due; drop the SMTP connection when idle
+                if self.event.wait(poll_interval):
+                    continue
+                idle += poll_interval
+                if idle >= idle_timeout:
+                    connection.close()
+                    idle = 0
+        finally:
+            connection.close()
+
+    def stop(self, timeout=None):
+        self.stopping = True
+        self.event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+
+sender = EmailSender()
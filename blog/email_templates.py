@@ -0,0 +1,115 @@
+"""
+Precompiled verification email templates.
+
+Rendering ``emails/*.html`` walks the whole ``base_email.html`` node tree
+(about 200 lines of markup and inlined CSS) for every email, although only a
+handful of values differ between recipients. Each template is therefore
+rendered once per process with placeholder markers for those values and
+split into literal chunks; sending an email only joins the chunks with the
+escaped values.
+
+Templates are loaded through the template engine (and its cached loader),
+so the output is the same as ``render_to_string`` as long as the dynamic
+values are only printed, never used in ``{% if %}`` tags or filters. The
+greeting ``Hi{% if user.first_name %} {{ user.first_name }}{% endif %}!``
+is supported as a special case.
+"""
+import re
+import threading
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.template.loader import get_template
+from django.utils.html import escape
+
+VERIFICATION_EMAILS = {
+    'registration': {
+        'subject': '🎉 Welcome to CyMate - Verify Your Email',
+        'template': 'emails/registration_verification',
+    },
+    'password_reset': {
+        'subject': '🔐 CyMate Password Reset Verification',
+        'template': 'emails/password_reset_verification',
+    },
+}
+
+SLOTS = ('code', 'email', 'expiry_minutes', 'support_email', 'first_name')
+SLOT_PATTERN = re.compile(r'\[\[slot:(\w+)\]\]')
+
+_compiled = {}
+_lock = threading.Lock()
+
+
+def slot(name):
+    return f'[[slot:{name}]]'
+
+
+class CompiledTemplate:
+    """A rendered template split into literal chunks and slot names"""
+
+    def __init__(self, rendered, autoescape):
+        # A greeting only has a leading space when there is a name
+        rendered = rendered.replace(' ' + slot('first_name'), slot('greeting'))
+        # Alternating literal chunks and slot names
+        self.parts = SLOT_PATTERN.split(rendered)
+        self.autoescape = autoescape
+
+    def render(self, values):
+        parts = self.parts[:]
+        for i in range(1, len(parts), 2):
+            value = values[parts[i]]
+            parts[i] = escape(value) if self.autoescape else str(value)
+        return ''.join(parts)
+
+
+def compile_template(template_name, verification_type):
+    template = get_template(template_name)
+    context = {name: slot(name) for name in SLOTS if name != 'first_name'}
+    context['user'] = {'first_name': slot('first_name')}
+    context['verification_type'] = verification_type
+    return CompiledTemplate(template.render(context), autoescape=template_name.endswith('.html'))
+
+
+def get_compiled(template_name, verification_type):
+    key = (template_name, verification_type)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        with _lock:
+            compiled = _compiled.get(key)
+            if compiled is None:
+                compiled = _compiled[key] = compile_template(template_name, verification_type)
+    return compiled
+
+
+def clear():
+    _compiled.clear()
+
+
+@receiver(setting_changed)
+def clear_on_template_change(setting, **kwargs):
+    if setting == 'TEMPLATES':
+        clear()
+
+
+def render_verification_email(verification_type, code, email, expiry_minutes, support_email, user=None):
+    """
+    Render a verification email from the precompiled templates.
+
+    Returns:
+        tuple: (subject, text body, HTML body), or None for an unknown type
+    """
+    spec = VERIFICATION_EMAILS.get(verification_type)
+    if spec is None:
+        return None
+    first_name = getattr(user, 'first_name', '') if user else ''
+    values = {
+        'code': code,
+        'email': email,
+        'expiry_minutes': expiry_minutes,
+        'support_email': support_email,
+        'first_name': first_name,
+        'greeting': f' {first_name}' if first_name else '',
+    }
+    text = get_compiled(spec['template'] + '.txt', verification_type).render(values)
+    html = get_compiled(spec['template'] + '.html', verification_type).render(values)
+    return spec['subject'], text, html
@@ -2,11 +2,10 @@ import random
 import string
 from datetime import timedelta
 from django.utils import timezone
-from django.core.mail import send_mail
 from django.conf import settings
-from django.template.loader import render_to_string
 from django.contrib.auth import get_user_model
 from .models import EmailVerification
+from .verification_codes import EXPIRED, VERIFIED, get_code_store
 
 User = get_user_model()
 
@@ -44,24 +43,17 @@ class EmailVerificationService:
         Returns:
             EmailVerification: Created verification instance
         """
-        # Cleanup any existing codes for this email and type
-        EmailVerification.objects.filter(
-            email=email,
-            verification_type=verification_type,
-            is_used=False
-        ).delete()
-        
         # Generate new code and expiry time
         code = cls.generate_verification_code()
         expires_at = timezone.now() + timedelta(minutes=cls.CODE_EXPIRY_MINUTES)
         
-        # Create verification record
-        verification = EmailVerification.objects.create(
+        # Store the code, replacing any unused code for this email and type
+        verification = get_code_store().issue(
             email=email,
-            code=code,
             verification_type=verification_type,
-            user=user,
-            expires_at=expires_at
+            code=code,
+            expires_at=expires_at,
+            user=user
         )
         
         return verification
@@ -78,80 +70,24 @@ class EmailVerificationService:
             user (User, optional): User object for personalization
             
         Returns:
-            bool: True if email was sent successfully, False otherwise
+            bool: True if email was queued for delivery, False otherwise
         """
         try:
             from django.core.mail import EmailMultiAlternatives
-            from django.template.loader import render_to_string
+            from .email_templates import render_verification_email
             
-            # Determine email subject and template based on verification type
-            if verification_type == 'registration':
-                subject = '🎉 Welcome to CyMate - Verify Your Email'
-                html_template_name = 'emails/registration_verification.html'
-            elif verification_type == 'password_reset':
-                subject = '🔐 CyMate Password Reset Verification'
-                html_template_name = 'emails/password_reset_verification.html'
-            else:
+            # Fill the precompiled templates for this verification type
+            rendered = render_verification_email(
+                verification_type,
+                code=code,
+                email=email,
+                expiry_minutes=cls.CODE_EXPIRY_MINUTES,
+                support_email=getattr(settings, 'EMAIL_VERIFICATION_SUPPORT_EMAIL', 'cymate@gmail.com'),
+                user=user
+            )
+            if rendered is None:
                 return False
-            
-            # Prepare email context
-            context = {
-                'code': code,
-                'email': email,
-                'user': user,
-                'expiry_minutes': cls.CODE_EXPIRY_MINUTES,
-                'verification_type': verification_type,
-                'support_email': getattr(settings, 'EMAIL_VERIFICATION_SUPPORT_EMAIL', 'cymate@gmail.com'),
-            }
-            
-            # Render HTML content
-            html_content = render_to_string(html_template_name, context)
-            
-            # Create plain text fallback
-            if verification_type == 'registration':
-                text_content = f"""
-Welcome to CyMate!
-
-Hi{f' {user.first_name}' if user and user.first_name else ''}!
-
-Thank you for joining CyMate! To complete your registration, please verify your email address.
-
-Your verification code is: {code}
-
-This code will expire in {cls.CODE_EXPIRY_MINUTES} minutes.
-
-Enter this code in the verification form to activate your account.
-
-If you didn't create an account with us, please ignore this email.
-
-Welcome aboard!
-The CyMate Team
-
----
-This email was sent to {email}. If you have any questions, contact us at {context['support_email']}.
-                """
-            else:  # password_reset
-                text_content = f"""
-CyMate Password Reset
-
-Hi{f' {user.first_name}' if user and user.first_name else ''}!
-
-We received a request to reset the password for your CyMate account.
-
-Your verification code is: {code}
-
-This code will expire in {cls.CODE_EXPIRY_MINUTES} minutes.
-
-Enter this code in the password reset form to continue.
-
-If you didn't request this password reset, please ignore this email. Your account remains secure.
-
-Stay safe,
-The CyMate Security Team
-
----
-This email was sent to {email}. If you have any questions, contact us at {context['support_email']}.
-                """
+            subject, text_content, html_content = rendered
             
             # Create email message with HTML
             msg = EmailMultiAlternatives(
@@ -164,25 +100,10 @@ This email was sent to {email}. If you have any questions, contact us at {contex
             # Attach HTML version
             msg.attach_alternative(html_content, "text/html")
             
-            # Send email with error handling
-            try:
-                msg.send()
-                return True
-            except Exception as smtp_error:
-                # Try with different SSL settings if initial send fails
-                print(f"SMTP Error: {smtp_error}")
-                
-                # Fallback: try with basic send_mail
-                from django.core.mail import send_mail
-                send_mail(
-                    subject=subject,
-                    message=text_content,
-                    from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'CyMate <cymate@gmail.com>'),
-                    recipient_list=[email],
-                    fail_silently=False,
-                    html_message=html_content
-                )
-                return True
+            # Queue the email; the SMTP round trip happens in the email sender
+            from .email_queue import enqueue
+            enqueue(msg)
+            return True
             
         except Exception as e:
             print(f"Failed to send verification email: {str(e)}")
@@ -202,23 +123,14 @@ This email was sent to {email}. If you have any questions, contact us at {contex
             tuple: (success: bool, message: str, verification: EmailVerification or None)
         """
         try:
-            # Find the verification record
-            verification = EmailVerification.objects.filter(
-                email=email,
-                code=code,
-                verification_type=verification_type,
-                is_used=False
-            ).first()
-            
-            if not verification:
-                return False, "Invalid verification code", None
+            # Check and consume the code in one step
+            result, verification = get_code_store().consume(email, code, verification_type)
             
-            if verification.is_expired():
+            if result == EXPIRED:
                 return False, "Verification code has expired", None
             
-            # Mark as used
-            verification.is_used = True
-            verification.save()
+            if result != VERIFIED:
+                return False, "Invalid verification code", None
             
             return True, "Verification successful", verification
             
@@ -17,7 +17,7 @@ from .serializer import (
     PasswordResetConfirmSerializer
 )
 from .email_verification_service import EmailVerificationService
-from .models import EmailVerification
+from .verification_codes import get_code_store
 
 User = get_user_model()
 
@@ -257,10 +257,7 @@ class PasswordResetConfirmView(APIView):
             user.save()
             
             # Clean up any remaining verification codes for this user
-            EmailVerification.objects.filter(
-                email=email,
-                verification_type='password_reset'
-            ).delete()
+            get_code_store().discard(email, 'password_reset')
             
             return Response({
                 'message': 'Password reset successfully',
@@ -321,12 +318,7 @@ class EmailVerificationStatusView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         # Check for valid verification codes
-        active_verification = EmailVerification.objects.filter(
-            email=email,
-            verification_type=verification_type,
-            is_used=False,
-            expires_at__gt=timezone.now()
-        ).first()
+        active_verification = get_code_store().active(email, verification_type)
         
         if active_verification:
             return Response({
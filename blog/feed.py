@@ -0,0 +1,213 @@
+"""
+Fast read-only serialization of feed pages.
+
+``PostListSerializer`` builds every post through DRF's field machinery:
+bound fields, a nested ``AuthorSerializer``, a ``CommentSerializer`` per
+comment and a ``TagListSerializerField``, each resolving attributes one at a
+time. Once the queries are batched, that is where a feed page spends its
+time. ``FeedSerializer`` builds the same dicts straight from ``values()``
+rows and one lookup table per relation. It calls the same helpers (author
+cards, image variant URLs) and DRF's own date formatting, so the rendered
+JSON is byte for byte the same.
+
+It only reads lists of posts; creating and editing posts still goes through
+``PostListSerializer``. Set ``FAST_FEED = False`` to serve feeds with
+``PostListSerializer`` instead.
+"""
+import functools
+from collections import defaultdict
+
+from django.conf import settings
+from rest_framework import serializers
+
+from .author_cards import get_resolver
+from .image_processing import DEFAULT_FEED_VARIANT, variant_status, variant_url, variant_urls
+from .models import Comment, Post, Reacts, Save_Post, Share
+from .serializer import PostListSerializer
+
+POST_COLUMNS = ('id', 'author_id', 'post_type', 'title', 'content', 'image', 'image_variants', 'created_at', 'trend')
+COMMENT_COLUMNS = ('id', 'post_id', 'user_id', 'content', 'created_at')
+
+
+def fast_feed_enabled():
+    return getattr(settings, 'FAST_FEED', True)
+
+
+@functools.cache
+def readable_fields():
+    """Names of the fields ``PostListSerializer`` renders, in order"""
+    return tuple(name for name, field in PostListSerializer().fields.items() if not field.write_only)
+
+
+def feed_rows(post_ids):
+    """``values()`` rows of the given posts, in the given order"""
+    rows = {row['id']: row for row in Post.objects.filter(id__in=post_ids).values(*POST_COLUMNS)}
+    return [rows[post_id] for post_id in post_ids if post_id in rows]
+
+
+def group_by_post(rows):
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row[0]].append(row[1:])
+    return grouped
+
+
+def tag_names(post_ids):
+    """
+    Tag names by post id.
+
+    Uses taggit's own prefetch query, so the names come in the same order as
+    with ``prefetch_related('tags')``.
+    """
+    # The class-level manager, as used by prefetch_related()
+    queryset = Post.tags.get_prefetch_querysets([Post(pk=post_id) for post_id in post_ids])[0]
+    names = defaultdict(list)
+    for tag in queryset:
+        names[tag._prefetch_related_val].append(tag.name)
+    return names
+
+
+class FeedSerializer:
+    """
+    ``PostListSerializer(many=True).data`` for rows of ``values(*POST_COLUMNS)``.
+
+    Takes ``fields`` and ``exclude`` like ``PostListSerializer``; relations
+    only read by unselected fields are not queried.
+    """
+    date_field = serializers.DateTimeField()
+    image_field = Post._meta.get_field('image')
+
+    def __init__(self, rows, context=None, fields=None, exclude=None):
+        self.rows = list(rows)
+        self.context = context if context is not None else {}
+        readable = readable_fields()
+        self.fields = [name for name in PostListSerializer.select_fields(fields, exclude) if name in readable]
+        self.lookups = set(PostListSerializer.related_lookups(fields, exclude))
+        self.related = {}
+
+    @property
+    def data(self):
+        if not self.rows:
+            return []
+        self.load_related([row['id'] for row in self.rows])
+        request = self.context.get('request')
+        self.request = request
+        user = getattr(request, 'user', None)
+        self.viewer_id = user.pk if user and user.is_authenticated else None
+        self.resolver = get_resolver(self.context)
+        if any(name in self.fields for name in PostListSerializer.card_fields):
+            author_ids = [row['author_id'] for row in self.rows]
+            for comments in self.related.get('post_comment', {}).values():
+                author_ids.extend(comment['user_id'] for comment in comments)
+            self.resolver.prime(author_ids)
+
+        getters = [(name, getattr(self, f'get_{name}')) for name in self.fields]
+        return [{name: getter(row) for name, getter in getters} for row in self.rows]
+
+    def load_related(self, post_ids):
+        """One query per relation the selected fields read, grouped by post"""
+        if 'post_comment' in self.lookups:
+            comments = defaultdict(list)
+            for comment in Comment.objects.filter(post_id__in=post_ids).values(*COMMENT_COLUMNS):
+                comments[comment['post_id']].append(comment)
+            self.related['post_comment'] = comments
+        if 'post_react' in self.lookups:
+            self.related['post_react'] = group_by_post(
+                Reacts.objects.filter(post_id__in=post_ids).values_list('post_id', 'user_id', 'react')
+            )
+        if 'post_share' in self.lookups:
+            self.related['post_share'] = group_by_post(
+                Share.objects.filter(post_id__in=post_ids).values_list('post_id', 'user_id')
+            )
+        if 'post_save' in self.lookups:
+            self.related['post_save'] = group_by_post(
+                Save_Post.objects.filter(post_id__in=post_ids).values_list('post_id', 'user_id')
+            )
+        if 'tags' in self.lookups:
+            self.related['tags'] = tag_names(post_ids)
+
+    def rows_of(self, relation, row):
+        return self.related[relation].get(row['id'], ())
+
+    def image(self, row):
+        return self.image_field.attr_class(None, self.image_field, row['image'])
+
+    def get_id(self, row):
+        return row['id']
+
+    def get_author(self, row):
+        return self.resolver.get(row['author_id']) if row['author_id'] is not None else None
+
+    def get_post_type(self, row):
+        return row['post_type']
+
+    def get_title(self, row):
+        return row['title']
+
+    def get_content(self, row):
+        return row['content']
+
+    def get_image(self, row):
+        if not row['image']:
+            return None
+        return variant_url(self.image(row), row['image_variants'], DEFAULT_FEED_VARIANT, self.request)
+
+    def get_image_variants(self, row):
+        return variant_urls(self.image(row), row['image_variants'], self.request)
+
+    def get_image_status(self, row):
+        return variant_status(self.image(row), row['image_variants'])
+
+    def get_tags(self, row):
+        return list(self.rows_of('tags', row))
+
+    def get_created_at(self, row):
+        return self.date_field.to_representation(row['created_at'])
+
+    def get_trend(self, row):
+        return row['trend']
+
+    def get_comments_count(self, row):
+        return len(self.rows_of('post_comment', row))
+
+    def get_shares_count(self, row):
+        return len(self.rows_of('post_share', row))
+
+    def get_reactions(self, row):
+        breakdown = {'Love': 0, 'Dislike': 0, 'Thunder': 0}
+        for _, react in self.rows_of('post_react', row):
+            breakdown[react] = breakdown.get(react, 0) + 1
+        return breakdown
+
+    def get_saves_count(self, row):
+        return len(self.rows_of('post_save', row))
+
+    def get_comments(self, row):
+        comments = []
+        for comment in self.rows_of('post_comment', row):
+            card = self.resolver.get(comment['user_id'])
+            comments.append({
+                'id': comment['id'],
+                'user': card['username'] if card else None,
+                'first_name': card['first_name'] if card else None,
+                'last_name': card['last_name'] if card else None,
+                'author': card,
+                'content': comment['content'],
+                'created_at': self.date_field.to_representation(comment['created_at']),
+            })
+        return comments
+
+    def get_user_reaction(self, row):
+        if self.viewer_id is None:
+            return None
+        return next((react for user_id, react in self.rows_of('post_react', row) if user_id == self.viewer_id), None)
+
+    def get_is_shared(self, row):
+        if self.viewer_id is None:
+            return False
+        return any(user_id == self.viewer_id for user_id, in self.rows_of('post_share', row))
+
+    def get_is_saved(self, row):
+        if self.viewer_id is None:
+            return False
+        return any(user_id == self.viewer_id for user_id, in self.rows_of('post_save', row))
@@ -0,0 +1,279 @@
+"""
+Image processing pipeline for post and profile uploads.
+
+Uploaded images are re-encoded into a small set of fixed-size derivatives
+("variants") with all metadata stripped. The storage names of the variants are
+kept on the owning model in a JSON field so serializers can hand out the small
+version instead of the raw upload.
+"""
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Sent with sender=<model class> and pk=<row pk> whenever the stored variants
+# of a row change. Variants are written with queryset updates, so post_save
+# does not fire for them.
+variants_changed = Signal()
+
+# Square avatars, cropped to fill
+AVATAR_VARIANTS = {
+    'avatar_64': 64,
+    'avatar_128': 128,
+}
+
+# Feed images, scaled to a fixed width (never upscaled)
+FEED_VARIANTS = {
+    'feed_320': 320,
+    'feed_640': 640,
+    'feed_1280': 1280,
+}
+
+# Bounding box for the re-encoded full size copy
+FULL_SIZE_LIMITS = {
+    'profile': 1024,
+    'posts': 2048,
+}
+
+STATUS_PROCESSING = 'processing'
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+
+DEFAULT_AVATAR_VARIANT = 'avatar_128'
+DEFAULT_FEED_VARIANT = 'feed_640'
+
+VARIANT_FORMAT = getattr(settings, 'IMAGE_VARIANT_FORMAT', 'WEBP')
+VARIANT_QUALITY = getattr(settings, 'IMAGE_VARIANT_QUALITY', 80)
+VARIANT_EXTENSIONS = {
+    'WEBP': 'webp',
+    'JPEG': 'jpg',
+    'PNG': 'png',
+}
+
+
+def _normalize(image):
+    """Apply EXIF orientation and convert to a mode the target format can encode"""
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+    if has_alpha and VARIANT_FORMAT != 'JPEG':
+        return image.convert('RGBA')
+    return image.convert('RGB')
+
+
+def _encode(image):
+    """
+    Encode an image into the variant format.
+
+    A fresh image is built from the pixel data only, so EXIF, ICC, XMP and
+    any other metadata attached to the upload never reaches the output.
+    """
+    clean = Image.new(image.mode, image.size)
+    clean.paste(image)
+    buffer = io.BytesIO()
+    clean.save(buffer, format=VARIANT_FORMAT, quality=VARIANT_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def _fit_width(image, width):
+    if image.width <= width:
+        return image.copy()
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def _fit_box(image, size):
+    image = image.copy()
+    image.thumbnail((size, size), Image.LANCZOS)
+    return image
+
+
+def render_variants(source, kind):
+    """
+    Render all variants for an image.
+
+    Args:
+        source: File-like object or path of the uploaded image
+        kind (str): 'profile' for avatars or 'posts' for feed images
+
+    Returns:
+        dict: variant name -> encoded bytes
+    """
+    with Image.open(source) as image:
+        image.seek(0)  # First frame only for animated uploads
+        image = _normalize(image)
+
+    variants = {'full': _encode(_fit_box(image, FULL_SIZE_LIMITS[kind]))}
+    if kind == 'profile':
+        for name, size in AVATAR_VARIANTS.items():
+            variants[name] = _encode(ImageOps.fit(image, (size, size), Image.LANCZOS))
+    else:
+        for name, width in FEED_VARIANTS.items():
+            variants[name] = _encode(_fit_width(image, width))
+    return variants
+
+
+def _variant_name(source_name, variant):
+    directory, filename = os.path.split(source_name)
+    stem = os.path.splitext(filename)[0]
+    extension = VARIANT_EXTENSIONS.get(VARIANT_FORMAT, VARIANT_FORMAT.lower())
+    return os.path.join(directory, 'variants', f'{stem}_{variant}.{extension}')
+
+
+def delete_variants(variants, storage=None):
+    """Remove previously generated variant files from storage"""
+    storage = storage or default_storage
+    for name, path in variants.items():
+        if name in ('source', 'status') or not path:
+            continue
+        try:
+            storage.delete(path)
+        except Exception as e:
+            logger.warning("Could not delete image variant %s: %s", path, e)
+
+
+def store_variants(field_file, rendered):
+    """
+    Save rendered variants next to the original upload.
+
+    Returns:
+        dict: variant name -> storage name, plus the 'source' name and status
+    """
+    storage = field_file.storage
+    variants = {'source': field_file.name, 'status': STATUS_READY}
+    for name, content in rendered.items():
+        variants[name] = storage.save(
+            _variant_name(field_file.name, name), ContentFile(content)
+        )
+    return variants
+
+
+def generate_variants(field_file, kind):
+    """
+    Render and store the variants of an image field in the calling thread.
+
+    Returns:
+        dict: variant name -> storage name, plus the 'source' name the
+        variants were generated from and their status.
+    """
+    try:
+        field_file.open('rb')
+        try:
+            rendered = render_variants(field_file, kind)
+        finally:
+            field_file.close()
+    except Exception as e:
+        logger.warning("Could not process image %s: %s", field_file.name, e)
+        return {'source': field_file.name, 'status': STATUS_FAILED}
+    return store_variants(field_file, rendered)
+
+
+def apply_variants(model, pk, image_field, variants_field, variants):
+    """
+    Record variants on a row, provided its image is still the one they were
+    generated from. Variants that lost the race are removed from storage.
+
+    Returns:
+        bool: True if the row was updated
+    """
+    updated = model.objects.filter(
+        pk=pk, **{image_field: variants['source']}
+    ).update(**{variants_field: variants})
+    if not updated:
+        delete_variants(variants)
+    else:
+        variants_changed.send(sender=model, pk=pk)
+    return bool(updated)
+
+
+def processing_in_background():
+    return getattr(settings, 'IMAGE_PROCESSING_BACKGROUND', True)
+
+
+def sync_variants(instance, image_field, variants_field, kind):
+    """
+    Bring the stored variants of ``instance`` in line with its image field.
+
+    Variants are regenerated when the image changed since they were last
+    built and dropped when the image was cleared. With background processing
+    enabled the row is only marked as processing here and the work is handed
+    to the image worker once the transaction commits. The variants column is
+    written with a queryset update so no further save signals are fired.
+
+    Returns:
+        bool: True if the variants were changed
+    """
+    field_file = getattr(instance, image_field)
+    variants = getattr(instance, variants_field) or {}
+
+    if field_file and variants.get('source') == field_file.name:
+        return False
+    if not field_file and not variants:
+        return False
+
+    if variants:
+        delete_variants(variants, field_file.storage if field_file else None)
+
+    if not field_file:
+        new_variants = {}
+    elif processing_in_background():
+        new_variants = {'source': field_file.name, 'status': STATUS_PROCESSING}
+        from . import image_worker
+        job = image_worker.ImageJob(
+            type(instance), instance.pk, image_field, variants_field, kind, field_file.name
+        )
+        transaction.on_commit(lambda: image_worker.submit(job))
+    else:
+        new_variants = generate_variants(field_file, kind)
+
+    setattr(instance, variants_field, new_variants)
+    type(instance).objects.filter(pk=instance.pk).update(**{variants_field: new_variants})
+    variants_changed.send(sender=type(instance), pk=instance.pk)
+    return True
+
+
+def variant_status(field_file, variants):
+    """Processing status of an image: None, 'processing', 'ready' or 'failed'"""
+    if not field_file:
+        return None
+    variants = variants or {}
+    if variants.get('source') != field_file.name:
+        return STATUS_PROCESSING
+    return variants.get('status', STATUS_READY)
+
+
+def variant_url(field_file, variants, variant, request=None):
+    """
+    URL of the requested variant, falling back to the original upload.
+
+    Returns None if there is no image at all.
+    """
+    if not field_file:
+        return None
+    path = (variants or {}).get(variant)
+    url = field_file.storage.url(path) if path else field_file.url
+    if request:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def variant_urls(field_file, variants, request=None):
+    """Map every stored variant name to its URL"""
+    if not field_file:
+        return {}
+    urls = {}
+    for name, path in (variants or {}).items():
+        if name in ('source', 'status') or not path:
+            continue
+        url = field_file.storage.url(path)
+        urls[name] = request.build_absolute_uri(url) if request else url
+    return urls
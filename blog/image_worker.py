@@ -0,0 +1,143 @@
+"""
+Background worker for image variant generation.
+
+Rendering variants is CPU-bound Pillow work, so it runs in a process pool.
+A small thread pool sits in front of it and does the I/O around each job
+(reading the upload, storing the results and updating the row), which keeps
+request threads free: uploads only mark the row as processing and return.
+"""
+import io
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .image_processing import (
+    STATUS_FAILED,
+    apply_variants,
+    render_variants,
+    store_variants,
+)
+
+logger = logging.getLogger(__name__)
+
+ImageJob = namedtuple(
+    'ImageJob', ['model', 'pk', 'image_field', 'variants_field', 'kind', 'source']
+)
+
+_lock = threading.Lock()
+_dispatcher = None
+_process_pool = None
+
+
+def _worker_processes():
+    return getattr(settings, 'IMAGE_WORKER_PROCESSES', 2)
+
+
+def render_from_bytes(data, kind):
+    """Process pool entry point; only picklable bytes cross the boundary"""
+    return render_variants(io.BytesIO(data), kind)
+
+
+def get_process_pool():
+    """Process pool for rendering, or None when disabled by IMAGE_WORKER_PROCESSES = 0"""
+    global _process_pool
+    if _worker_processes() <= 0:
+        return None
+    with _lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=_worker_processes())
+        return _process_pool
+
+
+def _get_dispatcher():
+    global _dispatcher
+    with _lock:
+        if _dispatcher is None:
+            _dispatcher = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_WORKER_THREADS', 2),
+                thread_name_prefix='image-worker'
+            )
+        return _dispatcher
+
+
+def render(data, kind):
+    """Render variants from image bytes in the process pool, or inline without one"""
+    pool = get_process_pool()
+    if pool is None:
+        return render_from_bytes(data, kind)
+    return pool.submit(render_from_bytes, data, kind).result()
+
+
+def read_source(job):
+    """
+    Load the upload a job refers to.
+
+    Returns:
+        FieldFile and its bytes, or (None, None) if the row or its image has
+        changed since the job was queued.
+    """
+    instance = job.model.objects.filter(pk=job.pk).first()
+    if instance is None:
+        return None, None
+    field_file = getattr(instance, job.image_field)
+    if not field_file or field_file.name != job.source:
+        return None, None
+    with field_file.open('rb') as f:
+        data = f.read()
+    return field_file, data
+
+
+def process_job(job):
+    """
+    Generate and record the variants for one upload.
+
+    Returns:
+        bool: True if the variants were recorded on the row
+    """
+    field_file, data = read_source(job)
+    if field_file is None:
+        return False
+    try:
+        rendered = render(data, job.kind)
+    except Exception as e:
+        logger.warning("Could not process image %s: %s", job.source, e)
+        variants = {'source': job.source, 'status': STATUS_FAILED}
+    else:
+        variants = store_variants(field_file, rendered)
+    return apply_variants(job.model, job.pk, job.image_field, job.variants_field, variants)
+
+
+def _run_job(job):
+    try:
+        return process_job(job)
+    finally:
+        close_old_connections()
+
+
+def submit(job):
+    """Queue a job on the background worker and return immediately"""
+    future = _get_dispatcher().submit(_run_job, job)
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def _log_failure(future):
+    error = future.exception()
+    if error is not None:
+        logger.error("Image worker job failed: %s", error)
+
+
+def shutdown(wait=True):
+    """Stop the worker pools, e.g. at the end of a management command"""
+    global _dispatcher, _process_pool
+    with _lock:
+        if _dispatcher is not None:
+            _dispatcher.shutdown(wait=wait)
+            _dispatcher = None
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=wait)
+            _process_pool = None
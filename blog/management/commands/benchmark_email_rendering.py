@@ -0,0 +1,71 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from blog.email_templates import VERIFICATION_EMAILS, render_verification_email
+from blog.email_verification_service import EmailVerificationService
+
+
+class BenchUser:
+    def __init__(self, first_name):
+        self.first_name = first_name
+
+
+class Command(BaseCommand):
+    help = 'Compare render_to_string with the precompiled verification email templates'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--emails',
+            type=int,
+            default=2000,
+            help='Emails rendered by each method (default: 2000)',
+        )
+        parser.add_argument(
+            '--type',
+            choices=list(VERIFICATION_EMAILS),
+            default='registration',
+            help='Verification email to render (default: registration)',
+        )
+
+    def handle(self, *args, **options):
+        verification_type = options['type']
+        count = options['emails']
+        support_email = getattr(settings, 'EMAIL_VERIFICATION_SUPPORT_EMAIL', 'cymate@gmail.com')
+        expiry = EmailVerificationService.CODE_EXPIRY_MINUTES
+        recipients = [
+            (f'{i:06d}', f'user{i}@example.com', BenchUser(f'User{i}' if i % 2 else ''))
+            for i in range(count)
+        ]
+        template = VERIFICATION_EMAILS[verification_type]['template'] + '.html'
+
+        def render_templates(code, email, user):
+            context = {
+                'code': code,
+                'email': email,
+                'user': user,
+                'expiry_minutes': expiry,
+                'verification_type': verification_type,
+                'support_email': support_email,
+            }
+            return render_to_string(template, context)
+
+        def render_precompiled(code, email, user):
+            return render_verification_email(verification_type, code, email, expiry, support_email, user)
+
+        # Warm up the template loader and the precompiled templates
+        render_templates(*recipients[0])
+        render_precompiled(*recipients[0])
+
+        self.stdout.write(f'Rendering {count} {verification_type} emails')
+        for label, render in (('render_to_string (HTML only)', render_templates),
+                              ('precompiled (HTML + text)', render_precompiled)):
+            started = time.perf_counter()
+            for recipient in recipients:
+                render(*recipient)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{label:<30} {count / elapsed:10.0f} emails/s   {elapsed * 1e6 / count:8.1f} µs/email'
+            )
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from blog.api import feed_queryset
+from blog.feed import POST_COLUMNS, FeedSerializer
+from blog.management.commands.benchmark_servers import Command as ServerBenchmark
+from blog.models import Post
+from blog.serializer import PostListSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare PostListSerializer with the fast-path FeedSerializer on feed pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=20,
+            help='Posts per serialized feed page (default: 20)',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=200,
+            help='Pages each serializer builds, queries included (default: 200)',
+        )
+        parser.add_argument(
+            '--posts',
+            type=int,
+            default=200,
+            help='Benchmark posts to seed if fewer exist (default: 200)',
+        )
+
+    def handle(self, *args, **options):
+        user, _ = ServerBenchmark(stdout=self.stdout).seed(options['posts'])
+        request = RequestFactory().get('/api/posts/')
+        request.user = user
+        page_size = options['page_size']
+        bench_posts = Post.objects.filter(author__username__startswith='bench_').order_by('-created_at', '-id')
+
+        def drf_page():
+            posts = feed_queryset().filter(pk__in=bench_posts.values('pk')).order_by('-created_at', '-id')
+            return PostListSerializer(posts[:page_size], many=True, context={'request': request}).data
+
+        def fast_page():
+            return FeedSerializer(bench_posts.values(*POST_COLUMNS)[:page_size], {'request': request}).data
+
+        renderer = JSONRenderer()
+        expected = drf_page()
+        if renderer.render(fast_page()) != renderer.render(expected):
+            raise CommandError('The serializers disagree on this page')
+
+        self.stdout.write(
+            f'Building a {len(expected)}-post feed page {options["iterations"]} times '
+            f'(queries and author cards included)'
+        )
+        timings = {}
+        for label, build in (('PostListSerializer', drf_page), ('FeedSerializer', fast_page)):
+            started = time.perf_counter()
+            for _ in range(options['iterations']):
+                build()
+            timings[label] = (time.perf_counter() - started) / options['iterations']
+            self.stdout.write(
+                f'{label:<19} {timings[label] * 1e3:8.2f} ms/page  '
+                f'{len(expected) / timings[label]:9.0f} items/s'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'FeedSerializer is {timings["PostListSerializer"] / timings["FeedSerializer"]:.1f}x faster '
+            f'with identical output'
+        ))
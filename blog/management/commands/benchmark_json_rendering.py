@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from blog.api import feed_queryset
+from blog.management.commands.benchmark_servers import Command as ServerBenchmark
+from blog.renderers import FastJSONRenderer, orjson_available
+from blog.serializer import PostListSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare the stdlib JSON renderer with the orjson renderer on feed payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=20,
+            help='Posts per serialized feed page (default: 20)',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=500,
+            help='Times each renderer encodes the page (default: 500)',
+        )
+        parser.add_argument(
+            '--posts',
+            type=int,
+            default=200,
+            help='Benchmark posts to seed if fewer exist (default: 200)',
+        )
+
+    def handle(self, *args, **options):
+        if not orjson_available():
+            raise CommandError('orjson is not installed or FAST_JSON is off')
+
+        user, _ = ServerBenchmark(stdout=self.stdout).seed(options['posts'])
+        request = RequestFactory().get('/api/posts/')
+        request.user = user
+        posts = feed_queryset().filter(author__username__startswith='bench_')[:options['page_size']]
+        data = {'count': options['page_size'], 'next': None, 'previous': None, 'results': PostListSerializer(
+            posts, many=True, context={'request': request}
+        ).data}
+
+        stdlib, fast = JSONRenderer(), FastJSONRenderer()
+        expected = stdlib.render(data)
+        if fast.render(data) != expected:
+            raise CommandError('The renderers disagree on this payload')
+
+        self.stdout.write(
+            f'Encoding a {len(data["results"])}-post feed page ({len(expected) / 1024:.1f} KiB) '
+            f'{options["iterations"]} times'
+        )
+        timings = {}
+        for label, renderer in (('json (stdlib)', stdlib), ('orjson', fast)):
+            started = time.perf_counter()
+            for _ in range(options['iterations']):
+                renderer.render(data)
+            timings[label] = (time.perf_counter() - started) / options['iterations']
+            self.stdout.write(f'{label:<14} {timings[label] * 1e6:9.1f} µs/page')
+        self.stdout.write(self.style.SUCCESS(
+            f'orjson encodes {timings["json (stdlib)"] / timings["orjson"]:.1f}x faster with identical output'
+        ))
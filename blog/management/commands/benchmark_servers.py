@@ -0,0 +1,195 @@
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+from blog.models import Comment, Post, Reacts, User
+
+BENCH_PREFIX = 'bench_'
+
+ENDPOINTS = {
+    'feed': ('/api/posts/', '/api/async/posts/'),
+    'profile': ('/api/profile/{username}/', '/api/async/profile/{username}/'),
+    'notifications': ('/api/notifications/', '/api/async/notifications/'),
+    'detail': ('/api/posts/{post_id}/', '/api/async/posts/{post_id}/'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare the sync endpoints under gunicorn with the async endpoints under uvicorn'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--endpoint',
+            choices=list(ENDPOINTS),
+            default='feed',
+            help='Endpoint to load (default: feed)',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=500,
+            help='Requests sent to each server (default: 500)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=50,
+            help='Concurrent client connections (default: 50)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Worker processes per server (default: 2)',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=4,
+            help='Threads per gunicorn worker (default: 4)',
+        )
+        parser.add_argument(
+            '--posts',
+            type=int,
+            default=200,
+            help='Benchmark posts to seed if fewer exist (default: 200)',
+        )
+        parser.add_argument(
+            '--port',
+            type=int,
+            default=8701,
+            help='First port to bind the servers to (default: 8701)',
+        )
+
+    def handle(self, *args, **options):
+        user, post = self.seed(options['posts'])
+        token = Token.objects.get_or_create(user=user)[0].key
+        sync_path, async_path = (
+            path.format(username=user.username, post_id=post.pk)
+            for path in ENDPOINTS[options['endpoint']]
+        )
+
+        servers = [
+            ('gunicorn (sync)', sync_path, [
+                sys.executable, '-m', 'gunicorn', 'project.wsgi:application',
+                '--workers', str(options['workers']),
+                '--threads', str(options['threads']),
+                '--bind', f'127.0.0.1:{options["port"]}',
+            ], options['port']),
+            ('uvicorn (async)', async_path, [
+                sys.executable, '-m', 'uvicorn', 'project.asgi:application',
+                '--workers', str(options['workers']),
+                '--port', str(options['port'] + 1),
+                '--log-level', 'warning',
+            ], options['port'] + 1),
+        ]
+
+        self.stdout.write(
+            f'{options["requests"]} requests to the {options["endpoint"]} endpoint, '
+            f'{options["concurrency"]} concurrent clients, {options["workers"]} workers per server'
+        )
+        for label, path, command, port in servers:
+            result = self.run_server(command, port, path, token, options)
+            self.stdout.write(
+                f'{label:<16} {result["rps"]:8.1f} req/s   '
+                f'p50 {result["p50"]:7.1f} ms   p95 {result["p95"]:7.1f} ms   '
+                f'p99 {result["p99"]:7.1f} ms   errors {result["errors"]}'
+            )
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
+
+    def seed(self, posts):
+        """Create the benchmark users, posts, comments and reactions once"""
+        users = []
+        for i in range(10):
+            user, created = User.objects.get_or_create(
+                username=f'{BENCH_PREFIX}{i}',
+                defaults={'email': f'{BENCH_PREFIX}{i}@example.com', 'first_name': f'Bench{i}'}
+            )
+            if created:
+                user.set_password(os.urandom(16).hex())
+                user.save()
+            users.append(user)
+
+        existing = Post.objects.filter(author__username__startswith=BENCH_PREFIX).count()
+        for i in range(existing, posts):
+            author = users[i % len(users)]
+            post = Post.objects.create(title=f'Benchmark post {i}', content='Benchmark content ' * 20, author=author)
+            post.tags.add('benchmark', f'topic{i % 7}')
+            for j in range(3):
+                Comment.objects.create(post=post, user=users[(i + j + 1) % len(users)], content='Benchmark comment')
+            Reacts.objects.create(post=post, user=users[(i + 1) % len(users)], react='Love')
+        if existing < posts:
+            self.stdout.write(f'Seeded {posts - existing} benchmark posts')
+
+        post = Post.objects.filter(author=users[0]).order_by('-created_at').first()
+        return users[0], post
+
+    def run_server(self, command, port, path, token, options):
+        process = subprocess.Popen(
+            command,
+            cwd=settings.BASE_DIR,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            self.wait_for_port(port, process)
+            # Warm up connections, caches and worker imports
+            for _ in range(options['workers'] * 4):
+                self.request(port, path, token)
+            return self.load(port, path, token, options['requests'], options['concurrency'])
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    @staticmethod
+    def wait_for_port(port, process, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'Server exited with code {process.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'Server did not start listening on port {port}')
+
+    @staticmethod
+    def request(port, path, token):
+        """Send one request; returns (latency in seconds, success)"""
+        started = time.perf_counter()
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        try:
+            connection.request('GET', path, headers={'Authorization': f'Token {token}'})
+            response = connection.getresponse()
+            response.read()
+            ok = response.status == 200
+        except OSError:
+            ok = False
+        finally:
+            connection.close()
+        return time.perf_counter() - started, ok
+
+    def load(self, port, path, token, requests, concurrency):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(lambda _: self.request(port, path, token), range(requests)))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency * 1000 for latency, _ in results)
+        percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            'rps': requests / elapsed,
+            'p50': percentiles[49],
+            'p95': percentiles[94],
+            'p99': percentiles[98],
+            'errors': sum(1 for _, ok in results if not ok),
+        }
@@ -0,0 +1,149 @@
+from collections import Counter
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from blog.models import Post, Profile, StoredFile, UploadSession
+
+
+class Command(BaseCommand):
+    help = 'Remove media files that are no longer referenced by any post or profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=24,
+            help='Only remove files released more than this many hours ago (default: 24)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of files removed per batch (default: 500)',
+        )
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help='Recompute reference counts from posts and profiles before cleaning up',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be deleted without actually deleting',
+        )
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            self.recount(options['dry_run'])
+
+        if not options['dry_run']:
+            stale = UploadSession.cleanup_stale_sessions(hours=options['hours'])
+            if stale:
+                self.stdout.write(f'Discarded {stale} stale chunked uploads')
+
+        cutoff_time = timezone.now() - timezone.timedelta(hours=options['hours'])
+        orphans = StoredFile.objects.filter(
+            ref_count__lte=0,
+            released_at__lt=cutoff_time
+        ).order_by('pk')
+
+        if options['dry_run']:
+            count = orphans.count()
+            self.stdout.write(
+                self.style.WARNING(
+                    f'DRY RUN: Would delete {count} orphaned media files released more than {options["hours"]} hours ago'
+                )
+            )
+            for stored in orphans[:10]:  # Show first 10
+                self.stdout.write(f'  - {stored.name} (released {stored.released_at})')
+            if count > 10:
+                self.stdout.write(f'  ... and {count - 10} more')
+            return
+
+        deleted = freed = 0
+        last_pk = 0
+        batch_size = max(1, options['batch_size'])
+        while True:
+            batch = list(
+                orphans.filter(pk__gt=last_pk).values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1]
+
+            batch_deleted, batch_freed = self.delete_batch(batch)
+            deleted += batch_deleted
+            freed += batch_freed
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully deleted {deleted} orphaned media files ({freed} bytes)'
+            )
+        )
+
+    def delete_batch(self, pks):
+        """
+        Delete the rows still unreferenced and purge their files.
+
+        The rows stay locked until the files are gone, so an upload of the same
+        content waits and then writes the file again. Files of rows an upload
+        referenced meanwhile are kept.
+
+        Returns:
+            tuple: (files deleted, bytes freed)
+        """
+        deleted = freed = 0
+        with transaction.atomic():
+            orphans = list(
+                StoredFile.objects.select_for_update().filter(pk__in=pks, ref_count__lte=0).values_list('pk', 'name', 'size')
+            )
+            orphan_pks = [pk for pk, _, _ in orphans]
+            removed, _ = StoredFile.objects.filter(pk__in=orphan_pks, ref_count__lte=0).delete()
+            if removed < len(orphans):
+                # Without row locks (SQLite) a reference may have been taken in between
+                kept = set(StoredFile.objects.filter(pk__in=orphan_pks).values_list('pk', flat=True))
+                orphans = [orphan for orphan in orphans if orphan[0] not in kept]
+            for _, name, size in orphans:
+                try:
+                    default_storage.purge(name)
+                except Exception as e:
+                    self.stderr.write(f'  - Could not delete {name}: {e}')
+                    continue
+                deleted += 1
+                freed += size
+        return deleted, freed
+
+    def recount(self, dry_run):
+        """Rebuild reference counts from the image and variant fields"""
+        references = Counter()
+        for image, variants in Post.objects.values_list('image', 'image_variants').iterator():
+            self.count_references(references, image, variants)
+        for image, variants in Profile.objects.values_list('profile_image', 'profile_image_variants').iterator():
+            self.count_references(references, image, variants)
+
+        changed = []
+        now = timezone.now()
+        for stored in StoredFile.objects.iterator():
+            ref_count = references.get(stored.name, 0)
+            if stored.ref_count == ref_count:
+                continue
+            if ref_count == 0:
+                stored.released_at = now
+            elif stored.ref_count <= 0:
+                stored.released_at = None
+            stored.ref_count = ref_count
+            changed.append(stored)
+
+        if not dry_run:
+            StoredFile.objects.bulk_update(changed, ['ref_count', 'released_at'], batch_size=500)
+        self.stdout.write(f'Recounted references: {len(changed)} files changed')
+
+    @staticmethod
+    def count_references(references, image, variants):
+        if image:
+            references[image] += 1
+        for name, path in (variants or {}).items():
+            if name not in ('source', 'status') and path:
+                references[path] += 1
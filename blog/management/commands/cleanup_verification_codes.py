@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from blog.models import EmailVerification
+from blog.verification_codes import uses_database
 
 
 class Command(BaseCommand):
@@ -23,6 +24,13 @@ class Command(BaseCommand):
         hours = options['hours']
         dry_run = options['dry_run']
 
+        if not uses_database():
+            # Cached codes expire on their own; only rows from before switching stores remain
+            self.stdout.write(
+                'Verification codes are kept in the cache and expire by themselves; '
+                'sweeping leftover database rows only'
+            )
+
         # Calculate cutoff time
         cutoff_time = timezone.now() - timezone.timedelta(hours=hours)
 
@@ -0,0 +1,169 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from rest_framework.test import APIRequestFactory, force_authenticate
+from blog import timelines
+from blog.email_verification_service import EmailVerificationService
+from blog.management.commands.benchmark_servers import BENCH_PREFIX, Command as ServerBenchmark
+from blog.models import Post, Save_Post, Share, User
+
+# A table read row by row: "SCAN blog_post", but not "SCAN blog_post USING INDEX ..."
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+POSTGRESQL_FULL_SCAN = re.compile(r'Seq Scan on (\w+)')
+# A paginator's count of a whole table reads every row by design
+WHOLE_TABLE_COUNT = re.compile(r'^SELECT COUNT\(\*\) AS "__count" FROM "\w+"$')
+# Django's table aliases, as in FROM "blog_post" U0 or JOIN "blog_user" T3
+TABLE_ALIAS = re.compile(r'"(\w+)" ([TU]\d+)\b')
+
+
+def explain(sql):
+    """The query plan of a captured query, one line per step"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute('EXPLAIN ' + sql)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def full_scans(sql, plan, vendor=None):
+    """Names of the tables a query plan scans without an index"""
+    pattern = SQLITE_FULL_SCAN if (vendor or connection.vendor) == 'sqlite' else POSTGRESQL_FULL_SCAN
+    aliases = dict((alias, table) for table, alias in TABLE_ALIAS.findall(sql))
+    names = [match.group(1) for match in (pattern.search(line.strip()) for line in plan) if match]
+    return [aliases.get(name, name) for name in names]
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the queries of the read endpoints on a large seeded dataset and fail on full table scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts',
+            type=int,
+            default=1000,
+            help='Benchmark posts to seed if fewer exist (default: 1000)',
+        )
+        parser.add_argument(
+            '--min-rows',
+            type=int,
+            default=500,
+            help='Only fail on scans of tables with at least this many rows (default: 500)',
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=1000,
+            help='Users without posts to add, so user lookups run on a large table (default: 1000)',
+        )
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Print the plan of every query',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f'EXPLAIN output of {connection.vendor} is not supported')
+
+        # Seed, explain and roll everything back
+        with transaction.atomic():
+            user, post = self.seed(options['posts'], options['users'])
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            failures = self.explain_checks(self.checks(user, post), options)
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(
+                f'{len(failures)} queries scan large tables without an index:\n' + '\n'.join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS('No full table scans'))
+
+    def seed(self, posts, extra_users):
+        user, post = ServerBenchmark(stdout=self.stdout).seed(posts)
+        User.objects.bulk_create(
+            (User(username=f'explain_{i}', email=f'explain_{i}@example.com') for i in range(extra_users)),
+            ignore_conflicts=True
+        )
+        bench_posts = list(Post.objects.filter(author__username__startswith=BENCH_PREFIX).select_related('author'))
+        users = list(User.objects.filter(username__startswith=BENCH_PREFIX).order_by('username'))
+        Share.objects.bulk_create(
+            Share(post=bench_post, user=users[(i + 2) % len(users)]) for i, bench_post in enumerate(bench_posts)
+        )
+        Save_Post.objects.bulk_create(
+            (Save_Post(post=bench_post, user=users[(i + 3) % len(users)]) for i, bench_post in enumerate(bench_posts)),
+            ignore_conflicts=True
+        )
+        for followee in users[1:5]:
+            timelines.follow(user, followee)
+        return user, post
+
+    def checks(self, user, post):
+        """(label, callable) pairs covering the hot query shapes"""
+        def get(name, query='', **kwargs):
+            def call():
+                path = reverse(name, kwargs=kwargs) + query
+                match = resolve(path.split('?')[0])
+                request = APIRequestFactory().get(path)
+                force_authenticate(request, user=user)
+                response = match.func(request, *match.args, **match.kwargs)
+                if response.status_code != 200:
+                    raise CommandError(f'GET {path} returned {response.status_code}')
+                response.render()
+            return call
+
+        return [
+            ('GET posts/', get('post-list')),
+            ('GET posts/?tags=', get('post-list', '?tags=benchmark')),
+            ('GET posts/<pk>/', get('post-detail', pk=post.pk)),
+            ('GET posts/saved/', get('saved-posts')),
+            ('GET posts/following/', get('home-timeline')),
+            ('GET profile/<username>/', get('profile-detail', username=user.username)),
+            ('GET notifications/', get('notifications')),
+            ('GET notifications/inbox/', get('notification-inbox')),
+            ('Post.get_reactions_breakdown', post.get_reactions_breakdown),
+            ('Post comments by time', lambda: list(post.post_comment.order_by('created_at'))),
+            ('Share lookup', lambda: Share.objects.filter(post=post, user=user).exists()),
+            ('User by email', lambda: EmailVerificationService.get_user_by_email(user.email)),
+        ]
+
+    def explain_checks(self, checks, options):
+        """Run each check, EXPLAIN its SELECTs and return the offending ones"""
+        row_counts = {}
+        tables = set(connection.introspection.table_names())
+
+        def row_count(table):
+            if table not in row_counts:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                    row_counts[table] = cursor.fetchone()[0]
+            return row_counts[table]
+
+        failures = []
+        for label, call in checks:
+            # The query log is capped, and seeding may have filled it
+            reset_queries()
+            with CaptureQueriesContext(connection) as context:
+                call()
+            selects = [query['sql'] for query in context.captured_queries if query['sql'].lstrip().upper().startswith('SELECT')]
+            problems = []
+            for sql in selects:
+                plan = explain(sql)
+                if options['verbose_plans']:
+                    self.stdout.write(f'  {sql}\n' + ''.join(f'    {line}\n' for line in plan))
+                if WHOLE_TABLE_COUNT.match(sql):
+                    continue
+                # Derived tables ("subquery") are only as large as the query they wrap
+                scanned = [
+                    table for table in full_scans(sql, plan)
+                    if table in tables and row_count(table) >= options['min_rows']
+                ]
+                if scanned:
+                    problems.append(f'{label}: scans {", ".join(scanned)} in {sql}')
+            self.stdout.write(f'{label:<30} {len(selects):3d} queries  {"FULL SCAN" if problems else "ok"}')
+            failures.extend(problems)
+        return failures
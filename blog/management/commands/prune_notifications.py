@@ -0,0 +1,101 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from blog.models import Notification
+from blog.notification_retention import compact, delete_in_batches, enforce_user_cap
+
+
+class Command(BaseCommand):
+    help = 'Compact, cap and expire notifications in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=90,
+            help='Delete notifications older than this many days (default: 90)',
+        )
+        parser.add_argument(
+            '--per-user',
+            type=int,
+            default=500,
+            help='Keep at most this many notifications per user, 0 for no cap (default: 500)',
+        )
+        parser.add_argument(
+            '--compact-after-days',
+            type=int,
+            default=7,
+            help='Collapse notifications of the same type and post older than this many days (default: 7)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows deleted per batch (default: 1000)',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.1,
+            help='Seconds to sleep between batches (default: 0.1)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be changed without changing anything',
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        dry_run = options['dry_run']
+        batch = {
+            'batch_size': max(1, options['batch_size']),
+            'pause': options['pause'],
+            'dry_run': dry_run,
+        }
+        before = Notification.objects.count()
+        started = time.monotonic()
+        prefix = 'DRY RUN: Would have ' if dry_run else ''
+
+        now = timezone.now()
+        collapsed, merged = self.step(
+            'Compacting',
+            compact,
+            now - timezone.timedelta(days=options['compact_after_days']),
+            **batch
+        )
+        self.stdout.write(f'{prefix}Collapsed {merged} notifications into {collapsed} aggregates')
+
+        expired = self.step(
+            'Expiring',
+            delete_in_batches,
+            Notification.objects.filter(created_at__lt=now - timezone.timedelta(days=options['days'])),
+            **batch
+        )
+        self.stdout.write(f'{prefix}Deleted {expired} notifications older than {options["days"]} days')
+
+        capped = 0
+        if options['per_user'] > 0:
+            capped = self.step('Capping', enforce_user_cap, options['per_user'], **batch)
+            self.stdout.write(
+                f'{prefix}Deleted {capped} notifications beyond {options["per_user"]} per user'
+            )
+
+        elapsed = time.monotonic() - started
+        removed = merged + expired + capped
+        message = (
+            f'{prefix}Removed {removed} of {before} notifications in {elapsed:.1f}s '
+            f'({removed / elapsed if elapsed else 0:.0f} rows/s)'
+        )
+        self.stdout.write(self.style.WARNING(message) if dry_run else self.style.SUCCESS(message))
+
+    def step(self, label, function, *args, **kwargs):
+        """Run one phase, printing the running total after each batch at verbosity 2"""
+        started = time.monotonic()
+
+        def progress(total):
+            if self.verbosity >= 2:
+                self.stdout.write(f'  {label}: {total} rows after {time.monotonic() - started:.1f}s')
+
+        return function(*args, progress=progress, **kwargs)
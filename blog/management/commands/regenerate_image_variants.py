@@ -0,0 +1,125 @@
+from django.core.management.base import BaseCommand
+from blog.models import Post, Profile
+from blog import image_worker
+from blog.image_processing import (
+    STATUS_READY,
+    apply_variants,
+    delete_variants,
+    store_variants,
+    variant_status,
+)
+
+
+class Command(BaseCommand):
+    help = 'Regenerate resized image variants for post and profile images'
+
+    TARGETS = {
+        'posts': (Post, 'image', 'image_variants', 'posts'),
+        'profiles': (Profile, 'profile_image', 'profile_image_variants', 'profile'),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            choices=['posts', 'profiles', 'all'],
+            default='all',
+            help='Which images to process (default: all)',
+        )
+        parser.add_argument(
+            '--missing-only',
+            action='store_true',
+            help='Only process images whose variants are not ready',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Number of images rendered in parallel per batch (default: 50)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show how many images would be processed without processing them',
+        )
+
+    def handle(self, *args, **options):
+        targets = list(self.TARGETS) if options['model'] == 'all' else [options['model']]
+        try:
+            for target in targets:
+                self.regenerate(target, options)
+        finally:
+            image_worker.shutdown()
+
+    def regenerate(self, target, options):
+        model, image_field, variants_field, kind = self.TARGETS[target]
+        queryset = model.objects.exclude(**{image_field: ''}).exclude(
+            **{f'{image_field}__isnull': True}
+        ).order_by('pk')
+
+        if options['missing_only']:
+            queryset = [
+                obj for obj in queryset.iterator()
+                if variant_status(getattr(obj, image_field), getattr(obj, variants_field)) != STATUS_READY
+            ]
+        count = len(queryset) if isinstance(queryset, list) else queryset.count()
+
+        if options['dry_run']:
+            self.stdout.write(
+                self.style.WARNING(f'DRY RUN: Would regenerate variants for {count} {target}')
+            )
+            return
+
+        pool = image_worker.get_process_pool()
+        batch_size = max(1, options['batch_size'])
+        done = failed = 0
+        batch = []
+        items = queryset if isinstance(queryset, list) else queryset.iterator(chunk_size=batch_size)
+        for obj in items:
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                ok, bad = self.process_batch(batch, pool, image_field, variants_field, kind)
+                done, failed = done + ok, failed + bad
+                batch = []
+        if batch:
+            ok, bad = self.process_batch(batch, pool, image_field, variants_field, kind)
+            done, failed = done + ok, failed + bad
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Regenerated variants for {done} of {count} {target}')
+        )
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} {target} could not be processed'))
+
+    def process_batch(self, batch, pool, image_field, variants_field, kind):
+        """Render a batch in parallel, then store the results from this process"""
+        jobs = []
+        for obj in batch:
+            job = image_worker.ImageJob(
+                type(obj), obj.pk, image_field, variants_field, kind, getattr(obj, image_field).name
+            )
+            try:
+                field_file, data = image_worker.read_source(job)
+            except Exception as e:
+                self.stderr.write(f'  - {job.source}: {e}')
+                continue
+            if field_file is not None:
+                jobs.append((obj, job, field_file, data))
+
+        if pool is None:
+            futures = [None] * len(jobs)
+        else:
+            futures = [pool.submit(image_worker.render_from_bytes, data, kind) for _, _, _, data in jobs]
+
+        done = 0
+        for (obj, job, field_file, data), future in zip(jobs, futures):
+            try:
+                rendered = future.result() if future else image_worker.render(data, kind)
+            except Exception as e:
+                self.stderr.write(f'  - {job.source}: {e}')
+                continue
+            previous = getattr(obj, variants_field) or {}
+            variants = store_variants(field_file, rendered)
+            if apply_variants(type(obj), obj.pk, image_field, variants_field, variants):
+                delete_variants(previous, field_file.storage)
+                done += 1
+        return done, len(batch) - done
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from blog.email_queue import drain
+from blog.models import OutboundEmail
+
+
+class Command(BaseCommand):
+    help = 'Send queued outbound emails over a single SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling the queue instead of exiting once it is empty',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Seconds between polls with --loop (default: 5)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show how many emails are queued without sending them',
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            counts = {
+                status: OutboundEmail.objects.filter(status=status).count()
+                for status, _ in OutboundEmail.STATUSES
+            }
+            summary = ', '.join(f'{count} {status}' for status, count in counts.items())
+            self.stdout.write(self.style.WARNING(f'DRY RUN: Queue holds {summary}'))
+            return
+
+        while True:
+            sent = drain()
+            if sent:
+                self.stdout.write(self.style.SUCCESS(f'Sent {sent} queued emails'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        failed = OutboundEmail.objects.filter(status=OutboundEmail.STATUS_FAILED).count()
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} emails failed permanently'))
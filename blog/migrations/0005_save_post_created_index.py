@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='save_post',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='blog_save_user_created_idx'),
+        ),
+    ]
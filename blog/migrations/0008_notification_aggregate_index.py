@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_notification_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'post', 'notification_type'], name='blog_notif_aggregate_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+def provision_missing_profiles(apps, schema_editor):
+    """Profiles used to be (re)created on every User save; now only on creation"""
+    User = apps.get_model('blog', 'User')
+    Profile = apps.get_model('blog', 'Profile')
+    missing = User.objects.filter(user_profile__isnull=True).values_list('pk', flat=True)
+    Profile.objects.bulk_create([Profile(user_id=pk) for pk in missing], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_outbound_email'),
+    ]
+
+    operations = [
+        migrations.RunPython(provision_missing_profiles, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,9 @@
 from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.exceptions import APIException
 from .models import Notification, User
 from .serializer import NotificationSerializer  # Updated import
+from .uploads import StreamingImageUploadHandler
 
 class NotificationMixin:
     def finalize_response(self, request, response, *args, **kwargs):
@@ -39,3 +42,49 @@ class NotificationMixin:
 
         return super().finalize_response(request, response, *args, **kwargs)
 
+
+class InvalidUpload(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_code = 'invalid_upload'
+
+
+class StreamingUploadMixin:
+    """
+    Parse multipart uploads with StreamingImageUploadHandler so oversized or
+    non-image files are rejected from their first bytes instead of after the
+    whole body has been buffered.
+
+    Views set ``upload_limits`` to map file field names to size limits.
+    """
+    upload_limits = {}
+
+    def get_upload_limits(self):
+        return self.upload_limits
+
+    def initialize_request(self, request, *args, **kwargs):
+        limits = self.get_upload_limits()
+        self.upload_handler = StreamingImageUploadHandler(request, limits=limits)
+        request.upload_handlers = [self.upload_handler]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.content_type.startswith('multipart/form-data'):
+            self.parse_upload(request)
+            error = self.upload_handler.error
+            if error is not None:
+                detail = {'error': error.message}
+                if error.field is not None:
+                    detail['field'] = error.field
+                raise InvalidUpload(detail)
+
+    def parse_upload(self, request):
+        """
+        Parse the multipart body before the handler method runs.
+
+        The upload handler records a rejected upload and stops parsing instead
+        of raising, so ``request.data`` comes out incomplete. Parsing lazily,
+        on the handler's first ``request.data`` access, would run the view on
+        that data and answer with field errors instead of the upload error.
+        """
+        return request.data
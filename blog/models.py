@@ -1,13 +1,95 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from taggit.managers import TaggableManager
 from django.utils import timezone
+import copy
 import datetime
+import os
+import uuid
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.db.models import Count
 
-class User(AbstractUser):
+class ChangeTrackingMixin:
+    """
+    Remembers the values a row was loaded or last saved with, so edits can be
+    written by ``save_changes()`` as an UPDATE of only the modified columns,
+    or skipped when nothing changed. ``post_save`` receivers then see the
+    changed columns in ``update_fields``.
+
+    Tracking is opt-in, so plain reads pay nothing: edit paths call
+    ``track_changes()`` on the loaded instance before modifying it. Without
+    it every loaded field counts as changed.
+    """
+
+    def track_changes(self):
+        """Remember the current values as the saved ones; returns the instance"""
+        self.remember_saved_values()
+        return self
+
+    def is_tracking_changes(self):
+        return '_saved_values' in self.__dict__
+
+    def tracked_value(self, field):
+        value = field.value_from_object(self)
+        if isinstance(field, models.FileField):
+            # A newly assigned upload differs even if it has the stored name
+            return (value.name or '', value._committed) if value is not None else ('', True)
+        if isinstance(field, models.JSONField):
+            return copy.deepcopy(value)
+        return value
+
+    def remember_saved_values(self, fields=None):
+        deferred = self.get_deferred_fields()
+        saved = self.__dict__.setdefault('_saved_values', {})
+        for field in self._meta.concrete_fields:
+            if field.attname in deferred:
+                continue
+            if fields is None or field.name in fields or field.attname in fields:
+                saved[field.attname] = self.tracked_value(field)
+
+    def changed_fields(self):
+        """Names of the loaded fields whose value differs from the database"""
+        saved = self.__dict__.get('_saved_values', {})
+        deferred = self.get_deferred_fields()
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname not in deferred and (
+                field.attname not in saved or saved[field.attname] != self.tracked_value(field)
+            )
+        ]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if self.is_tracking_changes():
+            self.remember_saved_values(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if self.is_tracking_changes():
+            self.remember_saved_values(fields)
+
+    def save_changes(self):
+        """
+        Save only the modified fields; new rows are saved in full.
+
+        Returns:
+            list: Names of the written fields, empty if the save was skipped
+        """
+        if self._state.adding:
+            self.save()
+            return [field.name for field in self._meta.concrete_fields]
+        changed = self.changed_fields()
+        if changed:
+            changed += [
+                field.name for field in self._meta.concrete_fields
+                if getattr(field, 'auto_now', False) and field.name not in changed
+            ]
+            self.save(update_fields=changed)
+        return changed
+
+
+class User(ChangeTrackingMixin, AbstractUser):
     groups = models.ManyToManyField(
         'auth.Group',
         related_name='blog_users',
@@ -26,17 +108,40 @@ class User(AbstractUser):
         default=50,
         help_text='Number of toolkit tokens available to the user'
     )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text='Number of users following this user'
+    )
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Verification and password reset flows look users up by email
+            models.Index(fields=['email'], name='blog_user_email_idx'),
+        ]
+
+    # Set on users built from JWT claims or cached tokens (see blog/authentication.py)
+    load_deferred_together = False
 
     def __str__(self):
         return self.username
 
-class Profile(models.Model):
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # Reading one deferred field loads all of them, in one query
+        if self.load_deferred_together and fields is not None:
+            deferred = self.get_deferred_fields()
+            if deferred and set(fields) <= deferred:
+                fields = list(deferred)
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
+class Profile(ChangeTrackingMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='user_profile')
     job_title = models.CharField(max_length=100, blank=True)
     job_status = models.CharField(max_length=100, blank=True)
     brief = models.TextField(max_length=300, blank=True)
     years_of_experience = models.PositiveIntegerField(default=0)
     profile_image = models.ImageField(upload_to='profile', null=True, blank=True)
+    profile_image_variants = models.JSONField(default=dict, blank=True, editable=False)  # Resized copies, see image_processing
     phone_number = models.CharField(max_length=20, blank=True)
 
     def __str__(self):
@@ -44,23 +149,16 @@ class Profile(models.Model):
 
 # Remove the old signal handlers and add new ones
 @receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    if created:
-        Profile.objects.create(user=instance)
-
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    try:
-        if not hasattr(instance, 'user_profile'):
-            Profile.objects.create(user=instance)
-        instance.user_profile.save()
-    except Profile.DoesNotExist:
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
+    # Provision the profile once; later User saves (logins, name or token
+    # changes) leave the Profile row alone
+    if created and not raw:
         Profile.objects.create(user=instance)
 
 # Remove any User.add_to_class calls if they exist
 
 
-class Post(models.Model):
+class Post(ChangeTrackingMixin, models.Model):
     POST_TYPES = (
         ('post', 'Post'),
         ('blog', 'Blog'),
@@ -68,14 +166,24 @@ class Post(models.Model):
         ('event','Event'),
     )
     post_type = models.CharField(max_length=20, choices=POST_TYPES, default='post')
-    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_posts')
+    # Indexed by blog_post_author_created_idx
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_posts', db_index=False)
     title = models.CharField(max_length=100)
     content = models.TextField(max_length=5000)
     image = models.ImageField(upload_to='posts', null=True, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)  # Resized copies, see image_processing
     created_at = models.DateTimeField(auto_now_add=True)
     trend = models.BooleanField(default=False)
     tags = TaggableManager()  # Using TaggableManager for tagging
 
+    class Meta:
+        indexes = [
+            # The feed, newest first
+            models.Index(fields=['-created_at'], name='blog_post_created_idx'),
+            # A profile's posts, newest first
+            models.Index(fields=['author', '-created_at'], name='blog_post_author_created_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -104,6 +212,10 @@ class Save_Post(models.Model):
 
     class Meta:
         unique_together = ['user', 'post']  # Prevent duplicate saves
+        indexes = [
+            # Saved-posts listing pages by (created_at, id) per user
+            models.Index(fields=['user', '-created_at', '-id'], name='blog_save_user_created_idx'),
+        ]
 
 
 class Reacts(models.Model):
@@ -113,26 +225,72 @@ class Reacts(models.Model):
         ('Thunder', 'Thunder'),
     )
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_react')
-    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='post_react')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='post_react', db_index=False)
     react = models.CharField(max_length=10, choices=REACT_TYPES)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ['user', 'post']  # One reaction per user per post
+        indexes = [
+            # Covers the reactions breakdown and the feed's (post, user, react) reads
+            models.Index(fields=['post', 'react', 'user'], name='blog_reacts_post_react_idx'),
+        ]
 
 
 
 class Share(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_share')
-    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='post_share')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='post_share', db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
-class Comment(models.Model):
+    class Meta:
+        indexes = [
+            # Covers share counts and the viewer's is_shared check
+            models.Index(fields=['post', 'user'], name='blog_share_post_user_idx'),
+        ]
+
+class Comment(ChangeTrackingMixin, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_comment')
-    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='post_comment')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='post_comment', db_index=False)
     content = models.TextField(max_length=2000)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # A post's comments in posting order
+            models.Index(fields=['post', 'created_at'], name='blog_comment_post_created_idx'),
+        ]
+
+class Follow(models.Model):
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following')
+    followee = models.ForeignKey(User, on_delete=models.CASCADE, related_name='followers')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['follower', 'followee']
+        indexes = [
+            models.Index(fields=['followee', 'follower'], name='blog_follow_followee_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.follower} follows {self.followee}"
+
+class TimelineEntry(models.Model):
+    """
+    A post in a user's home timeline, written when the post is published
+    (fan-out on write). ``created_at`` is copied from the post so a timeline
+    page is a single range scan over the (user, created_at, post) index.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['user', 'post']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-post'], name='blog_timeline_user_idx'),
+        ]
+
 class Notification(models.Model):
     NOTIFICATION_TYPES = (
         ('like', 'Like'),
@@ -147,29 +305,94 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     post = models.ForeignKey('Post', on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')
+    # Aggregated notifications stand for several events of the same type on one post
+    actor_count = models.PositiveIntegerField(default=1)
+    recent_actors = models.JSONField(default=list, blank=True)  # Newest sender ids first
+
+    MAX_RECENT_ACTORS = 5
+    AGGREGATED_TYPES = ('like', 'comment', 'share')
 
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['user', 'is_read', '-created_at']),
+            models.Index(fields=['user', 'post', 'notification_type'], name='blog_notif_aggregate_idx'),
         ]
 
+    def get_actor_ids(self):
+        """Sender ids this notification stands for, newest first"""
+        if self.recent_actors:
+            return list(self.recent_actors)
+        return [self.sender_id] if self.sender_id else []
+
+    def add_actor(self, sender):
+        """Fold another event by ``sender`` into this notification"""
+        actors = self.get_actor_ids()
+        if sender.pk in actors:
+            actors.remove(sender.pk)
+        else:
+            self.actor_count += 1
+        self.recent_actors = [sender.pk] + actors[:self.MAX_RECENT_ACTORS - 1]
+        self.sender = sender
+        self.is_read = False
+        self.created_at = timezone.now()
+        if self.actor_count > 1:
+            self.message = self.get_aggregate_message(self.notification_type, self.actor_count)
+        else:
+            self.message = self.get_notification_message(sender, self.notification_type, self.post)
+
     @classmethod
-    def cleanup_old_notifications(cls, days=30):
-        """Delete notifications older than specified days"""
+    def cleanup_old_notifications(cls, days=30, batch_size=1000, pause=0):
+        """
+        Delete notifications older than specified days, in primary key
+        batches so the table is never locked for long.
+
+        Returns:
+            int: Number of deleted notifications
+        """
+        from .notification_retention import delete_in_batches
+
         cutoff_date = timezone.now() - datetime.timedelta(days=days)
-        cls.objects.filter(created_at__lt=cutoff_date).delete()
+        return delete_in_batches(cls.objects.filter(created_at__lt=cutoff_date), batch_size, pause)
 
     @classmethod
     def create_notification(cls, user, sender, notification_type, post=None):
-        message = cls.get_notification_message(sender, notification_type, post)
-        return cls.objects.create(
-            user=user,
-            sender=sender,
-            notification_type=notification_type,
-            message=message,
-            post=post
-        )
+        """
+        Notify ``user`` of an event.
+
+        Reactions, comments and shares on a post are aggregated: the
+        recipient has one notification per post and type, which is updated
+        in place (actor count, recent actors, message) and moved to the top
+        of the inbox as unread when another event arrives.
+        """
+        from .realtime import publish_notification
+
+        with transaction.atomic():
+            notification = None
+            if post is not None and notification_type in cls.AGGREGATED_TYPES:
+                notification = cls.objects.select_for_update().filter(
+                    user=user,
+                    post=post,
+                    notification_type=notification_type
+                ).order_by('-created_at').first()
+
+            if notification is not None:
+                notification.add_actor(sender)
+                notification.save(update_fields=[
+                    'sender', 'actor_count', 'recent_actors', 'is_read', 'created_at', 'message'
+                ])
+            else:
+                notification = cls.objects.create(
+                    user=user,
+                    sender=sender,
+                    notification_type=notification_type,
+                    message=cls.get_notification_message(sender, notification_type, post),
+                    post=post,
+                    recent_actors=[sender.pk] if sender else []
+                )
+        # Push to connected streams once the notification is visible to readers
+        transaction.on_commit(lambda: publish_notification(notification))
+        return notification
 
     @staticmethod
     def get_notification_message(sender, notification_type, post=None):
@@ -180,6 +403,15 @@ class Notification(models.Model):
         }
         return messages.get(notification_type, "You have a new notification")
 
+    @staticmethod
+    def get_aggregate_message(notification_type, actor_count):
+        messages = {
+            'like': f"{actor_count} people liked your post",
+            'comment': f"{actor_count} people commented on your post",
+            'share': f"{actor_count} people shared your post",
+        }
+        return messages.get(notification_type, f"You have {actor_count} new notifications")
+
 class EmailVerification(models.Model):
     VERIFICATION_TYPES = (
         ('registration', 'Registration'),
@@ -217,3 +449,107 @@ class EmailVerification(models.Model):
     
     def __str__(self):
         return f"{self.email} - {self.verification_type} - {self.code}"
+
+
+class StoredFile(models.Model):
+    """Reference count for a file in the content-addressed media storage"""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    released_at = models.DateTimeField(null=True, blank=True)  # When the last reference was dropped
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'released_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+
+class UploadSession(models.Model):
+    """A resumable chunked image upload, assembled in a partial file outside MEDIA_ROOT"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+    @property
+    def is_complete(self):
+        return self.offset >= self.size
+
+    def part_path(self):
+        from .uploads import chunk_directory
+        return os.path.join(chunk_directory(), f"{self.id}.part")
+
+    def open_file(self):
+        """Open the assembled upload as a Django File named after the original upload"""
+        from django.core.files import File
+        return File(open(self.part_path(), 'rb'), name=self.filename)
+
+    def discard(self):
+        """Delete the partial file and the session"""
+        try:
+            os.remove(self.part_path())
+        except FileNotFoundError:
+            pass
+        self.delete()
+
+    @classmethod
+    def cleanup_stale_sessions(cls, hours=24):
+        """Discard uploads that have not received a chunk for the specified hours"""
+        cutoff_date = timezone.now() - datetime.timedelta(hours=hours)
+        stale = list(cls.objects.filter(updated_at__lt=cutoff_date))
+        for session in stale:
+            session.discard()
+        return len(stale)
+
+
+class OutboundEmail(models.Model):
+    """An email waiting in the delivery queue, see blog/email_queue.py"""
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUSES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUSES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim = models.UUIDField(null=True, blank=True, editable=False)  # Sender that is delivering the email
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
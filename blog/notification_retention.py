@@ -0,0 +1,145 @@
+"""
+Retention and compaction of notifications.
+
+Every step works in bounded batches with an optional pause in between, so a
+large clean-up never holds a long write lock (SQLite locks the whole
+database for the duration of a DELETE). Each function accepts a
+``progress`` callback that is called after every batch with the running
+total.
+"""
+import time
+
+from django.db import transaction
+from django.db.models import Count, Min
+
+from .models import Notification
+
+COMPACTABLE_TYPES = ('like', 'comment', 'share')
+
+
+def delete_in_batches(queryset, batch_size=1000, pause=0, progress=None, dry_run=False):
+    """
+    Delete the rows of ``queryset`` by consecutive primary key ranges.
+
+    Each batch deletes the matching rows within ``[start, start + batch_size)``,
+    which the database resolves with a primary key range scan; ``start``
+    skips ahead to the next matching row, so gaps cost one lookup.
+
+    Returns:
+        int: Number of deleted (or, for a dry run, matching) rows
+    """
+    total = 0
+    start = None
+    while True:
+        remaining = queryset if start is None else queryset.filter(pk__gte=start)
+        start = remaining.aggregate(low=Min('pk'))['low']
+        if start is None:
+            break
+        batch = queryset.filter(pk__gte=start, pk__lt=start + batch_size)
+        if dry_run:
+            total += batch.count()
+        else:
+            deleted, _ = batch.delete()
+            total += deleted
+        start += batch_size
+        if progress:
+            progress(total)
+        if pause and not dry_run:
+            time.sleep(pause)
+    return total
+
+
+def enforce_user_cap(cap, batch_size=1000, pause=0, progress=None, dry_run=False):
+    """
+    Keep only the newest ``cap`` notifications of every user.
+
+    Returns:
+        int: Number of deleted (or, for a dry run, excess) rows
+    """
+    over_cap = Notification.objects.values('user_id')\
+        .annotate(total=Count('id'))\
+        .filter(total__gt=cap)\
+        .order_by('user_id')
+
+    total = 0
+    for row in list(over_cap):
+        if dry_run:
+            total += row['total'] - cap
+            continue
+        while True:
+            excess = list(
+                Notification.objects.filter(user_id=row['user_id'])
+                .order_by('-created_at', '-id')
+                .values_list('id', flat=True)[cap:cap + batch_size]
+            )
+            if not excess:
+                break
+            deleted, _ = Notification.objects.filter(pk__in=excess).delete()
+            total += deleted
+            if progress:
+                progress(total)
+            if pause:
+                time.sleep(pause)
+    return total
+
+
+def compact(before, batch_size=1000, pause=0, progress=None, dry_run=False):
+    """
+    Collapse notifications created before ``before`` that share a recipient,
+    post and type into the newest of them, which then counts all actors.
+
+    Returns:
+        tuple: (groups collapsed, rows removed)
+    """
+    groups = Notification.objects.filter(
+        created_at__lt=before,
+        post__isnull=False,
+        notification_type__in=COMPACTABLE_TYPES
+    ).values('user_id', 'post_id', 'notification_type')\
+        .annotate(total=Count('id'))\
+        .filter(total__gt=1)\
+        .order_by('user_id', 'post_id', 'notification_type')
+
+    collapsed = removed = 0
+    for group in list(groups):
+        if dry_run:
+            collapsed += 1
+            removed += group['total'] - 1
+            continue
+
+        with transaction.atomic():
+            rows = list(
+                Notification.objects.filter(
+                    user_id=group['user_id'],
+                    post_id=group['post_id'],
+                    notification_type=group['notification_type'],
+                    created_at__lt=before
+                ).order_by('-created_at', '-id')
+            )
+            keep, others = rows[0], rows[1:]
+            actors = []
+            for row in rows:
+                for actor in row.get_actor_ids():
+                    if actor not in actors:
+                        actors.append(actor)
+            # Single events count distinct senders; earlier aggregates keep their counts
+            keep.actor_count = len({row.sender_id for row in rows if row.actor_count == 1}) + sum(
+                row.actor_count for row in rows if row.actor_count > 1
+            )
+            keep.recent_actors = actors[:Notification.MAX_RECENT_ACTORS]
+            keep.is_read = all(row.is_read for row in rows)
+            if keep.actor_count > 1:
+                keep.message = Notification.get_aggregate_message(keep.notification_type, keep.actor_count)
+            keep.save(update_fields=['actor_count', 'recent_actors', 'is_read', 'message'])
+
+            other_ids = [row.pk for row in others]
+            for start in range(0, len(other_ids), batch_size):
+                Notification.objects.filter(pk__in=other_ids[start:start + batch_size]).delete()
+
+        collapsed += 1
+        removed += len(others)
+        if progress:
+            progress(removed)
+        if pause:
+            time.sleep(pause)
+    return collapsed, removed
@@ -0,0 +1,239 @@
+"""
+Realtime notification delivery over server-sent events.
+
+``Notification.create_notification`` publishes every new notification to a
+broker once the transaction commits; ``notification_stream`` subscribes to
+the broker channel of the connected user and forwards events as they arrive.
+The stream is long-lived, so it must be served by the ASGI application
+(``uvicorn project.asgi:application``) rather than a WSGI worker.
+
+The broker is configured by ``NOTIFICATION_BROKER``. ``LocalBroker`` only
+reaches clients connected to the same process; deployments running several
+workers use ``RedisBroker`` so every worker sees every event.
+"""
+import asyncio
+import json
+import logging
+import threading
+from contextlib import asynccontextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def notification_channel(user_id):
+    return f'notifications:{user_id}'
+
+
+class LocalBroker:
+    """
+    In-process publish/subscribe.
+
+    ``publish`` may be called from any thread; messages are handed to the
+    event loop of each subscriber. Subscribers that fall more than
+    ``max_queue_size`` messages behind lose the oldest messages.
+    """
+
+    def __init__(self, max_queue_size=100):
+        self.max_queue_size = max_queue_size
+        self.subscribers = {}
+        self.lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, message)
+            except RuntimeError:
+                # The subscriber's loop has already been closed
+                pass
+
+    @staticmethod
+    def _deliver(queue, message):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        """Yield a queue receiving the channel's messages until the block exits"""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(self.max_queue_size))
+        with self.lock:
+            self.subscribers.setdefault(channel, set()).add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self.lock:
+                channel_subscribers = self.subscribers.get(channel, set())
+                channel_subscribers.discard(subscriber)
+                if not channel_subscribers:
+                    self.subscribers.pop(channel, None)
+
+
+class RedisBroker:
+    """Publish/subscribe over Redis channels, shared by all workers"""
+
+    def __init__(self, url='redis://localhost:6379/0'):
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError:
+            raise ImproperlyConfigured('RedisBroker requires the "redis" package.')
+        self.url = url
+        self.client = redis.Redis.from_url(url)
+        self.async_module = redis.asyncio
+
+    def publish(self, channel, message):
+        self.client.publish(channel, json.dumps(message, cls=DjangoJSONEncoder))
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        queue = asyncio.Queue()
+        client = self.async_module.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(channel)
+
+        async def reader():
+            async for item in pubsub.listen():
+                if item['type'] == 'message':
+                    await queue.put(json.loads(item['data']))
+
+        task = asyncio.create_task(reader())
+        try:
+            yield queue
+        finally:
+            task.cancel()
+            await pubsub.unsubscribe(channel)
+            await pubsub.close()
+            await client.close()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """The configured broker, created on first use"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = getattr(settings, 'NOTIFICATION_BROKER', {})
+                backend = import_string(config.get('BACKEND', 'blog.realtime.LocalBroker'))
+                _broker = backend(**config.get('OPTIONS', {}))
+    return _broker
+
+
+def reset_broker():
+    """Forget the broker so the next use picks up changed settings"""
+    global _broker
+    _broker = None
+
+
+def serialize_notification(notification):
+    from .serializer import NotificationSerializer
+
+    return NotificationSerializer(notification).data
+
+
+def publish_notification(notification):
+    """Push a notification to the streams of its recipient"""
+    try:
+        get_broker().publish(
+            notification_channel(notification.user_id),
+            {'id': notification.id, 'data': dict(serialize_notification(notification))}
+        )
+    except Exception:
+        # Delivery is best effort; clients catch up from the notifications list
+        logger.exception("Could not publish notification %s", notification.id)
+
+
+def format_event(message):
+    data = json.dumps(message['data'], cls=DjangoJSONEncoder)
+    return f"id: {message['id']}\nevent: notification\ndata: {data}\n\n"
+
+
+async def authenticate(request):
+    """Resolve the user from a token or JWT header, a ``token`` query parameter or the session"""
+    from rest_framework.exceptions import AuthenticationFailed
+    from .authentication import StatelessJWTAuthentication, aget_token
+
+    key = request.GET.get('token')
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Token '):
+        key = header[len('Token '):].strip()
+    elif header.startswith('Bearer '):
+        jwt = StatelessJWTAuthentication()
+        try:
+            return jwt.get_user(jwt.get_validated_token(header[len('Bearer '):].strip()))
+        except AuthenticationFailed:
+            return None
+    if key:
+        token = await aget_token(key)
+        if token is not None and token.user.is_active:
+            return token.user
+        return None
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+async def missed_notifications(user_id, last_event_id, limit=50):
+    """Notifications created after the last event a reconnecting client received"""
+    from .models import Notification
+
+    notifications = Notification.objects.filter(user_id=user_id, id__gt=last_event_id).order_by('id')[:limit]
+    return [
+        {'id': notification.id, 'data': await sync_to_async(serialize_notification)(notification)}
+        async for notification in notifications
+    ]
+
+
+async def event_stream(user_id, last_event_id=None):
+    keepalive = getattr(settings, 'NOTIFICATION_STREAM_KEEPALIVE', 15)
+    yield 'retry: 5000\n\n'
+    async with get_broker().subscribe(notification_channel(user_id)) as queue:
+        # Subscribe first so nothing created while catching up is missed
+        if last_event_id is not None:
+            for message in await missed_notifications(user_id, last_event_id):
+                yield format_event(message)
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield format_event(message)
+
+
+async def notification_stream(request):
+    """Server-sent events stream of the current user's new notifications"""
+    if request.method != 'GET':
+        return HttpResponse(status=405)
+    user = await authenticate(request)
+    if user is None:
+        return HttpResponse(
+            json.dumps({'error': 'Authentication credentials were not provided.'}),
+            status=401,
+            content_type='application/json'
+        )
+
+    last_event_id = request.headers.get('Last-Event-ID')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    response = StreamingHttpResponse(
+        event_stream(user.pk, last_event_id),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
@@ -1,9 +1,116 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from django.contrib.auth import get_user_model
+from django.db import models
 from dj_rest_auth.registration.serializers import RegisterSerializer
 from dj_rest_auth.serializers import LoginSerializer
-from .models import User, Profile, Post, Save_Post, Reacts, Share, Comment, Notification, EmailVerification
+from .models import User, Profile, Post, Save_Post, Reacts, Share, Comment, Notification, EmailVerification, UploadSession
 from taggit.serializers import TagListSerializerField, TaggitSerializer
+from .image_processing import (
+    variant_url,
+    variant_urls,
+    variant_status,
+    DEFAULT_FEED_VARIANT,
+)
+from .uploads import ALLOWED_IMAGE_TYPES, chunk_max_size, format_size, post_image_max_size, sniff_file
+from .author_cards import get_resolver
+
+
+def prefetched(obj, name):
+    """Rows of a prefetched relation, or None if it was not prefetched"""
+    return getattr(obj, '_prefetched_objects_cache', {}).get(name)
+
+
+def sparse_fieldset(request):
+    """
+    Serializer kwargs for the ``?fields=`` and ``?exclude=`` query parameters.
+
+    Both take comma-separated field names. Only reads are trimmed; writes
+    always validate and return the whole resource.
+
+    Returns:
+        dict: ``fields`` and/or ``exclude`` lists, empty if neither was given
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return {}
+    params = getattr(request, 'query_params', request.GET)
+    kwargs = {}
+    for param in ('fields', 'exclude'):
+        value = params.get(param)
+        if value is not None:
+            kwargs[param] = [name.strip() for name in value.split(',') if name.strip()]
+    return kwargs
+
+
+class SparseFieldsMixin:
+    """
+    Render only the fields named by ``fields`` and not named by ``exclude``.
+
+    Dropped fields are removed before rendering, so their
+    ``SerializerMethodField`` methods and nested serializers never run.
+    ``related_fields`` maps field names to the relations they read, so views
+    can leave out the prefetches of fields that are not rendered.
+    """
+    related_fields = {}
+    # Fields rendered from author cards
+    card_fields = ()
+
+    def __init__(self, *args, fields=None, exclude=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None or exclude is not None:
+            selected = self.select_fields(fields, exclude)
+            for name in list(self.fields):
+                if name not in selected:
+                    self.fields.pop(name)
+
+    @classmethod
+    def select_fields(cls, fields=None, exclude=None):
+        """
+        Names of the fields to render, in declaration order.
+
+        Raises:
+            ValidationError: If ``fields`` or ``exclude`` names an unknown field
+        """
+        available = cls.Meta.fields
+        for param, names in (('fields', fields), ('exclude', exclude)):
+            unknown = set(names or ()) - set(available)
+            if unknown:
+                raise serializers.ValidationError({param: f"Unknown fields: {', '.join(sorted(unknown))}"})
+        return [
+            name for name in available
+            if (fields is None or name in fields) and name not in (exclude or ())
+        ]
+
+    @classmethod
+    def related_lookups(cls, fields=None, exclude=None):
+        """Relations read by the selected fields, for select/prefetch_related"""
+        lookups = []
+        for name in cls.select_fields(fields, exclude):
+            for lookup in cls.related_fields.get(name, ()):
+                if lookup not in lookups:
+                    lookups.append(lookup)
+        return lookups
+
+    def renders_cards(self):
+        return any(name in self.fields for name in self.card_fields)
+
+
+class VariantImageField(serializers.ImageField):
+    """
+    Image field that accepts uploads as usual but represents the image by
+    one of its resized variants, falling back to the original upload.
+    """
+
+    def __init__(self, variant, variants_field, **kwargs):
+        self.variant = variant
+        self.variants_field = variants_field
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        variants = getattr(value.instance, self.variants_field, None)
+        return variant_url(value, variants, self.variant, self.context.get('request'))
 
 class CustomRegisterSerializer(RegisterSerializer):
     # Add custom fields for registration
@@ -24,24 +131,34 @@ class CustomLoginSerializer(LoginSerializer):
     password = serializers.CharField(write_only=True)
 
 class AuthorSerializer(serializers.ModelSerializer):
-    """Unified author serializer for consistent author metadata across all models"""
+    """
+    Unified author serializer for consistent author metadata across all models.
+
+    Accepts a user or a user id and renders the user's cached author card, so
+    embedding an author needs neither the user nor the profile row.
+    """
     profile_picture = serializers.SerializerMethodField()
     
     class Meta:
         model = User
         fields = ['username', 'first_name', 'last_name', 'profile_picture']
-    
-    def get_profile_picture(self, obj):
-        """Get profile picture URL from user's profile"""
-        try:
-            if hasattr(obj, 'user_profile') and obj.user_profile.profile_image:
-                request = self.context.get('request')
-                if request:
-                    return request.build_absolute_uri(obj.user_profile.profile_image.url)
-                return obj.user_profile.profile_image.url
-        except (AttributeError, ValueError):
-            pass
-        return None
+
+    def to_representation(self, instance):
+        user_id = getattr(instance, 'pk', instance)
+        if user_id is None:
+            return None
+        return get_resolver(self.context).get(user_id)
+
+
+class AuthorCardListSerializer(serializers.ListSerializer):
+    """Resolves the author cards of all items in one go before rendering them"""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        if self.child.renders_cards():
+            get_resolver(self.context).prime(self.child.get_author_ids(items))
+        return super().to_representation(items)
+
 
 class UserSerializer(serializers.ModelSerializer):
     profile_picture = serializers.SerializerMethodField()
@@ -51,24 +168,19 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'profile_picture', 'toolkit_tokens']
     
     def get_profile_picture(self, obj):
-        """Get profile picture URL from user's profile"""
-        try:
-            if hasattr(obj, 'user_profile') and obj.user_profile.profile_image:
-                request = self.context.get('request')
-                if request:
-                    return request.build_absolute_uri(obj.user_profile.profile_image.url)
-                return obj.user_profile.profile_image.url
-        except (AttributeError, ValueError):
-            pass
-        return None
-
-class ProfileSerializer(serializers.ModelSerializer):
+        """Get the avatar URL from the user's author card"""
+        card = get_resolver(self.context).get(obj.pk)
+        return card['profile_picture'] if card else None
+
+class ProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     username = serializers.CharField(source='user.username')
     email = serializers.EmailField(source='user.email')
     first_name = serializers.CharField(source='user.first_name', read_only=True)
     last_name = serializers.CharField(source='user.last_name', read_only=True)
     posts_count = serializers.SerializerMethodField()
     profile_picture = serializers.ImageField(source='profile_image', required=False)  # Alias for API consistency
+    profile_image_variants = serializers.SerializerMethodField()
+    profile_image_status = serializers.SerializerMethodField()
 
     class Meta:
         model = Profile
@@ -83,12 +195,22 @@ class ProfileSerializer(serializers.ModelSerializer):
             'years_of_experience',
             'profile_image',
             'profile_picture',  # Alias field
+            'profile_image_variants',
+            'profile_image_status',
             'phone_number',
             'posts_count'
         ]
 
     def get_posts_count(self, obj):
+        if hasattr(obj, 'user_posts_count'):  # Annotated by the caller
+            return obj.user_posts_count
         return obj.user.user_posts.count()
+
+    def get_profile_image_variants(self, obj):
+        return variant_urls(obj.profile_image, obj.profile_image_variants, self.context.get('request'))
+
+    def get_profile_image_status(self, obj):
+        return variant_status(obj.profile_image, obj.profile_image_variants)
     
     def validate_profile_image(self, value):
         """Validate profile image upload"""
@@ -111,64 +233,146 @@ class ProfileSerializer(serializers.ModelSerializer):
         """Validate profile picture upload (alias for profile_image)"""
         return self.validate_profile_image(value)
 
-class NotificationSerializer(serializers.ModelSerializer):
-    sender = AuthorSerializer(read_only=True)
-    user = serializers.StringRelatedField()
+SENDER_REACTIONS_KEY = '_sender_reactions'
+
+
+class NotificationListSerializer(AuthorCardListSerializer):
+    """Loads the senders' reactions of all 'like' notifications in one query"""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        if SENDER_REACTIONS_KEY not in self.context and self.child.renders_reactions():
+            self.context[SENDER_REACTIONS_KEY] = {
+                (user_id, post_id): react
+                for user_id, post_id, react in self.child.sender_reactions_queryset(items)
+            }
+        return super().to_representation(items)
+
+
+class NotificationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    sender = AuthorSerializer(source='sender_id', read_only=True)
+    user = serializers.SerializerMethodField()
     post_id = serializers.IntegerField(source='post.id', read_only=True)
     liked = serializers.SerializerMethodField()
     disliked = serializers.SerializerMethodField()
     thundered = serializers.SerializerMethodField()
+    actors = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
         fields = ['id', 'user', 'sender', 'notification_type', 'message', 'is_read', 
-                 'created_at', 'post_id', 'liked', 'disliked', 'thundered']
+                 'created_at', 'post_id', 'liked', 'disliked', 'thundered', 'actor_count', 'actors']
         read_only_fields = ['created_at']
+        list_serializer_class = NotificationListSerializer
+
+    related_fields = {
+        'sender': ('sender', 'sender__user_profile'),
+        'post_id': ('post',),
+    }
+    card_fields = ('user', 'sender', 'actors')
+    reaction_fields = ('liked', 'disliked', 'thundered')
+
+    def renders_reactions(self):
+        return any(name in self.fields for name in self.reaction_fields)
+
+    @staticmethod
+    def get_author_ids(notifications):
+        author_ids = [n.user_id for n in notifications]
+        for notification in notifications:
+            author_ids.append(notification.sender_id)
+            author_ids.extend(notification.recent_actors or ())
+        return author_ids
+
+    def get_actors(self, obj):
+        """Author cards of the most recent actors of an aggregated notification"""
+        resolver = get_resolver(self.context)
+        actor_ids = obj.get_actor_ids()
+        resolver.prime(actor_ids)
+        return [card for card in map(resolver.get, actor_ids) if card is not None]
+
+    def get_user(self, obj):
+        card = get_resolver(self.context).get(obj.user_id)
+        return card['username'] if card else None
     
+    @staticmethod
+    def sender_reactions_queryset(notifications):
+        """(sender, post, react) rows for all 'like' notifications in one query"""
+        pairs = [
+            (n.sender_id, n.post_id) for n in notifications
+            if n.notification_type == 'like' and n.sender_id and n.post_id
+        ]
+        return Reacts.objects.filter(
+            user_id__in={sender_id for sender_id, _ in pairs},
+            post_id__in={post_id for _, post_id in pairs}
+        ).values_list('user_id', 'post_id', 'react')
+
+    def get_sender_reaction(self, obj):
+        """The sender's current reaction to the post of a 'like' notification"""
+        if obj.notification_type != 'like' or not obj.post_id or not obj.sender_id:
+            return None
+        reactions = self.context.get(SENDER_REACTIONS_KEY)
+        if reactions is not None:
+            return reactions.get((obj.sender_id, obj.post_id))
+        return Reacts.objects.filter(
+            user_id=obj.sender_id,
+            post_id=obj.post_id
+        ).values_list('react', flat=True).first()
+
     def get_liked(self, obj):
         """Check if the notification is for a 'like' reaction"""
-        if obj.notification_type == 'like' and obj.post and obj.sender:
-            try:
-                reaction = Reacts.objects.get(user=obj.sender, post=obj.post)
-                return reaction.react == 'Love'
-            except Reacts.DoesNotExist:
-                pass
-        return False
+        return self.get_sender_reaction(obj) == 'Love'
     
     def get_disliked(self, obj):
         """Check if the notification is for a 'dislike' reaction"""
-        if obj.notification_type == 'like' and obj.post and obj.sender:
-            try:
-                reaction = Reacts.objects.get(user=obj.sender, post=obj.post)
-                return reaction.react == 'Dislike'
-            except Reacts.DoesNotExist:
-                pass
-        return False
+        return self.get_sender_reaction(obj) == 'Dislike'
     
     def get_thundered(self, obj):
         """Check if the notification is for a 'thunder' reaction"""
-        if obj.notification_type == 'like' and obj.post and obj.sender:
-            try:
-                reaction = Reacts.objects.get(user=obj.sender, post=obj.post)
-                return reaction.react == 'Thunder'
-            except Reacts.DoesNotExist:
-                pass
-        return False
-
-class CommentSerializer(serializers.ModelSerializer):
-    author = AuthorSerializer(source='user', read_only=True)
+        return self.get_sender_reaction(obj) == 'Thunder'
+
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    author = AuthorSerializer(source='user_id', read_only=True)
     # Keep backward compatibility
-    user = serializers.StringRelatedField()
-    first_name = serializers.CharField(source='user.first_name', read_only=True)
-    last_name = serializers.CharField(source='user.last_name', read_only=True)
+    user = serializers.SerializerMethodField()
+    first_name = serializers.SerializerMethodField()
+    last_name = serializers.SerializerMethodField()
 
     class Meta:
         model = Comment
         fields = ['id', 'user', 'first_name', 'last_name', 'author', 'content', 'created_at']
         read_only_fields = ['created_at']
+        list_serializer_class = AuthorCardListSerializer
+
+    card_fields = ('user', 'first_name', 'last_name', 'author')
 
-class PostListSerializer(TaggitSerializer, serializers.ModelSerializer):
-    author = AuthorSerializer(read_only=True)
+    @staticmethod
+    def get_author_ids(comments):
+        return [comment.user_id for comment in comments]
+
+    def card_value(self, obj, key):
+        card = get_resolver(self.context).get(obj.user_id)
+        return card[key] if card else None
+
+    def get_user(self, obj):
+        return self.card_value(obj, 'username')
+
+    def get_first_name(self, obj):
+        return self.card_value(obj, 'first_name')
+
+    def get_last_name(self, obj):
+        return self.card_value(obj, 'last_name')
+
+class PostListSerializer(SparseFieldsMixin, TaggitSerializer, serializers.ModelSerializer):
+    author = AuthorSerializer(source='author_id', read_only=True)
+    image = VariantImageField(
+        variant=DEFAULT_FEED_VARIANT,
+        variants_field='image_variants',
+        required=False,
+        allow_null=True
+    )
+    image_variants = serializers.SerializerMethodField()
+    image_status = serializers.SerializerMethodField()
+    upload_id = serializers.UUIDField(write_only=True, required=False)  # Completed chunked upload to use as image
     tags = TagListSerializerField()
     comments_count = serializers.SerializerMethodField()
     shares_count = serializers.SerializerMethodField()
@@ -189,6 +393,9 @@ class PostListSerializer(TaggitSerializer, serializers.ModelSerializer):
             'title',
             'content',
             'image',
+            'image_variants',
+            'image_status',
+            'upload_id',
             'tags',
             'created_at',
             'trend',
@@ -202,6 +409,67 @@ class PostListSerializer(TaggitSerializer, serializers.ModelSerializer):
             'is_saved'
         ]
         read_only_fields = ['created_at', 'trend']
+        list_serializer_class = AuthorCardListSerializer
+
+    # Prefetches the counts and viewer state are read from
+    related_fields = {
+        'tags': ('tags',),
+        'comments_count': ('post_comment',),
+        'shares_count': ('post_share',),
+        'reactions': ('post_react',),
+        'saves_count': ('post_save',),
+        'comments': ('post_comment',),
+        'user_reaction': ('post_react',),
+        'is_shared': ('post_share',),
+        'is_saved': ('post_save',),
+    }
+    card_fields = ('author', 'comments')
+
+    @staticmethod
+    def get_author_ids(posts):
+        """Post authors and the authors of already prefetched comments"""
+        author_ids = [post.author_id for post in posts]
+        for post in posts:
+            comments = prefetched(post, 'post_comment')
+            if comments is not None:
+                author_ids.extend(comment.user_id for comment in comments)
+        return author_ids
+
+    def validate_image(self, value):
+        """Validate post image upload"""
+        if value:
+            max_size = post_image_max_size()
+            if value.size > max_size:
+                raise serializers.ValidationError(f"Post image size cannot exceed {format_size(max_size)}.")
+            if sniff_file(value) is None:
+                raise serializers.ValidationError("Uploaded file is not a valid image.")
+        return value
+
+    def validate_upload_id(self, value):
+        """Resolve a completed chunked upload owned by the current user"""
+        request = self.context.get('request')
+        upload = UploadSession.objects.filter(id=value, user=request.user).first() if request else None
+        if upload is None:
+            raise serializers.ValidationError("Upload not found.")
+        if not upload.is_complete:
+            raise serializers.ValidationError("Upload is not complete.")
+        return upload
+
+    def create(self, validated_data):
+        upload = validated_data.pop('upload_id', None)
+        if upload is None:
+            return super().create(validated_data)
+        with upload.open_file() as image:
+            validated_data['image'] = image
+            post = super().create(validated_data)
+        upload.discard()
+        return post
+
+    def get_image_variants(self, obj):
+        return variant_urls(obj.image, obj.image_variants, self.context.get('request'))
+
+    def get_image_status(self, obj):
+        return variant_status(obj.image, obj.image_variants)
 
     def get_comments_count(self, obj):
         return obj.get_comments_count()
@@ -210,7 +478,13 @@ class PostListSerializer(TaggitSerializer, serializers.ModelSerializer):
         return obj.get_shares_count()
 
     def get_reactions(self, obj):
-        return obj.get_reactions_breakdown()
+        reacts = prefetched(obj, 'post_react')
+        if reacts is None:
+            return obj.get_reactions_breakdown()
+        breakdown = {'Love': 0, 'Dislike': 0, 'Thunder': 0}
+        for react in reacts:
+            breakdown[react.react] = breakdown.get(react.react, 0) + 1
+        return breakdown
 
     def get_saves_count(self, obj):
         return obj.get_saves_count()
@@ -219,6 +493,9 @@ class PostListSerializer(TaggitSerializer, serializers.ModelSerializer):
         user = self.context.get('request').user
         if not user or not user.is_authenticated:
             return None
+        reacts = prefetched(obj, 'post_react')
+        if reacts is not None:
+            return next((react.react for react in reacts if react.user_id == user.pk), None)
         try:
             reaction = obj.post_react.get(user=user)
             return reaction.react
@@ -229,14 +506,44 @@ class PostListSerializer(TaggitSerializer, serializers.ModelSerializer):
         user = self.context.get('request').user
         if not user or not user.is_authenticated:
             return False
+        shares = prefetched(obj, 'post_share')
+        if shares is not None:
+            return any(share.user_id == user.pk for share in shares)
         return obj.post_share.filter(user=user).exists()
 
     def get_is_saved(self, obj):
         user = self.context.get('request').user
         if not user or not user.is_authenticated:
             return False
+        saves = prefetched(obj, 'post_save')
+        if saves is not None:
+            return any(save.user_id == user.pk for save in saves)
         return obj.post_save.filter(user=user).exists()
 
+class UploadSessionSerializer(serializers.ModelSerializer):
+    upload_id = serializers.UUIDField(source='id', read_only=True)
+    is_complete = serializers.BooleanField(read_only=True)
+    max_chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = ['upload_id', 'filename', 'content_type', 'size', 'offset', 'is_complete', 'max_chunk_size']
+        read_only_fields = ['offset']
+
+    def get_max_chunk_size(self, obj):
+        return chunk_max_size()
+
+    def validate_size(self, value):
+        max_size = post_image_max_size()
+        if value <= 0 or value > max_size:
+            raise serializers.ValidationError(f"Image size must be between 1 byte and {format_size(max_size)}.")
+        return value
+
+    def validate_content_type(self, value):
+        if value not in ALLOWED_IMAGE_TYPES:
+            raise serializers.ValidationError("Only JPEG, PNG, GIF and WebP image formats are allowed.")
+        return value
+
 class ReactSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField()
 
@@ -0,0 +1,196 @@
+"""
+Serving static and media files.
+
+With ``SERVE_STATIC`` on, ``STATIC_URL`` is routed to ``serve_static``, which
+sends the ``.br`` or ``.gz`` copy written by ``collectstatic`` when the
+client accepts it. Content-hashed names never change content, so they are
+cached for a year as immutable; other names for ``STATIC_MAX_AGE`` seconds.
+Behind nginx, serve ``STATIC_ROOT`` there instead (see README).
+
+``MEDIA_URL`` is routed to ``serve_media``. ``MEDIA_SERVING`` selects how the
+bytes are sent:
+
+- ``'django'`` (standalone): a ``FileResponse`` with ``ETag``,
+  ``Last-Modified``, conditional requests and single byte ranges
+- ``'x-accel-redirect'``: an empty response whose ``X-Accel-Redirect``
+  header points nginx at ``MEDIA_ACCEL_PREFIX`` + path, an internal
+  location aliased to ``MEDIA_ROOT``
+- ``'x-sendfile'``: an empty response whose ``X-Sendfile`` header holds the
+  file's path, for Apache's mod_xsendfile or lighttpd
+
+Uploads and their variants are stored under their SHA-256 (see
+``blog.storage``), so those names are cached as immutable in every mode.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .compression import SUFFIXES, choose_encoding
+
+# name.0123456789ab.ext, as written by ManifestStaticFilesStorage
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+# ab/abcdef....ext, as written by ContentAddressedStorage
+CONTENT_ADDRESSED_NAME = re.compile(r'(?:^|/)[0-9a-f]{2}/([0-9a-f]{64})\.[^./]+$')
+RANGE_HEADER = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+MEDIA_SERVING_MODES = ('django', 'x-accel-redirect', 'x-sendfile')
+
+
+def is_hashed(path):
+    return HASHED_NAME.search(path) is not None
+
+
+def resolve(root, path):
+    """The path of an existing file below ``root``, or Http404"""
+    try:
+        full_path = safe_join(root, path)
+    except SuspiciousFileOperation:
+        raise Http404('File not found')
+    if not os.path.isfile(full_path):
+        raise Http404('File not found')
+    return full_path
+
+
+def serve_static(request, path):
+    """A file from ``STATIC_ROOT``, precompressed if possible"""
+    full_path = resolve(settings.STATIC_ROOT, path)
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    precompressed = [encoding for encoding, suffix in SUFFIXES.items() if os.path.isfile(full_path + suffix)]
+    encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING'), precompressed)
+
+    response = FileResponse(
+        open(full_path + SUFFIXES[encoding] if encoding else full_path, 'rb'),
+        content_type=content_type
+    )
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if precompressed:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    if is_hashed(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'STATIC_MAX_AGE', 60 * 60))
+    return response
+
+
+def media_serving():
+    mode = getattr(settings, 'MEDIA_SERVING', 'django')
+    if mode not in MEDIA_SERVING_MODES:
+        raise ImproperlyConfigured(f'MEDIA_SERVING must be one of {", ".join(MEDIA_SERVING_MODES)}')
+    return mode
+
+
+def parse_range(header, size):
+    """
+    The (start, end) byte positions, end inclusive, of a single-range
+    ``Range`` header.
+
+    Returns:
+        tuple or None: None to send the whole file (no, malformed or
+        multi-range header); (None, None) if the range can't be satisfied
+    """
+    match = RANGE_HEADER.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # The last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            return None, None
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start > end:
+        if last and int(last) < start:
+            return None  # Invalid, ignored like a missing header
+        return None, None
+    return start, end
+
+
+class FileRange:
+    """Reads at most ``length`` bytes of a file from ``start`` on"""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def media_etag(path, stat):
+    match = CONTENT_ADDRESSED_NAME.search(path)
+    if match:
+        return quote_etag(match.group(1))
+    return quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+
+
+def serve_media(request, path):
+    """An uploaded file from ``MEDIA_ROOT``, sent as ``MEDIA_SERVING`` says"""
+    full_path = resolve(settings.MEDIA_ROOT, path)
+    mode = media_serving()
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    if mode == 'django':
+        stat = os.stat(full_path)
+        etag = media_etag(path, stat)
+        response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+        if response is None:
+            response = stream_file(request, full_path, stat.st_size, etag, content_type)
+        response.headers['ETag'] = etag
+        response.headers['Last-Modified'] = http_date(stat.st_mtime)
+    else:
+        response = HttpResponse(content_type=content_type)
+        if mode == 'x-accel-redirect':
+            prefix = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+            response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(path.lstrip('/'))
+        else:
+            response.headers['X-Sendfile'] = full_path
+
+    if CONTENT_ADDRESSED_NAME.search(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'MEDIA_MAX_AGE', 24 * 60 * 60))
+    return response
+
+
+def stream_file(request, full_path, size, etag, content_type):
+    """The whole file, or the requested byte range of it"""
+    byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if byte_range is not None and if_range and if_range.strip() != etag:
+        byte_range = None  # Changed since the client's partial copy, send it all
+    if byte_range == (None, None):
+        response = HttpResponse(status=416)
+        response.headers['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(FileRange(file, start, end - start + 1), status=206, content_type=content_type)
+        response.headers['Content-Length'] = str(end - start + 1)
+        response.headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
@@ -1,6 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Reacts, Comment, Share, User, Notification
+from .models import Reacts, Comment, Share, User, Notification, Post, Profile
+from .image_processing import sync_variants, delete_variants, variants_changed
+from rest_framework.authtoken.models import Token
+from . import authentication, author_cards
 
 @receiver(post_save, sender=Reacts)
 def create_react_notification(sender, instance, created, **kwargs):
@@ -32,3 +35,63 @@ def create_share_notification(sender, instance, created, **kwargs):
             post=instance.post
         )
 
+def fields_changed(update_fields, fields):
+    """Whether a save may have changed any of ``fields`` (all saves without update_fields may)"""
+    return update_fields is None or not set(update_fields).isdisjoint(fields)
+
+@receiver(post_save, sender=Post)
+def refresh_post_image_variants(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and fields_changed(update_fields, {'image'}):
+        sync_variants(instance, 'image', 'image_variants', 'posts')
+
+@receiver(post_save, sender=Profile)
+def refresh_profile_image_variants(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and fields_changed(update_fields, {'profile_image'}):
+        sync_variants(instance, 'profile_image', 'profile_image_variants', 'profile')
+
+@receiver(post_delete, sender=Post)
+def release_post_image(sender, instance, **kwargs):
+    if instance.image:
+        instance.image.storage.delete(instance.image.name)
+    delete_variants(instance.image_variants or {}, instance.image.storage)
+
+@receiver(post_delete, sender=Profile)
+def release_profile_image(sender, instance, **kwargs):
+    if instance.profile_image:
+        instance.profile_image.storage.delete(instance.profile_image.name)
+    delete_variants(instance.profile_image_variants or {}, instance.profile_image.storage)
+
+
+# Author card invalidation: names and avatars are cached per user
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_author_card(sender, instance, update_fields=None, **kwargs):
+    if fields_changed(update_fields, {'username', 'first_name', 'last_name'}):
+        author_cards.invalidate(instance.pk)
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_profile_author_card(sender, instance, update_fields=None, **kwargs):
+    if fields_changed(update_fields, {'user', 'profile_image', 'profile_image_variants'}):
+        author_cards.invalidate(instance.user_id)
+
+@receiver(variants_changed, sender=Profile)
+def invalidate_author_card_variants(sender, pk, **kwargs):
+    user_id = Profile.objects.filter(pk=pk).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        author_cards.invalidate(user_id)
+
+
+# Cached API tokens: drop them on logout, rotation and changes to the cached
+# user snapshot or password. Deleting a user deletes its tokens.
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    authentication.invalidate(instance.key)
+
+@receiver(post_save, sender=User)
+def invalidate_cached_user_token(sender, instance, update_fields=None, **kwargs):
+    if fields_changed(update_fields, {'password', *authentication.USER_CLAIMS}):
+        authentication.invalidate_user(instance.pk)
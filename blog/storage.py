@@ -0,0 +1,153 @@
+"""
+Content-addressed media storage.
+
+Files are named after the SHA-256 of their content, so identical uploads are
+stored once and a name always refers to the same bytes, which lets media be
+cached forever. Each stored name carries a reference count in the database;
+``delete()`` only releases a reference and the files nobody refers to any
+more are removed in batches by the ``cleanup_orphaned_media`` command.
+
+An upload takes its reference before checking that the file is on disk, and
+the cleanup deletes rows and files together under row locks, so a re-upload
+racing the cleanup either keeps the file or writes it again.
+"""
+import hashlib
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import connections, router
+from django.db.models import F
+from django.utils import timezone
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Filesystem storage that deduplicates files by content hash.
+
+    ``upload_to/photo.jpg`` is stored as ``upload_to/ab/abcdef....jpg``;
+    the directory and extension of the requested name are kept.
+    """
+
+    hash_chunk_size = 64 * 1024
+
+    def hash_content(self, content):
+        sha256 = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks(self.hash_chunk_size):
+            sha256.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        return sha256.hexdigest()
+
+    def hashed_name(self, name, digest):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], f'{digest}{extension}')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        name = self.hashed_name(name, self.hash_content(content))
+        # Referenced first: the cleanup only purges files of unreferenced rows
+        self.retain(name, content.size)
+        if not self.exists(name):
+            try:
+                saved = super().save(name, content, max_length=max_length)
+            except Exception:
+                self.delete(name)
+                raise
+            if saved != name:  # Written by a concurrent upload of the same content
+                self.purge(saved)
+        return name
+
+    def retain(self, name, size=0):
+        """Add a reference to a stored file, creating its row if needed, in one statement"""
+        from .models import StoredFile
+
+        connection = connections[router.db_for_write(StoredFile)]
+        quote = connection.ops.quote_name
+        table = quote(StoredFile._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({quote("name")}, {quote("size")}, {quote("ref_count")}, '
+                f'{quote("created_at")}, {quote("released_at")}) VALUES (%s, %s, 1, %s, NULL) '
+                f'ON CONFLICT ({quote("name")}) DO UPDATE SET '
+                f'{quote("ref_count")} = {table}.{quote("ref_count")} + 1, {quote("released_at")} = NULL',
+                [name, size or 0, connection.ops.adapt_datetimefield_value(timezone.now())]
+            )
+
+    def delete(self, name):
+        """
+        Release a reference to a stored file.
+
+        The file itself is left in place until ``cleanup_orphaned_media``
+        finds it unreferenced; names stored before this backend was enabled
+        are tracked from their first release onwards.
+        """
+        if not name:
+            return
+        from .models import StoredFile
+
+        stored, _ = StoredFile.objects.get_or_create(name=name, defaults={'ref_count': 1})
+        StoredFile.objects.filter(pk=stored.pk).update(ref_count=F('ref_count') - 1)
+        StoredFile.objects.filter(pk=stored.pk, ref_count__lte=0).update(
+            ref_count=0,
+            released_at=timezone.now()
+        )
+
+    def purge(self, name):
+        """Remove a file from disk, regardless of references"""
+        super().delete(name)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ``ManifestStaticFilesStorage`` that also writes ``.gz`` and ``.br``
+    copies of text assets during ``collectstatic``.
+
+    Every collected file gets a content-hashed name, so it can be cached
+    forever; the compressed copies sit next to it for servers that serve
+    precompressed files (``blog.serving.serve_static``, nginx with
+    ``gzip_static``/``brotli_static``). Names that were never collected,
+    e.g. in development or tests, resolve to themselves instead of failing.
+    """
+
+    manifest_strict = False
+    compressible_extensions = ('.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.xml')
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:  # Not collected
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        compressible = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            yield name, hashed_name, processed
+            if hashed_name and not isinstance(processed, Exception) and name.lower().endswith(self.compressible_extensions):
+                compressible.update((name, hashed_name))
+        if dry_run:
+            return
+
+        from .compression import SUFFIXES, available_encodings, compress
+
+        for name in sorted(compressible):
+            with self.open(name) as original:
+                content = original.read()
+            for encoding in available_encodings():
+                compressed_name = name + SUFFIXES[encoding]
+                if self.exists(compressed_name):
+                    self.delete(compressed_name)
+                compressed = compress(content, encoding, static=True)
+                # Not worth a lookup if it barely saves anything
+                if len(compressed) < len(content) * 0.95:
+                    self._save(compressed_name, ContentFile(compressed))
+                    yield name, compressed_name, True
@@ -6,8 +6,11 @@ from rest_framework import status
 from rest_framework.authtoken.models import Token
 from django.core.files.uploadedfile import SimpleUploadedFile
 from PIL import Image
+from django.utils import timezone
+import importlib.util
 import io
 import tempfile
+from unittest import mock, skipUnless
 from .models import Profile, Post, Comment, Reacts
 import json
 
@@ -749,3 +752,2288 @@ class NewReactionTypesTests(APITestCase):
         
         reaction = Reacts.objects.get(user=self.user, post=self.post)
         self.assertEqual(reaction.react, 'Dislike')
+
+
+class ImageVariantTests(TestCase):
+    """Test cases for the upload image processing pipeline"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = self.settings(
+            MEDIA_ROOT=self.media_root,
+            IMAGE_PROCESSING_BACKGROUND=False
+        )
+        self.settings_override.enable()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        import shutil
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def create_test_image(self, size=(1600, 900), with_exif=True):
+        """Helper method to create a JPEG carrying EXIF metadata"""
+        image = Image.new('RGB', size, color='green')
+        exif = Image.Exif()
+        exif[0x010F] = 'TestCamera'  # Make
+        image_io = io.BytesIO()
+        image.save(image_io, format='JPEG', exif=exif.tobytes() if with_exif else b'')
+        return SimpleUploadedFile('photo.jpg', image_io.getvalue(), content_type='image/jpeg')
+
+    def open_variant(self, path):
+        from django.core.files.storage import default_storage
+        with default_storage.open(path) as f:
+            image = Image.open(io.BytesIO(f.read()))
+            image.load()
+        return image
+
+    def test_post_variants_generated(self):
+        """Test that feed variants are generated at fixed widths"""
+        post = Post.objects.create(
+            title='Photo', content='Content', author=self.user,
+            image=self.create_test_image()
+        )
+        post.refresh_from_db()
+
+        self.assertEqual(post.image_variants['source'], post.image.name)
+        for name, width in [('feed_320', 320), ('feed_640', 640), ('feed_1280', 1280)]:
+            variant = self.open_variant(post.image_variants[name])
+            self.assertEqual(variant.format, 'WEBP')
+            self.assertEqual(variant.width, width)
+
+    def test_variants_strip_metadata(self):
+        """Test that EXIF metadata does not survive re-encoding"""
+        post = Post.objects.create(
+            title='Photo', content='Content', author=self.user,
+            image=self.create_test_image()
+        )
+        variant = self.open_variant(post.image_variants['full'])
+        self.assertEqual(len(variant.getexif()), 0)
+
+    def test_small_images_not_upscaled(self):
+        """Test that feed variants never upscale small uploads"""
+        post = Post.objects.create(
+            title='Photo', content='Content', author=self.user,
+            image=self.create_test_image(size=(200, 100))
+        )
+        self.assertEqual(self.open_variant(post.image_variants['feed_1280']).size, (200, 100))
+
+    def test_avatar_variants_are_square(self):
+        """Test that avatar variants are cropped to 64 and 128 squares"""
+        profile = self.user.user_profile
+        profile.profile_image = self.create_test_image()
+        profile.save()
+
+        self.assertEqual(self.open_variant(profile.profile_image_variants['avatar_64']).size, (64, 64))
+        self.assertEqual(self.open_variant(profile.profile_image_variants['avatar_128']).size, (128, 128))
+
+    def test_clearing_image_removes_variants(self):
+        """Test that variants are dropped together with the image"""
+        from .models import StoredFile
+
+        post = Post.objects.create(
+            title='Photo', content='Content', author=self.user,
+            image=self.create_test_image()
+        )
+        old_path = post.image_variants['feed_640']
+        post.image = ''
+        post.save()
+
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants, {})
+        self.assertEqual(StoredFile.objects.get(name=old_path).ref_count, 0)
+
+    def test_serializers_return_small_versions(self):
+        """Test that feed and author serializers expose the small variants"""
+        from .serializer import PostListSerializer, AuthorSerializer
+        from rest_framework.test import APIRequestFactory
+
+        profile = self.user.user_profile
+        profile.profile_image = self.create_test_image()
+        profile.save()
+        post = Post.objects.create(
+            title='Photo', content='Content', author=self.user,
+            image=self.create_test_image()
+        )
+        request = APIRequestFactory().get('/')
+        request.user = self.user
+
+        data = PostListSerializer(post, context={'request': request}).data
+        self.assertEqual(data['image'], 'http://testserver' + post.image.storage.url(post.image_variants['feed_640']))
+        self.assertIn('feed_320', data['image_variants'])
+        self.assertEqual(
+            data['author']['profile_picture'],
+            'http://testserver' + profile.profile_image.storage.url(profile.profile_image_variants['avatar_128'])
+        )
+
+        author = AuthorSerializer(self.user, context={'request': request}).data
+        self.assertTrue(author['profile_picture'].startswith('http://testserver/'))
+
+
+class ImageWorkerTests(TestCase):
+    """Test cases for off-request image variant generation"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = self.settings(
+            MEDIA_ROOT=self.media_root,
+            IMAGE_PROCESSING_BACKGROUND=True,
+            IMAGE_WORKER_PROCESSES=0
+        )
+        self.settings_override.enable()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    def tearDown(self):
+        from . import image_worker
+        image_worker.shutdown()
+        self.settings_override.disable()
+        import shutil
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def create_test_image(self):
+        image = Image.new('RGB', (800, 600), color='purple')
+        image_io = io.BytesIO()
+        image.save(image_io, format='JPEG')
+        return SimpleUploadedFile('photo.jpg', image_io.getvalue(), content_type='image/jpeg')
+
+    def create_post(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            post = Post.objects.create(
+                title='Photo', content='Content', author=self.user,
+                image=self.create_test_image()
+            )
+        return post, callbacks
+
+    def test_upload_returns_processing_status(self):
+        """Test that saving an upload only queues the work"""
+        from .serializer import PostListSerializer
+        from rest_framework.test import APIRequestFactory
+
+        post, callbacks = self.create_post()
+        self.assertEqual(len(callbacks), 1)
+
+        request = APIRequestFactory().get('/')
+        request.user = self.user
+        data = PostListSerializer(post, context={'request': request}).data
+        self.assertEqual(data['image_status'], 'processing')
+        self.assertEqual(data['image'], 'http://testserver' + post.image.url)
+        self.assertEqual(data['image_variants'], {})
+
+    def test_job_records_variants(self):
+        """Test that a processed job makes the variants available"""
+        from . import image_worker
+
+        post, _ = self.create_post()
+        job = image_worker.ImageJob(Post, post.pk, 'image', 'image_variants', 'posts', post.image.name)
+        self.assertTrue(image_worker.process_job(job))
+
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants['status'], 'ready')
+        self.assertIn('feed_640', post.image_variants)
+
+    def test_stale_job_is_discarded(self):
+        """Test that a job for a replaced image does not overwrite newer state"""
+        from . import image_worker
+
+        post, _ = self.create_post()
+        job = image_worker.ImageJob(Post, post.pk, 'image', 'image_variants', 'posts', 'posts/old.jpg')
+        self.assertFalse(image_worker.process_job(job))
+
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants['status'], 'processing')
+
+    def test_regenerate_command_uses_process_pool(self):
+        """Test bulk regeneration through the management command"""
+        from django.core.management import call_command
+
+        post, _ = self.create_post()
+        out = io.StringIO()
+        with self.settings(IMAGE_WORKER_PROCESSES=1):
+            call_command('regenerate_image_variants', '--model', 'posts', '--missing-only', stdout=out)
+
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants['status'], 'ready')
+        self.assertIn('Regenerated variants for 1 of 1 posts', out.getvalue())
+
+
+class ContentAddressedStorageTests(TestCase):
+    """Test cases for deduplicating media storage and orphan cleanup"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = self.settings(
+            MEDIA_ROOT=self.media_root,
+            IMAGE_PROCESSING_BACKGROUND=False
+        )
+        self.settings_override.enable()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        import shutil
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def create_test_image(self, color='orange'):
+        image = Image.new('RGB', (120, 80), color=color)
+        image_io = io.BytesIO()
+        image.save(image_io, format='PNG')
+        return SimpleUploadedFile('screenshot.png', image_io.getvalue(), content_type='image/png')
+
+    def test_identical_uploads_are_stored_once(self):
+        """Test that the same content maps to one hashed file with two references"""
+        from .models import StoredFile
+
+        first = Post.objects.create(title='One', content='c', author=self.user, image=self.create_test_image())
+        second = Post.objects.create(title='Two', content='c', author=self.user, image=self.create_test_image())
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual(StoredFile.objects.get(name=first.image.name).ref_count, 2)
+
+    def test_delete_only_releases_reference(self):
+        """Test that removing an image defers the file deletion"""
+        from .models import StoredFile
+        from django.core.files.storage import default_storage
+
+        post = Post.objects.create(title='One', content='c', author=self.user, image=self.create_test_image())
+        name = post.image.name
+        post.delete()
+
+        stored = StoredFile.objects.get(name=name)
+        self.assertEqual(stored.ref_count, 0)
+        self.assertIsNotNone(stored.released_at)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_cleanup_removes_only_orphans(self):
+        """Test that the cleanup command removes unreferenced files in batches"""
+        from .models import StoredFile
+        from django.core.files.storage import default_storage
+        from django.core.management import call_command
+
+        kept = Post.objects.create(title='Kept', content='c', author=self.user, image=self.create_test_image('red'))
+        removed = Post.objects.create(title='Gone', content='c', author=self.user, image=self.create_test_image('blue'))
+        removed_name = removed.image.name
+        removed.delete()
+
+        out = io.StringIO()
+        call_command('cleanup_orphaned_media', '--hours', '0', '--batch-size', '1', stdout=out)
+
+        self.assertFalse(default_storage.exists(removed_name))
+        self.assertFalse(StoredFile.objects.filter(name=removed_name).exists())
+        self.assertTrue(default_storage.exists(kept.image.name))
+        for path in kept.image_variants.values():
+            if path not in ('ready', kept.image.name):
+                self.assertTrue(default_storage.exists(path))
+
+    def test_cleanup_keeps_files_referenced_meanwhile(self):
+        """Test that a file re-uploaded between the orphan check and the delete is not purged"""
+        from django.core.files.storage import default_storage
+        from django.core.management import call_command
+        from django.db.models.query import QuerySet
+        from .models import StoredFile
+
+        post = Post.objects.create(title='One', content='c', author=self.user, image=self.create_test_image())
+        name = post.image.name
+        Post.objects.filter(pk=post.pk).update(image='')
+        default_storage.delete(name)
+        delete = QuerySet.delete
+
+        def reupload_then_delete(queryset):
+            if queryset.model is StoredFile:
+                default_storage.retain(name)
+            return delete(queryset)
+
+        with mock.patch.object(QuerySet, 'delete', reupload_then_delete):
+            call_command('cleanup_orphaned_media', '--hours', '0', stdout=io.StringIO())
+        self.assertEqual(StoredFile.objects.get(name=name).ref_count, 1)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_upload_racing_cleanup_rewrites_file(self):
+        """Test that content purged just before an upload references it is written again"""
+        from django.core.files.storage import default_storage
+        from django.core.management import call_command
+        from .models import StoredFile
+        from .storage import ContentAddressedStorage
+
+        post = Post.objects.create(title='One', content='c', author=self.user, image=self.create_test_image())
+        name = post.image.name
+        post.delete()
+        retain = ContentAddressedStorage.retain
+
+        def cleanup_then_retain(storage, *args, **kwargs):
+            call_command('cleanup_orphaned_media', '--hours', '0', stdout=io.StringIO())
+            return retain(storage, *args, **kwargs)
+
+        with mock.patch.object(ContentAddressedStorage, 'retain', cleanup_then_retain):
+            again = Post.objects.create(title='Two', content='c', author=self.user, image=self.create_test_image())
+        self.assertEqual(again.image.name, name)
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(StoredFile.objects.get(name=name).ref_count, 1)
+
+    def test_recount_fixes_leaked_references(self):
+        """Test that --recount releases files no row refers to"""
+        from .models import StoredFile
+
+        post = Post.objects.create(title='One', content='c', author=self.user, image=self.create_test_image())
+        name = post.image.name
+        Post.objects.filter(pk=post.pk).update(image='')  # Bypasses the storage entirely
+
+        from django.core.management import call_command
+        call_command('cleanup_orphaned_media', '--recount', '--hours', '1', stdout=io.StringIO())
+        stored = StoredFile.objects.get(name=name)
+        self.assertEqual(stored.ref_count, 0)
+        self.assertIsNotNone(stored.released_at)
+
+
+class StreamingUploadTests(APITestCase):
+    """Test cases for streamed multipart uploads and resumable chunked uploads"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.chunk_root = tempfile.mkdtemp()
+        self.settings_override = self.settings(
+            MEDIA_ROOT=self.media_root,
+            CHUNKED_UPLOAD_DIR=self.chunk_root,
+            IMAGE_PROCESSING_BACKGROUND=False
+        )
+        self.settings_override.enable()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        import shutil
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        shutil.rmtree(self.chunk_root, ignore_errors=True)
+
+    def image_bytes(self, size=(300, 200)):
+        image = Image.new('RGB', size, color='teal')
+        image_io = io.BytesIO()
+        image.save(image_io, format='PNG')
+        return image_io.getvalue()
+
+    def post_data(self, upload):
+        return {'title': 'Upload', 'content': 'Content', 'post_type': 'post', 'tags': '["photos"]', 'image': upload}
+
+    def test_streamed_post_image_accepted(self):
+        """Test that a valid image is streamed through and saved"""
+        upload = SimpleUploadedFile('photo.png', self.image_bytes(), content_type='image/png')
+        response = self.client.post(reverse('post-list'), self.post_data(upload), format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Post.objects.get(title='Upload').image)
+
+    def test_fake_image_rejected_by_magic_number(self):
+        """Test that files are typed by their first bytes, not the declared type"""
+        upload = SimpleUploadedFile('photo.jpg', b'MZ\x90\x00' + b'\x00' * 100, content_type='image/jpeg')
+        response = self.client.post(reverse('post-list'), self.post_data(upload), format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['field'], 'image')
+        self.assertFalse(Post.objects.exists())
+
+    def test_oversized_post_image_rejected(self):
+        """Test that post images larger than POST_IMAGE_MAX_SIZE are rejected"""
+        data = self.image_bytes(size=(400, 400))
+        upload = SimpleUploadedFile('photo.png', data, content_type='image/png')
+        with self.settings(POST_IMAGE_MAX_SIZE=len(data) - 1):
+            response = self.client.post(reverse('post-list'), self.post_data(upload), format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('cannot exceed', response.data['error'])
+        self.assertFalse(Post.objects.exists())
+
+    def test_oversized_request_rejected_before_parsing(self):
+        """Test that a body larger than the limit plus the multipart allowance is a 400, not a 500"""
+        from blog.uploads import MULTIPART_OVERHEAD
+
+        limit = 1024 * 1024
+        upload = SimpleUploadedFile('photo.png', b'\x89PNG\r\n\x1a\n' + b'\x00' * (limit + MULTIPART_OVERHEAD), content_type='image/png')
+        with self.settings(POST_IMAGE_MAX_SIZE=limit):
+            response = self.client.post(reverse('post-list'), self.post_data(upload), format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'Upload size cannot exceed 1MB.')
+        self.assertNotIn('field', response.data)
+        self.assertFalse(Post.objects.exists())
+
+    def start_upload(self, data):
+        response = self.client.post(reverse('upload-create'), {
+            'filename': 'big.png',
+            'content_type': 'image/png',
+            'size': len(data)
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['upload_id']
+
+    def send_chunk(self, upload_id, data, start, end):
+        return self.client.put(
+            reverse('upload-detail', kwargs={'upload_id': upload_id}),
+            data=data[start:end + 1],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(data)}'
+        )
+
+    def test_resumable_chunked_upload(self):
+        """Test uploading in chunks, resuming from the server offset and posting"""
+        from .models import UploadSession
+
+        data = self.image_bytes(size=(600, 600))
+        upload_id = self.start_upload(data)
+        middle = len(data) // 2
+
+        response = self.send_chunk(upload_id, data, 0, middle - 1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['offset'], middle)
+
+        # A retried chunk from the wrong position is refused with the offset to resume from
+        response = self.send_chunk(upload_id, data, 0, middle - 1)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['offset'], middle)
+
+        response = self.client.get(reverse('upload-detail', kwargs={'upload_id': upload_id}))
+        self.assertEqual(response.data['offset'], middle)
+
+        response = self.send_chunk(upload_id, data, middle, len(data) - 1)
+        self.assertTrue(response.data['is_complete'])
+
+        response = self.client.post(reverse('post-list'), {
+            'title': 'Chunked', 'content': 'Content', 'post_type': 'post', 'tags': ['photos'], 'upload_id': upload_id
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        post = Post.objects.get(title='Chunked')
+        with post.image.open('rb') as f:
+            self.assertEqual(f.read(), data)
+        self.assertFalse(UploadSession.objects.filter(id=upload_id).exists())
+
+    def test_chunked_upload_rejects_non_image(self):
+        """Test that the first chunk is checked against the image magic numbers"""
+        from .models import UploadSession
+
+        data = b'%PDF-1.7' + b'\x00' * 200
+        upload_id = self.start_upload(data)
+        response = self.send_chunk(upload_id, data, 0, len(data) - 1)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(UploadSession.objects.filter(id=upload_id).exists())
+
+    def test_incomplete_upload_cannot_be_posted(self):
+        """Test that a post cannot reference an unfinished upload"""
+        data = self.image_bytes()
+        upload_id = self.start_upload(data)
+        response = self.client.post(reverse('post-list'), {
+            'title': 'Early', 'content': 'Content', 'post_type': 'post', 'tags': ['photos'], 'upload_id': upload_id
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AuthorCardTests(TestCase):
+    """Test cases for the cached author cards used by embedded authors"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from rest_framework.test import APIRequestFactory
+
+        cache.clear()
+        self.users = [
+            User.objects.create_user(
+                username=f'author{i}', email=f'author{i}@example.com', password='testpass123',
+                first_name=f'First{i}', last_name=f'Last{i}'
+            )
+            for i in range(3)
+        ]
+        for i, user in enumerate(self.users):
+            post = Post.objects.create(title=f'Post {i}', content='Content', author=user)
+            for commenter in self.users:
+                Comment.objects.create(post=post, user=commenter, content='Nice')
+        self.request = APIRequestFactory().get('/')
+        self.request.user = self.users[0]
+
+    def serialize_posts(self):
+        from .serializer import PostListSerializer
+
+        posts = Post.objects.prefetch_related('post_comment').order_by('id')
+        return PostListSerializer(posts, many=True, context={'request': self.request}).data
+
+    def test_cards_resolved_in_one_query(self):
+        """Test that authors and commenters of a page are loaded together, then served from cache"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as cold:
+            data = self.serialize_posts()
+        user_queries = [q for q in cold.captured_queries if 'FROM "blog_user"' in q['sql']]
+        self.assertEqual(len(user_queries), 1)
+        self.assertEqual(data[0]['author']['username'], 'author0')
+        self.assertEqual(data[0]['comments'][1]['user'], 'author1')
+        self.assertEqual(data[0]['comments'][1]['first_name'], 'First1')
+        self.assertEqual(data[0]['comments'][1]['author']['last_name'], 'Last1')
+
+        with CaptureQueriesContext(connection) as warm:
+            self.serialize_posts()
+        self.assertFalse([q for q in warm.captured_queries if 'FROM "blog_user"' in q['sql']])
+
+    def test_name_change_invalidates_card(self):
+        """Test that editing a user's name is visible in the next response"""
+        self.serialize_posts()
+        user = self.users[1]
+        user.first_name = 'Renamed'
+        user.save()
+
+        data = self.serialize_posts()
+        self.assertEqual(data[1]['author']['first_name'], 'Renamed')
+
+    def test_profile_image_change_invalidates_card(self):
+        """Test that a new avatar replaces the cached profile picture"""
+        media_root = tempfile.mkdtemp()
+        with self.settings(MEDIA_ROOT=media_root, IMAGE_PROCESSING_BACKGROUND=False):
+            data = self.serialize_posts()
+            self.assertIsNone(data[0]['author']['profile_picture'])
+
+            image = io.BytesIO()
+            Image.new('RGB', (300, 300), color='blue').save(image, 'JPEG')
+            profile = self.users[0].user_profile
+            profile.profile_image = SimpleUploadedFile('avatar.jpg', image.getvalue(), content_type='image/jpeg')
+            profile.save()
+            profile.refresh_from_db()
+
+            data = self.serialize_posts()
+            self.assertEqual(
+                data[0]['author']['profile_picture'],
+                'http://testserver' + profile.profile_image.storage.url(profile.profile_image_variants['avatar_128'])
+            )
+
+
+class SavedPostsPaginationTests(APITestCase):
+    """Test cases for the keyset-paginated saved posts listing"""
+
+    def setUp(self):
+        from .models import Save_Post
+
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.posts = [
+            Post.objects.create(title=f'Post {i}', content='Content', author=self.user)
+            for i in range(5)
+        ]
+        # Save in reverse creation order so save time and post time disagree
+        for post in reversed(self.posts):
+            Save_Post.objects.create(user=self.user, post=post)
+
+    def test_pages_follow_save_order(self):
+        """Test that pages list posts by save time and continue via the cursor"""
+        url = reverse('saved-posts') + '?page_size=2'
+        titles = []
+        pages = 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            titles.extend(post['title'] for post in response.data['saved_posts'])
+            url = response.data['next']
+            pages += 1
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(titles, [f'Post {i}' for i in range(5)])
+
+    def test_new_saves_do_not_shift_pages(self):
+        """Test that saving a post between requests does not repeat items"""
+        from .models import Save_Post
+
+        response = self.client.get(reverse('saved-posts') + '?page_size=2')
+        first_page = [post['id'] for post in response.data['saved_posts']]
+        extra = Post.objects.create(title='Extra', content='Content', author=self.user)
+        Save_Post.objects.create(user=self.user, post=extra)
+
+        response = self.client.get(response.data['next'])
+        second_page = [post['id'] for post in response.data['saved_posts']]
+        self.assertFalse(set(first_page) & set(second_page))
+        self.assertNotIn(extra.id, second_page)
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor is rejected"""
+        response = self.client.get(reverse('saved-posts') + '?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class HomeTimelineTests(APITestCase):
+    """Test cases for following users and the fan-out home timeline"""
+
+    def setUp(self):
+        self.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='testpass123'
+        )
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='testpass123'
+        )
+        self.stranger = User.objects.create_user(
+            username='stranger', email='stranger@example.com', password='testpass123'
+        )
+        self.client.force_authenticate(user=self.reader)
+
+    def publish(self, user, title):
+        self.client.force_authenticate(user=user)
+        response = self.client.post(reverse('post-list'), {
+            'title': title, 'content': 'Content', 'post_type': 'post', 'tags': ['news']
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.client.force_authenticate(user=self.reader)
+
+    def timeline_titles(self, url=None):
+        response = self.client.get(url or reverse('home-timeline'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post['title'] for post in response.data['posts']], response.data['next']
+
+    def test_follow_backfills_and_fans_out(self):
+        """Test that followed authors' old and new posts reach the timeline"""
+        from .models import TimelineEntry
+
+        Post.objects.create(title='Before follow', content='Content', author=self.author)
+        Post.objects.create(title='Unrelated', content='Content', author=self.stranger)
+
+        response = self.client.post(reverse('user-follow', kwargs={'username': 'author'}))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['followers_count'], 1)
+
+        self.publish(self.author, 'After follow')
+        self.assertEqual(TimelineEntry.objects.filter(user=self.reader).count(), 2)
+
+        titles, _ = self.timeline_titles()
+        self.assertEqual(titles, ['After follow', 'Before follow'])
+
+    def test_unfollow_removes_posts(self):
+        """Test that unfollowing drops the author's posts from the timeline"""
+        self.client.post(reverse('user-follow', kwargs={'username': 'author'}))
+        self.publish(self.author, 'Hello')
+
+        response = self.client.delete(reverse('user-follow', kwargs={'username': 'author'}))
+        self.assertEqual(response.data['followers_count'], 0)
+        titles, _ = self.timeline_titles()
+        self.assertEqual(titles, [])
+
+    def test_cannot_follow_self(self):
+        """Test that following yourself is rejected"""
+        response = self.client.post(reverse('user-follow', kwargs={'username': 'reader'}))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_high_follower_authors_are_merged_on_read(self):
+        """Test that posts of popular authors are read from their posts, not fanned out"""
+        from .models import TimelineEntry
+
+        with self.settings(TIMELINE_FANOUT_LIMIT=1):
+            self.client.post(reverse('user-follow', kwargs={'username': 'author'}))
+            self.client.force_authenticate(user=self.stranger)
+            self.client.post(reverse('user-follow', kwargs={'username': 'author'}))
+            self.client.force_authenticate(user=self.reader)
+            self.client.post(reverse('user-follow', kwargs={'username': 'stranger'}))
+
+            for i in range(3):
+                self.publish(self.author, f'Popular {i}')
+                self.publish(self.stranger, f'Ordinary {i}')
+
+            self.assertFalse(TimelineEntry.objects.filter(user=self.reader, post__author=self.author).exists())
+
+            titles, next_url = self.timeline_titles(reverse('home-timeline') + '?page_size=4')
+            more, last = self.timeline_titles(next_url)
+
+        self.assertEqual(titles + more, [
+            'Ordinary 2', 'Popular 2', 'Ordinary 1', 'Popular 1', 'Ordinary 0', 'Popular 0'
+        ])
+        self.assertIsNone(last)
+
+
+class NotificationStreamTests(TestCase):
+    """Test cases for pushing notifications over server-sent events"""
+
+    def setUp(self):
+        from .realtime import reset_broker
+
+        self.settings_override = self.settings(
+            NOTIFICATION_BROKER={'BACKEND': 'blog.realtime.LocalBroker'}
+        )
+        self.settings_override.enable()
+        reset_broker()
+        self.recipient = User.objects.create_user(
+            username='recipient', email='recipient@example.com', password='testpass123'
+        )
+        self.sender = User.objects.create_user(
+            username='sender', email='sender@example.com', password='testpass123'
+        )
+        self.post = Post.objects.create(title='Post', content='Content', author=self.recipient)
+        self.token = Token.objects.create(user=self.recipient)
+
+    def tearDown(self):
+        from .realtime import reset_broker
+
+        self.settings_override.disable()
+        reset_broker()
+
+    def test_create_notification_publishes_after_commit(self):
+        """Test that new notifications are published to the recipient's channel on commit"""
+        from unittest import mock
+        from .models import Notification
+        from .realtime import get_broker
+
+        with mock.patch.object(get_broker(), 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                notification = Notification.create_notification(
+                    user=self.recipient, sender=self.sender, notification_type='comment', post=self.post
+                )
+                publish.assert_not_called()
+
+        channel, message = publish.call_args[0]
+        self.assertEqual(channel, f'notifications:{self.recipient.pk}')
+        self.assertEqual(message['id'], notification.id)
+        self.assertEqual(message['data']['sender']['username'], 'sender')
+
+    async def test_local_broker_delivers_across_threads(self):
+        """Test that messages published from a worker thread reach async subscribers"""
+        import asyncio
+        from .realtime import LocalBroker
+
+        broker = LocalBroker()
+        async with broker.subscribe('channel') as queue:
+            await asyncio.to_thread(broker.publish, 'channel', {'id': 1})
+            await asyncio.to_thread(broker.publish, 'other', {'id': 2})
+            self.assertEqual(await asyncio.wait_for(queue.get(), 1), {'id': 1})
+            self.assertTrue(queue.empty())
+        self.assertEqual(broker.subscribers, {})
+
+    async def test_stream_pushes_events(self):
+        """Test that a connected client receives published notifications"""
+        import asyncio
+        from django.test import AsyncClient
+        from .realtime import get_broker, notification_channel
+
+        response = await AsyncClient().get(reverse('notification-stream'), {'token': self.token.key})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+        next_chunk = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.05)  # Let the stream subscribe
+        get_broker().publish(notification_channel(self.recipient.pk), {'id': 7, 'data': {'message': 'Hi'}})
+        chunk = await asyncio.wait_for(next_chunk, 1)
+        self.assertEqual(chunk, b'id: 7\nevent: notification\ndata: {"message": "Hi"}\n\n')
+        await stream.aclose()
+
+    async def test_stream_requires_authentication(self):
+        """Test that anonymous clients are refused"""
+        from django.test import AsyncClient
+
+        response = await AsyncClient().get(reverse('notification-stream'))
+        self.assertEqual(response.status_code, 401)
+
+
+class AsyncReadViewTests(TestCase):
+    """Test cases for the async read endpoints served under ASGI"""
+
+    def setUp(self):
+        from .models import Notification, Share, Save_Post
+
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='testpass123', first_name='Read'
+        )
+        self.other = User.objects.create_user(
+            username='writer', email='writer@example.com', password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        for i in range(3):
+            post = Post.objects.create(title=f'Post {i}', content='Content', author=self.user)
+            post.tags.add('news', f'tag{i}')
+            Comment.objects.create(post=post, user=self.other, content='Nice')
+            Reacts.objects.create(post=post, user=self.other, react='Thunder')
+        Share.objects.create(post=post, user=self.user)
+        Save_Post.objects.create(post=post, user=self.user)
+        Reacts.objects.create(post=post, user=self.user, react='Love')
+        self.post = post
+        self.assertTrue(Notification.objects.filter(user=self.user).exists())
+
+    def sync_get(self, url):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        response = client.get(url)
+        return response.status_code, json.loads(response.content)
+
+    async def async_get(self, url, **headers):
+        from django.test import AsyncClient
+
+        headers.setdefault('Authorization', f'Token {self.token.key}')
+        response = await AsyncClient().get(url, headers=headers)
+        return response.status_code, json.loads(response.content)
+
+    async def assert_same_response(self, sync_url, async_url):
+        from asgiref.sync import sync_to_async
+
+        expected = await sync_to_async(self.sync_get)(sync_url)
+        status_code, data = await self.async_get(async_url)
+        # Pagination links point at the async endpoint itself
+        data = json.loads(json.dumps(data).replace('/api/async/', '/api/'))
+        self.assertEqual((status_code, data), expected)
+        return status_code, data
+
+    async def test_feed_matches_sync_endpoint(self):
+        """Test that the async feed returns the same page as PostListApi"""
+        _, data = await self.assert_same_response(
+            reverse('post-list') + '?page=2&page_size=2',
+            reverse('async-post-list') + '?page=2&page_size=2'
+        )
+        self.assertEqual(data['count'], 3)
+        await self.assert_same_response(
+            reverse('post-list') + '?tags=tag1', reverse('async-post-list') + '?tags=tag1'
+        )
+
+    async def test_post_detail_matches_sync_endpoint(self):
+        """Test that the async post detail returns the same post as PostDetailApi"""
+        _, data = await self.assert_same_response(
+            reverse('post-detail', kwargs={'pk': self.post.pk}),
+            reverse('async-post-detail', kwargs={'pk': self.post.pk})
+        )
+        self.assertEqual(data['post']['user_reaction'], 'Love')
+        self.assertTrue(data['post']['is_saved'])
+        await self.assert_same_response(
+            reverse('post-detail', kwargs={'pk': 999}), reverse('async-post-detail', kwargs={'pk': 999})
+        )
+
+    async def test_profile_matches_sync_endpoint(self):
+        """Test that the async profile returns the same data as ProfileListApi"""
+        _, data = await self.assert_same_response(
+            reverse('profile-detail', kwargs={'username': 'reader'}),
+            reverse('async-profile-detail', kwargs={'username': 'reader'})
+        )
+        self.assertEqual(data['posts_count'], 3)
+
+    async def test_notifications_match_sync_endpoint(self):
+        """Test that the async notification list returns the same data as NotificationAPI"""
+        _, data = await self.assert_same_response(reverse('notifications'), reverse('async-notifications'))
+        self.assertTrue(any(n['thundered'] for n in data['results']))
+
+    async def test_sparse_notifications_fetched_once(self):
+        """Test that a sparse notification list reuses the rows of the attached notifications"""
+        from . import async_views
+
+        query = '?fields=id,message,thundered'
+        with mock.patch.object(async_views, 'unread_notifications', wraps=async_views.unread_notifications) as fetch:
+            _, data = await self.assert_same_response(
+                reverse('notifications') + query, reverse('async-notifications') + query
+            )
+        fetch.assert_called_once()
+        self.assertEqual({key for item in data['results'] for key in item}, {'id', 'message', 'thundered'})
+        self.assertIn('sender', data['notifications'][0])
+
+    async def test_requires_authentication(self):
+        """Test that the async endpoints refuse anonymous requests"""
+        status_code, _ = await self.async_get(reverse('async-post-list'), Authorization='')
+        self.assertEqual(status_code, 401)
+
+
+class NotificationRetentionTests(TestCase):
+    """Test cases for the prune_notifications command"""
+
+    def setUp(self):
+        from .models import Notification
+
+        self.recipient = User.objects.create_user(
+            username='recipient', email='recipient@example.com', password='testpass123'
+        )
+        self.actors = [
+            User.objects.create_user(username=f'actor{i}', email=f'actor{i}@example.com')
+            for i in range(8)
+        ]
+        self.post = Post.objects.create(title='Post', content='Content', author=self.recipient)
+        self.Notification = Notification
+
+    def notify(self, sender, notification_type='like', days_ago=0, is_read=False):
+        notification = self.Notification.objects.create(
+            user=self.recipient, sender=sender, notification_type=notification_type, post=self.post,
+            message=self.Notification.get_notification_message(sender, notification_type), is_read=is_read
+        )
+        self.Notification.objects.filter(pk=notification.pk).update(
+            created_at=timezone.now() - timezone.timedelta(days=days_ago)
+        )
+        return notification
+
+    def prune(self, *args):
+        from django.core.management import call_command
+
+        out = io.StringIO()
+        call_command('prune_notifications', '--pause', '0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_old_notifications_are_collapsed(self):
+        """Test that old notifications of the same type and post become one aggregate"""
+        for actor in self.actors[:6]:
+            self.notify(actor, days_ago=10, is_read=True)
+        self.notify(self.actors[6], days_ago=10)
+        recent = self.notify(self.actors[7], days_ago=1)
+        comment = self.notify(self.actors[0], 'comment', days_ago=10)
+
+        output = self.prune('--compact-after-days', '7')
+
+        self.assertIn('Collapsed 6 notifications into 1 aggregates', output)
+        aggregate = self.Notification.objects.exclude(pk=recent.pk).get(notification_type='like')
+        self.assertEqual(aggregate.actor_count, 7)
+        self.assertEqual(aggregate.message, '7 people liked your post')
+        self.assertEqual(aggregate.recent_actors[0], self.actors[6].pk)
+        self.assertEqual(len(aggregate.recent_actors), self.Notification.MAX_RECENT_ACTORS)
+        self.assertFalse(aggregate.is_read)  # One of the collapsed notifications was unread
+        self.assertTrue(self.Notification.objects.filter(pk=recent.pk).exists())
+        self.assertTrue(self.Notification.objects.filter(pk=comment.pk).exists())
+
+    def test_expired_notifications_deleted_in_batches(self):
+        """Test that notifications past retention are removed batch by batch"""
+        for actor in self.actors:
+            self.notify(actor, 'comment', days_ago=100)
+        kept = self.notify(self.actors[0], 'share', days_ago=1)
+
+        output = self.prune('--days', '90', '--batch-size', '3', '--compact-after-days', '365')
+
+        self.assertIn('Deleted 8 notifications older than 90 days', output)
+        self.assertEqual(list(self.Notification.objects.values_list('pk', flat=True)), [kept.pk])
+
+    def test_per_user_cap_keeps_newest(self):
+        """Test that users keep only their newest notifications"""
+        created = [self.notify(actor, 'comment', days_ago=len(self.actors) - i) for i, actor in enumerate(self.actors)]
+
+        self.prune('--per-user', '3', '--batch-size', '2', '--compact-after-days', '365')
+
+        self.assertEqual(
+            set(self.Notification.objects.values_list('pk', flat=True)),
+            {n.pk for n in created[-3:]}
+        )
+
+    def test_dry_run_changes_nothing(self):
+        """Test that a dry run only reports"""
+        for actor in self.actors:
+            self.notify(actor, days_ago=100)
+
+        output = self.prune('--dry-run')
+
+        self.assertIn('DRY RUN', output)
+        self.assertEqual(self.Notification.objects.count(), len(self.actors))
+
+
+class AggregatedNotificationTests(TestCase):
+    """Test cases for notifications aggregated per recipient, post and type"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='testpass123'
+        )
+        self.fans = [
+            User.objects.create_user(username=f'fan{i}', email=f'fan{i}@example.com')
+            for i in range(7)
+        ]
+        self.post = Post.objects.create(title='Viral', content='Content', author=self.author)
+
+    def test_reactions_update_one_notification(self):
+        """Test that many reactions produce one row counting the actors"""
+        from .models import Notification
+        from .serializer import NotificationSerializer
+
+        for fan in self.fans:
+            Reacts.objects.create(post=self.post, user=fan, react='Love')
+
+        notification = Notification.objects.get(user=self.author)
+        self.assertEqual(notification.actor_count, 7)
+        self.assertEqual(notification.message, '7 people liked your post')
+        self.assertEqual(notification.sender, self.fans[-1])
+        self.assertEqual(
+            notification.recent_actors,
+            [fan.pk for fan in reversed(self.fans)][:Notification.MAX_RECENT_ACTORS]
+        )
+
+        data = NotificationSerializer(notification).data
+        self.assertEqual(data['actor_count'], 7)
+        self.assertEqual([actor['username'] for actor in data['actors']], ['fan6', 'fan5', 'fan4', 'fan3', 'fan2'])
+        self.assertTrue(data['liked'])
+
+    def test_repeat_actor_is_counted_once(self):
+        """Test that the same user commenting again moves to the front without counting twice"""
+        from .models import Notification
+
+        Comment.objects.create(post=self.post, user=self.fans[0], content='First')
+        Comment.objects.create(post=self.post, user=self.fans[1], content='Second')
+        Comment.objects.create(post=self.post, user=self.fans[0], content='Third')
+
+        notification = Notification.objects.get(user=self.author, notification_type='comment')
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(notification.recent_actors, [self.fans[0].pk, self.fans[1].pk])
+
+    def test_new_event_reopens_read_notification(self):
+        """Test that a read aggregate becomes unread and newest when another event arrives"""
+        from .models import Notification
+
+        Reacts.objects.create(post=self.post, user=self.fans[0], react='Love')
+        other_post = Post.objects.create(title='Other', content='Content', author=self.author)
+        Reacts.objects.create(post=other_post, user=self.fans[1], react='Thunder')
+        Notification.objects.filter(user=self.author).update(is_read=True)
+
+        Reacts.objects.create(post=self.post, user=self.fans[2], react='Love')
+
+        notifications = list(Notification.objects.filter(user=self.author))
+        self.assertEqual(len(notifications), 2)
+        self.assertEqual(notifications[0].post, self.post)
+        self.assertFalse(notifications[0].is_read)
+        self.assertTrue(notifications[1].is_read)
+
+
+class NotificationInboxTests(APITestCase):
+    """Test cases for the paginated inbox and read-state updates"""
+
+    def setUp(self):
+        from .models import Notification
+
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.notifications = [
+            Notification.objects.create(user=self.user, notification_type='custom', message=f'Message {i}')
+            for i in range(5)
+        ]
+
+    def test_inbox_pages_unread_then_read(self):
+        """Test that unread and read notifications are paged separately"""
+        from .models import Notification
+
+        Notification.objects.filter(pk=self.notifications[0].pk).update(is_read=True)
+
+        response = self.client.get(reverse('notification-inbox') + '?page_size=3')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([n['message'] for n in response.data['results']], ['Message 4', 'Message 3', 'Message 2'])
+        self.assertEqual(response.data['unread_notifications_count'], 4)
+        response = self.client.get(response.data['next'])
+        self.assertEqual([n['message'] for n in response.data['results']], ['Message 1'])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(reverse('notification-inbox') + '?status=read')
+        self.assertEqual([n['message'] for n in response.data['results']], ['Message 0'])
+
+    def test_mark_read_keeps_notification(self):
+        """Test that marking a notification read updates it instead of deleting it"""
+        from .models import Notification
+
+        notification = self.notifications[2]
+        response = self.client.post(reverse('mark-notification-read', kwargs={'pk': notification.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        notification.refresh_from_db()
+        self.assertTrue(notification.is_read)
+
+        response = self.client.post(reverse('mark-notifications-read'), {
+            'ids': [self.notifications[0].pk, self.notifications[1].pk]
+        }, format='json')
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(Notification.objects.filter(user=self.user).count(), 5)
+
+    def test_mark_all_read_stops_at_high_water_mark(self):
+        """Test that notifications newer than the client's high-water mark stay unread"""
+        from .models import Notification
+
+        results = self.client.get(reverse('notification-inbox')).data['results']
+        response = self.client.post(reverse('mark-all-notifications-read'), {
+            'up_to': results[2]['created_at']
+        }, format='json')
+        self.assertEqual(response.data['updated'], 3)
+        self.assertEqual(
+            set(Notification.objects.filter(is_read=False).values_list('pk', flat=True)),
+            {self.notifications[3].pk, self.notifications[4].pk}
+        )
+
+        response = self.client.post(reverse('mark-all-notifications-read'), {'up_to': 'yesterday'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.post(reverse('mark-all-notifications-read'))
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+        self.assertEqual(Notification.objects.count(), 5)
+
+    def test_mark_all_read_leaves_revived_aggregate_unread(self):
+        """Test that an aggregate revived after the client's mark keeps its ID but stays unread"""
+        from .models import Notification
+
+        seen_at = self.client.get(reverse('notification-inbox')).data['results'][0]['created_at']
+        sender = User.objects.create_user(username='reactor', email='reactor@example.com', password='testpass123')
+        revived = self.notifications[1]
+        revived.add_actor(sender)
+        revived.save()
+
+        response = self.client.post(reverse('mark-all-notifications-read'), {'up_to': seen_at}, format='json')
+        self.assertEqual(response.data['updated'], 4)
+        self.assertLess(revived.pk, self.notifications[4].pk)
+        self.assertEqual(list(Notification.objects.filter(is_read=False).values_list('pk', flat=True)), [revived.pk])
+
+
+class LocalSMTPServer:
+    """Minimal threaded SMTP server that records messages and can reject the first few"""
+
+    def __init__(self, reject=0):
+        import socketserver
+        import threading
+
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                server.connections += 1
+                self.reply('220 localhost ready')
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        break
+                    command = line.decode().strip().split(' ')[0].upper()
+                    if command in ('EHLO', 'HELO'):
+                        self.reply('250 localhost')
+                    elif command in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                        self.reply('250 OK')
+                    elif command == 'DATA':
+                        self.reply('354 End data with <CR><LF>.<CR><LF>')
+                        data = []
+                        for data_line in iter(self.rfile.readline, b'.\r\n'):
+                            data.append(data_line)
+                        if server.reject > 0:
+                            server.reject -= 1
+                            self.reply('451 Try again later')
+                        else:
+                            server.messages.append(b''.join(data).decode())
+                            self.reply('250 Queued')
+                    elif command == 'QUIT':
+                        self.reply('221 Bye')
+                        break
+                    else:
+                        self.reply('502 Not implemented')
+
+            def reply(self, text):
+                self.wfile.write(text.encode() + b'\r\n')
+
+        self.messages = []
+        self.connections = 0
+        self.reject = reject
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class EmailQueueTests(APITestCase):
+    """Test the outbound email queue against a local SMTP server"""
+
+    def smtp_settings(self, server, **extra):
+        return self.settings(**{
+            'EMAIL_BACKEND': 'blog.email_backend.CustomSMTPEmailBackend',
+            'EMAIL_HOST': '127.0.0.1',
+            'EMAIL_PORT': server.port,
+            'EMAIL_USE_SSL': False,
+            'EMAIL_USE_TLS': False,
+            'EMAIL_HOST_USER': '',
+            'EMAIL_HOST_PASSWORD': '',
+            'EMAIL_QUEUE_BACKGROUND': False,
+            **extra
+        })
+
+    def queue(self, count):
+        from django.core.mail import EmailMultiAlternatives
+        from .email_queue import enqueue
+
+        for i in range(count):
+            message = EmailMultiAlternatives(f'Subject {i}', f'Body {i}', 'CyMate <noreply@example.com>', [f'user{i}@example.com'])
+            message.attach_alternative(f'<p>Body {i}</p>', 'text/html')
+            enqueue(message)
+
+    def test_endpoint_responds_once_queued(self):
+        """Test that requesting a code queues the email instead of talking to SMTP"""
+        from django.core import mail
+        from .models import OutboundEmail
+
+        with self.settings(EMAIL_QUEUE_BACKGROUND=False):
+            response = self.client.post(reverse('pre-registration-verify'), {'email': 'new@example.com'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(mail.outbox), 0)
+
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.to, ['new@example.com'])
+        self.assertEqual(email.status, OutboundEmail.STATUS_PENDING)
+        self.assertIn('<html', email.html_body.lower())
+
+    def test_batches_share_one_connection(self):
+        """Test that several batches are delivered over a single SMTP connection"""
+        from .email_queue import drain
+        from .models import OutboundEmail
+
+        self.queue(5)
+        with LocalSMTPServer() as server, self.smtp_settings(server, EMAIL_QUEUE_BATCH_SIZE=2):
+            self.assertEqual(drain(), 5)
+
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(len(server.messages), 5)
+        self.assertIn('<p>Body 0</p>', server.messages[0])
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.STATUS_SENT).count(), 5)
+
+    def test_failed_delivery_backs_off(self):
+        """Test that a rejected email is retried later with a growing delay and eventually given up"""
+        from .email_queue import drain
+        from .models import OutboundEmail
+
+        self.queue(2)
+        with LocalSMTPServer(reject=1) as server, self.smtp_settings(server, EMAIL_QUEUE_RETRY_DELAY=60):
+            self.assertEqual(drain(), 1)
+            failed = OutboundEmail.objects.get(status=OutboundEmail.STATUS_PENDING)
+            self.assertEqual(failed.attempts, 1)
+            self.assertIn('451', failed.last_error)
+            self.assertGreater(failed.next_attempt_at, timezone.now() + timezone.timedelta(seconds=50))
+
+            # Not due yet
+            self.assertEqual(drain(), 0)
+            OutboundEmail.objects.filter(pk=failed.pk).update(next_attempt_at=timezone.now())
+            self.assertEqual(drain(), 1)
+
+        failed.refresh_from_db()
+        self.assertEqual(failed.status, OutboundEmail.STATUS_SENT)
+        self.assertEqual(failed.attempts, 2)
+
+        self.queue(1)
+        with LocalSMTPServer(reject=5) as server, self.smtp_settings(server, EMAIL_QUEUE_MAX_ATTEMPTS=2):
+            drain()
+            OutboundEmail.objects.filter(status=OutboundEmail.STATUS_PENDING).update(next_attempt_at=timezone.now())
+            drain()
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.STATUS_FAILED).count(), 1)
+
+    def test_drain_with_locmem_backend(self):
+        """Test that backends without an SMTP connection deliver the queue"""
+        from django.core import mail
+        from .email_queue import drain
+        from .models import OutboundEmail
+
+        self.queue(3)
+        with self.settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', EMAIL_QUEUE_BACKGROUND=False):
+            self.assertEqual(drain(), 3)
+        self.assertEqual(sorted(message.subject for message in mail.outbox), ['Subject 0', 'Subject 1', 'Subject 2'])
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.STATUS_SENT).count(), 3)
+
+    def test_background_sender_woken_after_commit(self):
+        """Test that queuing an email wakes the background sender once the transaction commits"""
+        from .email_queue import sender
+
+        with self.settings(EMAIL_QUEUE_BACKGROUND=True):
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.queue(1)
+        self.assertEqual(callbacks, [sender.wake])
+
+
+class PrecompiledEmailTemplateTests(TestCase):
+    """Test that precompiled verification emails match the template engine output"""
+
+    def test_matches_render_to_string(self):
+        """Test both email types with and without a name, including characters that need escaping"""
+        from types import SimpleNamespace
+        from django.template.loader import render_to_string
+        from .email_templates import VERIFICATION_EMAILS, render_verification_email
+
+        for verification_type, spec in VERIFICATION_EMAILS.items():
+            for user in (None, SimpleNamespace(first_name=''), SimpleNamespace(first_name='<Ann & "Bo">')):
+                context = {
+                    'code': '012345',
+                    'email': 'a&b@example.com',
+                    'user': user,
+                    'expiry_minutes': 15,
+                    'verification_type': verification_type,
+                    'support_email': 'support@example.com',
+                }
+                subject, text, html = render_verification_email(
+                    verification_type, '012345', 'a&b@example.com', 15, 'support@example.com', user
+                )
+                self.assertEqual(subject, spec['subject'])
+                self.assertEqual(html, render_to_string(spec['template'] + '.html', context))
+                self.assertEqual(text, render_to_string(spec['template'] + '.txt', context))
+                self.assertIn('Your verification code is: 012345', text)
+
+        self.assertIsNone(render_verification_email('unknown', '1', 'a@example.com', 15, 's@example.com'))
+
+
+class VerificationCodeStoreTests(TestCase):
+    """Test the database and cache verification code stores"""
+
+    CACHE_STORE = {'BACKEND': 'blog.verification_codes.CacheCodeStore', 'OPTIONS': {}}
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def check_single_use(self):
+        from .email_verification_service import EmailVerificationService as Service
+
+        first = Service.create_verification_code('new@example.com', 'registration')
+        second = Service.create_verification_code('new@example.com', 'registration')
+        if first.code != second.code:
+            self.assertFalse(Service.verify_code('new@example.com', first.code, 'registration')[0])
+        self.assertFalse(Service.verify_code('new@example.com', second.code, 'password_reset')[0])
+
+        success, message, verification = Service.verify_code('new@example.com', second.code, 'registration')
+        self.assertTrue(success)
+        self.assertEqual(verification.code, second.code)
+        success, message, _ = Service.verify_code('new@example.com', second.code, 'registration')
+        self.assertFalse(success)
+        self.assertEqual(message, 'Invalid verification code')
+
+    def test_database_store(self):
+        """Test that the default store keeps codes as rows and consumes them once"""
+        from .models import EmailVerification
+
+        self.check_single_use()
+        self.assertTrue(EmailVerification.objects.get(email='new@example.com').is_used)
+
+    def test_cache_store_skips_database(self):
+        """Test that cached codes are single-use and never touch the database"""
+        from .models import EmailVerification
+
+        with self.settings(EMAIL_VERIFICATION_CODE_STORE=self.CACHE_STORE):
+            with self.assertNumQueries(0):
+                self.check_single_use()
+        self.assertFalse(EmailVerification.objects.exists())
+
+    def test_cache_store_expiry_and_status(self):
+        """Test that an expired cached code is rejected and the status endpoint reads the cache"""
+        from .verification_codes import EXPIRED, get_code_store
+
+        with self.settings(EMAIL_VERIFICATION_CODE_STORE=self.CACHE_STORE):
+            store = get_code_store()
+            store.issue('old@example.com', 'registration', '111111', timezone.now() - timezone.timedelta(seconds=1))
+            self.assertEqual(store.consume('old@example.com', '111111', 'registration'), (EXPIRED, None))
+
+            store.issue('new@example.com', 'registration', '222222', timezone.now() + timezone.timedelta(minutes=15))
+            response = self.client.get(reverse('verification-status'), {'email': 'new@example.com', 'type': 'registration'})
+            self.assertTrue(response.json()['has_active_code'])
+
+    def test_cache_store_audit(self):
+        """Test that the audit option records cached codes in the database"""
+        from .email_verification_service import EmailVerificationService as Service
+        from .models import EmailVerification
+
+        store = {'BACKEND': 'blog.verification_codes.CacheCodeStore', 'OPTIONS': {'audit': True}}
+        with self.settings(EMAIL_VERIFICATION_CODE_STORE=store):
+            verification = Service.create_verification_code('new@example.com', 'registration')
+            self.assertTrue(Service.verify_code('new@example.com', verification.code, 'registration')[0])
+        self.assertTrue(EmailVerification.objects.get(email='new@example.com').is_used)
+
+
+class CachedAuthenticationTests(APITestCase):
+    """Test token authentication through the cache and the stateless JWT option"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='cached', email='cached@example.com', password='testpass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def token_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('notifications'))
+        return response, [q['sql'] for q in queries if 'authtoken_token' in q['sql']]
+
+    def test_token_lookup_cached(self):
+        """Test that only the first request looks the token up"""
+        response, lookups = self.token_queries()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(lookups), 1)
+        response, lookups = self.token_queries()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(lookups, [])
+
+    def test_logout_and_deactivation_invalidate(self):
+        """Test that a cached token stops working after logout or deactivation"""
+        self.assertEqual(self.token_queries()[0].status_code, status.HTTP_200_OK)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.token_queries()[0].status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.token_queries()[0].status_code, status.HTTP_200_OK)
+        self.client.post(reverse('rest_logout'))
+        self.assertEqual(self.token_queries()[0].status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_refreshes_cached_user(self):
+        """Test that a password change replaces the cached user"""
+        from .authentication import get_token
+
+        self.token_queries()
+        self.user.set_password('newpass456')
+        self.user.save()
+        self.assertTrue(get_token(self.token.key).user.check_password('newpass456'))
+
+    def test_warm_cache_authenticates_without_queries(self):
+        """Test that a cached token authenticates a request without reading tokens or users"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .authentication import CachedTokenAuthentication
+
+        self.token_queries()
+        with self.assertNumQueries(0):
+            user, token = CachedTokenAuthentication().authenticate_credentials(self.token.key)
+            self.assertEqual((user.pk, user.username, user.is_active), (self.user.pk, 'cached', True))
+        self.assertEqual(token.key, self.token.key)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('notifications'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([q for q in queries if 'FROM "blog_user"' in q['sql'] or 'authtoken' in q['sql']])
+
+    def test_queryset_updates_not_cached(self):
+        """Test that only the snapshot is cached, so updates that skip signals are seen"""
+        from django.db.models import F
+        from .authentication import get_token
+
+        self.token_queries()
+        User.objects.filter(pk=self.user.pk).update(followers_count=F('followers_count') + 1)
+        token = get_token(self.token.key)
+        with self.assertNumQueries(1):
+            self.assertEqual((token.user.followers_count, token.user.email), (1, 'cached@example.com'))
+
+    def test_unrelated_user_saves_keep_token_cached(self):
+        """Test that only saves of the snapshot fields or the password drop the cached token"""
+        from django.core.cache import cache
+        from .authentication import cache_key
+
+        self.token_queries()
+        self.user.save(update_fields=['last_login'])
+        self.assertIsNotNone(cache.get(cache_key(self.token.key)))
+        self.user.set_password('newpass456')
+        self.user.save(update_fields=['password'])
+        self.assertIsNone(cache.get(cache_key(self.token.key)))
+
+    def test_stateless_jwt(self):
+        """Test that JWT requests are authenticated without reading users or tokens"""
+        from unittest import mock
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .api import NotificationAPI
+        from .authentication import StatelessJWTAuthentication, UserClaimsTokenSerializer
+
+        access = UserClaimsTokenSerializer.get_token(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        # Views read DEFAULT_AUTHENTICATION_CLASSES at import time
+        with mock.patch.object(NotificationAPI, 'authentication_classes', [StatelessJWTAuthentication]), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('notifications'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([q for q in queries if 'FROM "blog_user"' in q['sql'] or 'authtoken' in q['sql']])
+
+    def test_jwt_user_fields(self):
+        """Test that claims-built users load unclaimed fields in one query and carry is_active"""
+        from rest_framework.exceptions import AuthenticationFailed
+        from .authentication import UserClaimsTokenSerializer, user_from_claims
+
+        access = UserClaimsTokenSerializer.get_token(self.user).access_token
+        with self.assertNumQueries(0):
+            user = user_from_claims(access)
+            self.assertEqual((user.pk, user.username, user.is_active), (self.user.pk, 'cached', True))
+        with self.assertNumQueries(1):
+            self.assertEqual((user.toolkit_tokens, user.followers_count, user.email), (50, 0, 'cached@example.com'))
+
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            user_from_claims(UserClaimsTokenSerializer.get_token(self.user).access_token)
+
+
+class ProfileProvisioningTests(APITestCase):
+    """Test that profiles are created once and not rewritten by User saves"""
+
+    def test_login_leaves_profile_alone(self):
+        """Test the queries a login runs: no Profile reads or writes"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        User.objects.create_user(username='login', email='login@example.com', password='testpass123')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('rest_login'), {
+                'email': 'login@example.com',
+                'password': 'testpass123'
+            })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([q for q in queries if 'blog_profile' in q['sql']])
+        # The login's only user write is last_login
+        user_updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "blog_user"')]
+        self.assertEqual(len(user_updates), 1)
+        self.assertTrue(user_updates[0].startswith('UPDATE "blog_user" SET "last_login" = '))
+        self.assertNotIn(',', user_updates[0].split(' WHERE ')[0])
+
+    def test_profile_created_once(self):
+        """Test that the profile is provisioned on creation and untouched by later saves"""
+        user = User.objects.create_user(username='once', email='once@example.com')
+        self.assertTrue(Profile.objects.filter(user=user).exists())
+        with self.assertNumQueries(1):
+            user.toolkit_tokens = 10
+            user.save(update_fields=['toolkit_tokens'])
+        user.first_name = 'Once'
+        with self.assertNumQueries(1):
+            user.save()
+        self.assertEqual(Profile.objects.filter(user=user).count(), 1)
+
+
+class ChangeTrackingTests(APITestCase):
+    """Test that edits write only the changed columns and skip no-op saves"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='editor', email='editor@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.post = Post.objects.create(title='Title', content='Long content ' * 300, author=self.user)
+        self.comment = Comment.objects.create(post=self.post, user=self.user, content='Original')
+
+    def writes(self, method, url, data, table):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [q['sql'] for q in queries if q['sql'].startswith(f'UPDATE "{table}"')]
+
+    def test_changed_fields(self):
+        """Test change detection on loaded, deferred and refreshed instances"""
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertFalse(post.is_tracking_changes())
+        post.track_changes()
+        self.assertEqual(post.changed_fields(), [])
+        post.title = 'New title'
+        self.assertEqual(post.changed_fields(), ['title'])
+        self.assertEqual(post.save_changes(), ['title'])
+        self.assertEqual(post.save_changes(), [])
+
+        post = Post.objects.only('title').get(pk=self.post.pk).track_changes()
+        post.title = 'Deferred'
+        self.assertEqual(post.changed_fields(), ['title'])
+        post.refresh_from_db(fields=['title'])
+        self.assertEqual(post.changed_fields(), [])
+
+    def test_comment_edit(self):
+        """Test that an unchanged comment is not written and a changed one only writes its content"""
+        url = reverse('comment-detail', kwargs={'pk': self.comment.pk})
+        self.assertEqual(self.writes('patch', url, {'content': 'Original'}, 'blog_comment'), [])
+        updates = self.writes('patch', url, {'content': 'Edited'}, 'blog_comment')
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('"created_at"', updates[0])
+
+    def test_post_edit_writes_title_only(self):
+        """Test that editing the title leaves the long content column alone"""
+        updates = self.writes('patch', reverse('post-edit', kwargs={'post_id': self.post.pk}), {'title': 'Retitled'}, 'blog_post')
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"title"', updates[0])
+        self.assertNotIn('"content"', updates[0])
+        self.assertEqual(self.writes('patch', reverse('post-edit', kwargs={'post_id': self.post.pk}), {'title': 'Retitled'}, 'blog_post'), [])
+
+    def test_profile_edit_invalidates_only_for_card_fields(self):
+        """Test that a brief edit keeps the cached author card and a name edit drops it"""
+        from django.core.cache import cache
+        from . import author_cards
+
+        card_key = author_cards.cache_key(self.user.pk)
+        cache.set(card_key, {'id': self.user.pk})
+        self.assertEqual(len(self.writes('put', reverse('profile-update'), {'brief': 'Hello'}, 'blog_profile')), 1)
+        self.assertIsNotNone(cache.get(card_key))
+        self.assertEqual(self.writes('put', reverse('profile-update'), {'brief': 'Hello'}, 'blog_profile'), [])
+
+        self.writes('put', reverse('profile-update'), {'first_name': 'Ed'}, 'blog_user')
+        self.assertIsNone(cache.get(card_key))
+
+
+class FastJSONRendererTests(TestCase):
+    """Test that the orjson renderer and parser match DRF's stdlib versions"""
+
+    def payload(self):
+        import datetime
+        import decimal
+        import uuid
+        from collections import OrderedDict
+        from django.utils.translation import gettext_lazy
+
+        now = timezone.now().replace(microsecond=123456)
+        return OrderedDict([
+            ('aware', now),
+            ('naive', datetime.datetime(2024, 5, 1, 12, 30, 15, 987654)),
+            ('date', now.date()),
+            ('time', datetime.time(8, 15, 30, 250000)),
+            ('decimal', decimal.Decimal('12.50')),
+            ('lazy', gettext_lazy('Invalid token.')),
+            ('uuid', uuid.UUID('12345678-1234-5678-1234-567812345678')),
+            ('text', 'Ünïcode ✓ line\u2028separators\u2029'),
+            ('nested', [{'key': 'value', 'none': None, 'flag': True}, (1, 2.5)]),
+            ('big', 2 ** 70),
+        ])
+
+    def test_identical_output(self):
+        """Test byte-identical output for the types DRF encodes specially"""
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import FastJSONRenderer
+
+        data = self.payload()
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        del data['big']
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=4'),
+            JSONRenderer().render(data, 'application/json; indent=4')
+        )
+        with self.settings(FAST_JSON=False):
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_same_errors_as_stdlib(self):
+        """Test non-string keys and non-strict NaN render or raise as with DRF"""
+        import datetime
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import FastJSONRenderer
+
+        with self.assertRaises(TypeError):
+            JSONRenderer().render({datetime.date(2024, 5, 1): 'date key'})
+        with self.assertRaises(TypeError):
+            FastJSONRenderer().render({datetime.date(2024, 5, 1): 'date key'})
+
+        # Keys json.dumps accepts, and NaN with STRICT_JSON off
+        data = {1: 'int', 2.5: 'float', True: 'bool', None: 'none', 'a': float('nan')}
+        strict_off = JSONRenderer()
+        strict_off.strict = False
+        fast = FastJSONRenderer()
+        fast.strict = False
+        self.assertEqual(fast.render(data), strict_off.render(data))
+
+    def test_floats_match_stdlib(self):
+        """Test that NaN and Infinity raise like JSONRenderer and exponents are spelled alike"""
+        import decimal
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import FastJSONRenderer
+
+        for value in (float('nan'), float('inf'), float('-inf'), decimal.Decimal('NaN'), decimal.Decimal('-Infinity')):
+            data = {'a': [{'b': None}, {'c': value}]}
+            with self.assertRaises(ValueError):
+                JSONRenderer().render(data)
+            with self.assertRaises(ValueError):
+                FastJSONRenderer().render(data)
+
+        data = {'floats': [0.0, -0.0, 0.1, 1e-4, 1e-5, 1.2345e-5, 1e15, 1e16, -1.5e22, 5e-324], 'decimal': decimal.Decimal('1e20')}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_feed_response_identical(self):
+        """Test a feed page against the stdlib renderer"""
+        from rest_framework.renderers import JSONRenderer
+
+        user = User.objects.create_user(username='reader', email='reader@example.com')
+        post = Post.objects.create(title='Title', content='Content', author=user)
+        Comment.objects.create(post=post, user=user, content='Comment')
+        self.client.force_login(user)
+        response = self.client.get(reverse('post-list'))
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def test_parser(self):
+        """Test parsing and strict rejection of invalid JSON"""
+        from rest_framework.exceptions import ParseError
+        from .renderers import FastJSONParser
+
+        self.assertEqual(FastJSONParser().parse(io.BytesIO('{"a": [1, "ü"]}'.encode())), {'a': [1, 'ü']})
+        for body in (b'{"a": NaN}', b'{"a": '):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(io.BytesIO(body))
+
+
+class SparseFieldsetTests(APITestCase):
+    """Test cases for the ?fields= and ?exclude= query parameters"""
+
+    def setUp(self):
+        from .models import Notification, Share, Save_Post
+
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='testpass123'
+        )
+        self.other = User.objects.create_user(
+            username='writer', email='writer@example.com', password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        for i in range(3):
+            post = Post.objects.create(title=f'Post {i}', content='Content', author=self.user)
+            post.tags.add('news')
+            Comment.objects.create(post=post, user=self.other, content='Nice')
+            Reacts.objects.create(post=post, user=self.other, react='Love')
+            Share.objects.create(post=post, user=self.user)
+            Save_Post.objects.create(post=post, user=self.user)
+        self.post = post
+        self.assertTrue(Notification.objects.filter(user=self.user).exists())
+
+    def tables_queried(self, url):
+        """The response and the SQL of the view, up to the attached notifications"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        sql = ' '.join(query['sql'] for query in queries)
+        return response, sql.rsplit('FROM "blog_notification"', 1)[0]
+
+    def test_post_fields(self):
+        """Test that only the requested post fields are rendered and prefetched"""
+        from .models import Save_Post, Share
+
+        response, sql = self.tables_queried(reverse('post-list') + '?fields=id,title')
+        self.assertEqual([set(post) for post in response.data['results']], [{'id', 'title'}] * 3)
+        for model in (Comment, Reacts, Share, Save_Post):
+            self.assertNotIn(f'FROM "{model._meta.db_table}"', sql)
+        self.assertNotIn('taggit', sql)
+
+    def test_post_exclude(self):
+        """Test that excluded post fields and their prefetches are dropped"""
+        response, sql = self.tables_queried(
+            reverse('post-detail', args=[self.post.id]) + '?exclude=comments,comments_count,tags'
+        )
+        post = response.data['post']
+        self.assertNotIn('comments', post)
+        self.assertNotIn('tags', post)
+        self.assertEqual(post['reactions']['Love'], 1)
+        self.assertTrue(post['is_saved'])
+        self.assertNotIn(f'FROM "{Comment._meta.db_table}"', sql)
+
+    def test_unknown_field(self):
+        """Test that unknown field names are rejected"""
+        response = self.client.get(reverse('post-list') + '?fields=id,nope')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('nope', str(response.data['fields']))
+
+    def test_writes_return_whole_post(self):
+        """Test that a create ignores the sparse fieldset"""
+        response = self.client.post(
+            reverse('post-list') + '?fields=id',
+            {'title': 'New', 'content': 'Content', 'post_type': 'post', 'tags': '["news"]'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertIn('comments', response.data)
+
+    def test_profile_fields(self):
+        """Test that profiles render the selected fields and skip unrequested posts"""
+        url = reverse('profile-detail', args=['reader'])
+        response, sql = self.tables_queried(url + '?fields=username,posts_count')
+        self.assertEqual(response.data['username'], 'reader')
+        self.assertEqual(response.data['posts_count'], 3)
+        self.assertNotIn('posts', response.data)
+        self.assertNotIn('email', response.data)
+        self.assertNotIn(f'FROM "{Comment._meta.db_table}"', sql)
+
+        response, _ = self.tables_queried(url + '?exclude=posts_count')
+        self.assertNotIn('posts_count', response.data)
+        self.assertEqual(len(response.data['posts']), 3)
+
+    def test_profile_posts_prefetched(self):
+        """Test that a profile's posts take the same queries however many there are"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        url = reverse('profile-detail', args=['reader'])
+        self.client.get(url)  # Warm the author card cache
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        for i in range(3):
+            post = Post.objects.create(title=f'More {i}', content='Content', author=self.user)
+            post.tags.add('news')
+        with CaptureQueriesContext(connection) as more_queries:
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['posts']), 6)
+        self.assertEqual(len(more_queries), len(queries))
+
+    def test_notification_fields(self):
+        """Test that lean notification lists skip the sender reaction lookup"""
+        url = reverse('notifications')
+        _, sql = self.tables_queried(url)
+        self.assertIn(f'FROM "{Reacts._meta.db_table}"', sql)
+
+        response, sql = self.tables_queried(url + '?fields=id,message')
+        self.assertTrue(response.data['results'])
+        self.assertEqual({key for item in response.data['results'] for key in item}, {'id', 'message'})
+        self.assertNotIn(f'FROM "{Reacts._meta.db_table}"', sql)
+        self.assertNotIn('JOIN', sql)
+
+    def test_async_matches_sync(self):
+        """Test that the async feed applies the same sparse fieldset"""
+        from asgiref.sync import async_to_sync
+        from django.test import AsyncClient
+
+        token = Token.objects.create(user=self.user)
+        response = async_to_sync(AsyncClient().get)(
+            reverse('async-post-list') + '?fields=id,title,reactions',
+            headers={'Authorization': f'Token {token.key}'}
+        )
+        expected = self.client.get(reverse('post-list') + '?fields=id,title,reactions')
+        self.assertEqual(json.loads(response.content)['results'], json.loads(expected.content)['results'])
+
+        response = async_to_sync(AsyncClient().get)(
+            reverse('async-post-list') + '?exclude=oops',
+            headers={'Authorization': f'Token {token.key}'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class FeedSerializerTests(TestCase):
+    """Test that FeedSerializer renders the same bytes as PostListSerializer"""
+
+    TEXT = ['plain', 'Ünïcode ✓', 'quote " and \\\\ backslash', 'line separator', '<b>&amp;</b>', '🎉', '']
+    TAGS = ['news', 'python', 'ümlaut', 'two words', 'emoji-🎉']
+
+    def random_image(self, rng, folder):
+        choice = rng.randrange(4)
+        if choice == 0:
+            return '', {}
+        name = f'{folder}/{rng.randrange(10 ** 6)}.jpg'
+        if choice == 1:  # Not processed yet
+            return name, {}
+        if choice == 2:  # Processed from an older upload
+            return name, {'source': 'old.jpg', 'status': 'ready', 'full': f'{folder}/full.webp'}
+        variants = {'source': name, 'status': rng.choice(['ready', 'failed'])}
+        for variant in rng.sample(['feed_320', 'feed_640', 'feed_1280', 'avatar_128', 'full'], rng.randrange(4)):
+            variants[variant] = f'{folder}/{variant}-{rng.randrange(100)}.webp'
+        return name, variants
+
+    def populate(self, rng):
+        from .models import Save_Post, Share
+
+        users = []
+        for i in range(rng.randrange(2, 5)):
+            user = User.objects.create_user(
+                username=f'user{len(User.objects.all())}',
+                email=f'u{rng.randrange(10 ** 9)}@example.com',
+                first_name=rng.choice(self.TEXT),
+                last_name=rng.choice(self.TEXT),
+            )
+            profile = user.user_profile
+            profile.profile_image, profile.profile_image_variants = self.random_image(rng, 'profile_images')
+            profile.save()
+            users.append(user)
+        for _ in range(rng.randrange(1, 6)):
+            image, variants = self.random_image(rng, 'posts')
+            post = Post.objects.create(
+                author=rng.choice(users),
+                post_type=rng.choice(['post', 'blog', 'question', 'event']),
+                title=rng.choice(self.TEXT) or 'Title',
+                content=rng.choice(self.TEXT) * rng.randrange(1, 4),
+                image=image,
+                trend=rng.random() < 0.3,
+            )
+            Post.objects.filter(pk=post.pk).update(image_variants=variants)
+            post.tags.add(*rng.sample(self.TAGS, rng.randrange(len(self.TAGS))))
+            for _ in range(rng.randrange(4)):
+                Comment.objects.create(post=post, user=rng.choice(users), content=rng.choice(self.TEXT) or 'Hi')
+            for user in rng.sample(users, rng.randrange(len(users) + 1)):
+                Reacts.objects.create(post=post, user=user, react=rng.choice(['Love', 'Dislike', 'Thunder']))
+            for _ in range(rng.randrange(3)):
+                Share.objects.create(post=post, user=rng.choice(users))
+            for user in rng.sample(users, rng.randrange(len(users) + 1)):
+                Save_Post.objects.create(post=post, user=user)
+        return users
+
+    def test_random_feeds_render_identically(self):
+        """Test random posts, viewers and sparse fieldsets against PostListSerializer"""
+        import random
+        from django.contrib.auth.models import AnonymousUser
+        from django.test import RequestFactory
+        from rest_framework.renderers import JSONRenderer
+        from .api import feed_queryset
+        from .feed import POST_COLUMNS, FeedSerializer, readable_fields
+        from .serializer import PostListSerializer
+
+        fields = list(readable_fields())
+        users = []
+        for seed in range(25):
+            rng = random.Random(seed)
+            users.extend(self.populate(rng))
+            sparse = {}
+            if rng.random() < 0.4:
+                sparse[rng.choice(['fields', 'exclude'])] = rng.sample(fields, rng.randrange(len(fields)))
+            request = RequestFactory().get('/api/posts/', secure=rng.random() < 0.5)
+            request.user = rng.choice(users + [AnonymousUser()])
+            with self.subTest(seed=seed, sparse=sparse):
+                posts = feed_queryset(**sparse).order_by('-created_at', '-id')
+                expected = PostListSerializer(posts, many=True, context={'request': request}, **sparse).data
+                rows = Post.objects.order_by('-created_at', '-id').values(*POST_COLUMNS)
+                actual = FeedSerializer(rows, {'request': request}, **sparse).data
+                self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+
+    def test_query_count(self):
+        """Test that a page costs one query per relation, regardless of its size"""
+        import random
+        from django.test import RequestFactory
+        from .feed import POST_COLUMNS, FeedSerializer
+
+        users = self.populate(random.Random(1))
+        request = RequestFactory().get('/api/posts/')
+        request.user = users[0]
+        rows = list(Post.objects.values(*POST_COLUMNS))
+        with self.assertNumQueries(6):  # Comments, reactions, shares, saves, tags and author cards
+            FeedSerializer(rows, {'request': request}).data
+        with self.assertNumQueries(0):
+            FeedSerializer(rows, {'request': request}, fields=['id', 'title', 'created_at']).data
+
+    def test_fallback(self):
+        """Test that the feed still renders with FAST_FEED off"""
+        user = User.objects.create_user(username='reader', email='reader@example.com')
+        Post.objects.create(title='Title', content='Content', author=user)
+        self.client.force_login(user)
+        fast = self.client.get(reverse('post-list'))
+        with self.settings(FAST_FEED=False):
+            slow = self.client.get(reverse('post-list'))
+        self.assertEqual(fast.content, slow.content)
+
+
+class CompressionTests(TestCase):
+    """Test cases for response compression and precompressed static files"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', email='reader@example.com')
+        for i in range(10):
+            post = Post.objects.create(title=f'Post {i}', content='Some content to compress ' * 10, author=self.user)
+            Comment.objects.create(post=post, user=self.user, content='A comment')
+        self.client.force_login(self.user)
+
+    def test_negotiation(self):
+        """Test that Accept-Encoding quality values pick the encoding"""
+        from .compression import choose_encoding
+
+        encodings = ('br', 'gzip')
+        self.assertEqual(choose_encoding('gzip, deflate', encodings), 'gzip')
+        self.assertEqual(choose_encoding('gzip, deflate, br', encodings), 'br')
+        self.assertEqual(choose_encoding('br;q=0.5, gzip;q=0.8', encodings), 'gzip')
+        self.assertEqual(choose_encoding('*', encodings), 'br')
+        self.assertEqual(choose_encoding('*;q=0.1, br;q=0', encodings), 'gzip')
+        self.assertEqual(choose_encoding('gzip', ('br',)), None)
+        for header in ('', None, 'identity', 'gzip;q=0'):
+            self.assertIsNone(choose_encoding(header, encodings))
+
+    def test_api_response_gzipped(self):
+        """Test that large API responses are gzipped for clients that accept it"""
+        import gzip
+
+        plain = self.client.get(reverse('post-list'))
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        with mock.patch('blog.compression.brotli', None):
+            response = self.client.get(reverse('post-list'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertLess(len(response.content) * 5, len(plain.content))
+
+    @skipUnless(importlib.util.find_spec('brotli'), 'brotli is not installed')
+    def test_api_response_brotli(self):
+        """Test that Brotli is preferred when both are accepted"""
+        import brotli
+
+        plain = self.client.get(reverse('post-list'))
+        response = self.client.get(reverse('post-list'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+
+    def test_small_and_html_responses_unchanged(self):
+        """Test that responses below the threshold and HTML pages are not compressed"""
+        with self.settings(COMPRESSION_MIN_SIZE=10 ** 7):
+            response = self.client.get(reverse('post-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.client.get('/admin/login/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_collectstatic_precompresses(self):
+        """Test that collectstatic writes hashed, precompressed copies served with long caching"""
+        import gzip
+        import os
+        from django.contrib.staticfiles.storage import staticfiles_storage
+        from django.core.management import call_command
+        from django.http import Http404
+        from django.test import RequestFactory
+        from .serving import serve_static
+
+        with tempfile.TemporaryDirectory() as static_root, self.settings(
+            STATIC_ROOT=static_root,
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+        ), mock.patch('blog.compression.brotli', None):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            css = staticfiles_storage.stored_name('css/cymate-admin.css')
+            self.assertRegex(css, r'^css/cymate-admin\.[0-9a-f]{12}\.css$')
+            with open(os.path.join(static_root, css), 'rb') as original, \
+                    open(os.path.join(static_root, css + '.gz'), 'rb') as compressed:
+                self.assertEqual(gzip.decompress(compressed.read()), original.read())
+            # Already compressed formats are left alone
+            logo = staticfiles_storage.stored_name('images/Shield Security Illustration Logo Design.jpg')
+            self.assertTrue(os.path.exists(os.path.join(static_root, logo)))
+            self.assertFalse(os.path.exists(os.path.join(static_root, logo + '.gz')))
+
+            request = RequestFactory().get('/static/' + css, HTTP_ACCEPT_ENCODING='gzip')
+            response = serve_static(request, css)
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Content-Type'], 'text/css')
+            self.assertIn('immutable', response['Cache-Control'])
+            self.assertIn('max-age=31536000', response['Cache-Control'])
+            self.assertIn('Accept-Encoding', response['Vary'])
+            response.close()
+
+            response = serve_static(RequestFactory().get('/static/css/cymate-admin.css'), 'css/cymate-admin.css')
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertNotIn('immutable', response['Cache-Control'])
+            response.close()
+
+            with self.assertRaises(Http404):
+                serve_static(RequestFactory().get('/static/../manage.py'), '../manage.py')
+
+
+class MediaServingTests(TestCase):
+    """Test cases for serving uploads from MEDIA_ROOT"""
+
+    def setUp(self):
+        import hashlib
+        import os
+
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = self.settings(MEDIA_ROOT=media_root.name, MEDIA_SERVING='django')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.content = bytes(range(256)) * 4
+        self.digest = hashlib.sha256(self.content).hexdigest()
+        self.name = f'posts/{self.digest[:2]}/{self.digest}.jpg'
+        for name in (self.name, 'legacy/photo.jpg'):
+            os.makedirs(os.path.join(media_root.name, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(media_root.name, name), 'wb') as f:
+                f.write(self.content)
+        self.media_root = media_root.name
+
+    def get(self, name, **headers):
+        response = self.client.get('/media/' + name, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_whole_file(self):
+        """Test that a content-addressed file is sent with a strong ETag and immutable caching"""
+        response, body = self.get(self.name)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['ETag'], f'"{self.digest}"')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+        response, _ = self.get('legacy/photo.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=86400', response['Cache-Control'])
+
+    def test_conditional_requests(self):
+        """Test that a matching ETag or unchanged Last-Modified returns 304"""
+        response, _ = self.get(self.name)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        response, body = self.get(self.name, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(body, b'')
+        response, _ = self.get('legacy/photo.jpg', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_ranges(self):
+        """Test single byte ranges, suffix ranges, If-Range and unsatisfiable ranges"""
+        size = len(self.content)
+        cases = {
+            'bytes=2-5': (2, 5),
+            'bytes=1000-': (1000, size - 1),
+            'bytes=-10': (size - 10, size - 1),
+            'bytes=1020-5000': (1020, size - 1),
+        }
+        for header, (start, end) in cases.items():
+            with self.subTest(header=header):
+                response, body = self.get(self.name, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(body, self.content[start:end + 1])
+                self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{size}')
+                self.assertEqual(int(response['Content-Length']), end - start + 1)
+
+        response, _ = self.get(self.name, HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
+
+        for headers in ({'HTTP_RANGE': 'bytes=0-1,4-5'}, {'HTTP_RANGE': 'bytes=0-1', 'HTTP_IF_RANGE': '"stale"'}):
+            response, body = self.get(self.name, **headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(body, self.content)
+
+    def test_proxy_handoff(self):
+        """Test that proxy modes send headers instead of the file"""
+        import os
+
+        with self.settings(MEDIA_SERVING='x-accel-redirect'):
+            response, body = self.get(self.name)
+        self.assertEqual(body, b'')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.name)
+        self.assertIn('immutable', response['Cache-Control'])
+
+        with self.settings(MEDIA_SERVING='x-sendfile'):
+            response, body = self.get('legacy/photo.jpg')
+        self.assertEqual(body, b'')
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, 'legacy/photo.jpg'))
+
+    def test_missing_and_outside_files(self):
+        """Test that missing files and paths outside MEDIA_ROOT are not found"""
+        for name in ('posts/missing.jpg', '../manage.py', 'posts'):
+            response, _ = self.get(name)
+            self.assertEqual(response.status_code, 404)
+
+
+class QueryPlanTests(TestCase):
+    """Test the hot query indexes and the explain_queries command"""
+
+    def test_full_scan_detection(self):
+        """Test that only unindexed scans are reported, under their table names"""
+        from blog.management.commands.explain_queries import full_scans
+
+        sql = 'SELECT "T3"."id" FROM "blog_post" INNER JOIN "blog_user" T3 ON ("blog_post"."author_id" = T3."id")'
+        plan = [
+            'SCAN blog_post USING INDEX blog_post_created_idx',
+            'SEARCH blog_comment USING INDEX blog_comment_post_created_idx (post_id=?)',
+            'SCAN T3',
+        ]
+        self.assertEqual(full_scans(sql, plan, 'sqlite'), ['blog_user'])
+        plan = [
+            'Limit  (cost=0.28..1.32 rows=20 width=8)',
+            '  ->  Index Scan using blog_post_created_idx on blog_post  (cost=0.28..52.28 rows=1000 width=8)',
+            '  ->  Seq Scan on blog_user  (cost=0.00..22.00 rows=1000 width=8)',
+        ]
+        self.assertEqual(full_scans(sql, plan, 'postgresql'), ['blog_user'])
+
+    def test_no_full_scans(self):
+        """Test that the seeded endpoints use indexes and nothing seeded is kept"""
+        from io import StringIO
+        from django.core.management import call_command
+        from blog.models import Post
+
+        out = StringIO()
+        call_command('explain_queries', '--posts', '200', '--users', '300', '--min-rows', '150', stdout=out)
+        self.assertIn('No full table scans', out.getvalue())
+        self.assertIn('User by email', out.getvalue())
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(User.objects.filter(username__startswith='explain_').exists())
+
+
+class ReplicaRoutingTests(APITestCase):
+    """Test read replica routing and pinning writers to the primary"""
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', email='reader@example.com', password='testpass123')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='testpass123')
+        self.post = Post.objects.create(author=self.other, title='Replicated', content='Content')
+        self.client.force_authenticate(self.user)
+
+    def test_router(self):
+        """Test that only reads of annotated views before any write go to the replica"""
+        from django.test import RequestFactory
+        from blog.db_routing import ReplicaRouter, pin_to_primary, replica_reads
+
+        router = ReplicaRouter()
+
+        class View:
+            @replica_reads
+            def get(self, request):
+                reads = [router.db_for_read(Post)]
+                self.written_to = router.db_for_write(Post)
+                reads.append(router.db_for_read(Post))
+                return reads
+
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with mock.patch('blog.db_routing.replica_alias', return_value='replica'):
+            self.assertIsNone(router.db_for_read(Post))
+            view = View()
+            self.assertEqual(view.get(request), ['replica', None])
+            self.assertEqual(view.written_to, 'default')
+            pin_to_primary(self.user)
+            self.assertEqual(View().get(request), ['default', None])
+            self.assertIsNone(router.db_for_read(Post))
+
+        self.assertEqual(View().get(request), ['default', None])
+
+    def test_author_cards_read_from_primary(self):
+        """Test that cards, which are cached, are not read from the replica"""
+        from django.test import RequestFactory
+        from blog.author_cards import card_rows
+        from blog.db_routing import replica_reads
+
+        class View:
+            @replica_reads
+            def get(self, request):
+                return Post.objects.all().db, card_rows([1]).db
+
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with mock.patch('blog.db_routing.replica_alias', return_value='replica'):
+            self.assertEqual(View().get(request), ('replica', 'default'))
+
+    def test_writes_pin_the_writer(self):
+        """Test that a write pins its author, and only its author, to the primary"""
+        from blog.db_routing import is_pinned
+
+        with mock.patch('blog.db_routing.replica_alias', return_value='replica'):
+            response = self.client.get(reverse('post-detail', kwargs={'pk': self.post.pk}))
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(is_pinned(self.user))
+
+            response = self.client.post(
+                reverse('post-comment', kwargs={'pk': self.post.pk}), {'content': 'Mine'}, format='json'
+            )
+            self.assertEqual(response.status_code, 201)
+            self.assertTrue(is_pinned(self.user))
+            self.assertFalse(is_pinned(self.other))
+
+            # Pinned, so the feed is read from default and shows the comment
+            response = self.client.get(reverse('post-list'))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['results'][0]['comments_count'], 1)
+
+    def test_annotated_views(self):
+        """Test that the list views choose a read database and the others don't"""
+        urls = [
+            reverse('post-list'),
+            reverse('saved-posts'),
+            reverse('profile-detail', kwargs={'username': self.other.username}),
+            reverse('notifications'),
+        ]
+        for url in urls:
+            with self.subTest(url=url), mock.patch('blog.db_routing.read_database_for', return_value='default') as choose:
+                self.assertEqual(self.client.get(url).status_code, 200)
+                choose.assert_called_once()
+        with mock.patch('blog.db_routing.read_database_for', return_value='default') as choose:
+            self.client.get(reverse('post-detail', kwargs={'pk': self.post.pk}))
+        choose.assert_not_called()
@@ -0,0 +1,133 @@
+"""
+Follow graph and home timelines.
+
+A post is copied into the ``TimelineEntry`` table of each follower of its
+author when it is published (fan-out on write), so reading a timeline is a
+range scan over one user's entries. Authors with more than
+``TIMELINE_FANOUT_LIMIT`` followers are skipped on write; their posts are
+merged into the timelines of their followers when read (fan-out on read).
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+
+from .models import Follow, Post, TimelineEntry, User
+
+
+def fanout_limit():
+    return getattr(settings, 'TIMELINE_FANOUT_LIMIT', 5000)
+
+
+def backfill_size():
+    return getattr(settings, 'TIMELINE_BACKFILL_SIZE', 50)
+
+
+def fanout_batch_size():
+    return getattr(settings, 'TIMELINE_FANOUT_BATCH_SIZE', 1000)
+
+
+def is_fanned_out_on_read(user_id):
+    """Whether posts of a user are merged into timelines at read time"""
+    return User.objects.filter(pk=user_id, followers_count__gt=fanout_limit()).exists()
+
+
+def fan_out_post(post):
+    """
+    Add a new post to its author's timeline and, for ordinary authors, to
+    the timelines of all their followers.
+
+    Returns:
+        int: Number of timeline entries written
+    """
+    user_ids = [post.author_id]
+    if not is_fanned_out_on_read(post.author_id):
+        user_ids += list(
+            Follow.objects.filter(followee_id=post.author_id).values_list('follower_id', flat=True)
+        )
+
+    written = 0
+    batch_size = fanout_batch_size()
+    for start in range(0, len(user_ids), batch_size):
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(user_id=user_id, post=post, created_at=post.created_at)
+                for user_id in user_ids[start:start + batch_size]
+            ],
+            ignore_conflicts=True
+        )
+        written += len(user_ids[start:start + batch_size])
+    return written
+
+
+def follow(follower, followee):
+    """
+    Start following a user and backfill their recent posts.
+
+    Returns:
+        bool: False if ``follower`` already followed ``followee``
+    """
+    try:
+        with transaction.atomic():
+            Follow.objects.create(follower=follower, followee=followee)
+    except IntegrityError:
+        return False
+    User.objects.filter(pk=followee.pk).update(followers_count=F('followers_count') + 1)
+
+    if not is_fanned_out_on_read(followee.pk):
+        recent = Post.objects.filter(author=followee)\
+            .order_by('-created_at')\
+            .values_list('id', 'created_at')[:backfill_size()]
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user=follower, post_id=post_id, created_at=created_at) for post_id, created_at in recent],
+            ignore_conflicts=True
+        )
+    return True
+
+
+def unfollow(follower, followee):
+    """
+    Stop following a user and drop their posts from the follower's timeline.
+
+    Returns:
+        bool: False if ``follower`` did not follow ``followee``
+    """
+    deleted, _ = Follow.objects.filter(follower=follower, followee=followee).delete()
+    if not deleted:
+        return False
+    User.objects.filter(pk=followee.pk, followers_count__gt=0).update(
+        followers_count=F('followers_count') - 1
+    )
+    TimelineEntry.objects.filter(user=follower, post__author=followee).delete()
+    return True
+
+
+def timeline_page(user, before=None, limit=20):
+    """
+    Positions of the newest timeline posts of ``user``.
+
+    Args:
+        before (tuple): (created_at, post_id) to continue after, or None
+        limit (int): Maximum number of positions returned
+
+    Returns:
+        list: (created_at, post_id) tuples, newest first
+    """
+    sources = [(TimelineEntry.objects.filter(user=user), 'post_id')]
+    pulled = list(
+        Follow.objects.filter(follower=user, followee__followers_count__gt=fanout_limit())
+        .values_list('followee_id', flat=True)
+    )
+    if pulled:
+        sources.append((Post.objects.filter(author_id__in=pulled), 'id'))
+
+    positions = set()
+    for queryset, id_field in sources:
+        if before is not None:
+            created_at, post_id = before
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, **{f'{id_field}__lt': post_id})
+            )
+        positions.update(
+            queryset.order_by('-created_at', f'-{id_field}').values_list('created_at', id_field)[:limit]
+        )
+    return sorted(positions, reverse=True)[:limit]
@@ -0,0 +1,232 @@
+"""
+Streaming and resumable upload handling for images.
+
+``StreamingImageUploadHandler`` validates multipart image uploads while they
+are being received: the declared request size and content type are checked
+before any file data is read, the real type is sniffed from the magic number
+in the first bytes, and the size is enforced chunk by chunk. Rejected uploads
+stop parsing immediately instead of buffering the whole body in the worker.
+
+Large images can also be sent as a resumable chunked upload, see
+``UploadSession`` and ``write_chunk``.
+"""
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+
+# Magic numbers of the accepted image formats
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+SIGNATURE_LENGTH = 12
+
+ALLOWED_IMAGE_TYPES = ['image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp']
+
+# Allowance for the non-file parts of a multipart body
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def post_image_max_size():
+    return getattr(settings, 'POST_IMAGE_MAX_SIZE', 10 * 1024 * 1024)
+
+
+def profile_image_max_size():
+    return getattr(settings, 'PROFILE_IMAGE_MAX_SIZE', 5 * 1024 * 1024)
+
+
+def detect_image_type(header):
+    """
+    Identify an image from its first bytes.
+
+    Returns:
+        str: MIME type, or None if the bytes are not a supported image
+    """
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def sniff_file(file):
+    """Detect the image type of an already received file without moving its position"""
+    position = file.tell() if hasattr(file, 'tell') else 0
+    file.seek(0)
+    header = file.read(SIGNATURE_LENGTH)
+    file.seek(position)
+    return detect_image_type(header)
+
+
+def format_size(size):
+    return f"{size // (1024 * 1024)}MB"
+
+
+class UploadRejected(Exception):
+    """An upload failed validation; ``field`` names the offending form field"""
+
+    def __init__(self, field, message):
+        self.field = field
+        self.message = message
+        super().__init__(message)
+
+
+class StreamingImageUploadHandler(FileUploadHandler):
+    """
+    Upload handler that validates images as they stream in and writes them
+    to a temporary file chunk by chunk.
+
+    Args:
+        request: The request being parsed
+        limits (dict): field name -> maximum size in bytes; files in other
+            fields are limited to ``default_limit``
+        default_limit (int): Size limit for fields not listed in ``limits``
+    """
+
+    def __init__(self, request=None, limits=None, default_limit=None):
+        super().__init__(request)
+        self.limits = limits or {}
+        self.default_limit = default_limit or max(self.limits.values(), default=post_image_max_size())
+        self.error = None
+        self.file = None
+        self.header = b''
+
+    def reject(self, field, message):
+        """Record the error, drop the partial file and stop reading the body"""
+        self.error = UploadRejected(field, message)
+        self.discard()
+        raise StopUpload(connection_reset=True)
+
+    def discard(self):
+        if self.file is not None:
+            temp_location = self.file.temporary_file_path()
+            try:
+                self.file.close()
+                os.remove(temp_location)
+            except FileNotFoundError:
+                pass
+            self.file = None
+
+    def limit_for(self, field_name):
+        return self.limits.get(field_name, self.default_limit)
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Reject oversized requests before reading a single byte of the body.
+        # The parser does not catch StopUpload here, so return an empty result
+        # instead; the view reports the recorded error.
+        largest = max([self.default_limit, *self.limits.values()])
+        if content_length and content_length > largest + MULTIPART_OVERHEAD:
+            self.error = UploadRejected(
+                None, f"Upload size cannot exceed {format_size(largest)}."
+            )
+            return QueryDict(encoding=encoding or settings.DEFAULT_CHARSET), MultiValueDict()
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None,
+                 content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        if content_type not in ALLOWED_IMAGE_TYPES:
+            self.reject(field_name, "Only JPEG, PNG, GIF and WebP image formats are allowed.")
+        if content_length and content_length > self.limit_for(field_name):
+            self.reject(field_name, f"Image size cannot exceed {format_size(self.limit_for(field_name))}.")
+        self.header = b''
+        self.file = TemporaryUploadedFile(
+            self.file_name, self.content_type, 0, self.charset, self.content_type_extra
+        )
+
+    def receive_data_chunk(self, raw_data, start):
+        if len(self.header) < SIGNATURE_LENGTH:
+            self.header += raw_data[:SIGNATURE_LENGTH - len(self.header)]
+            if len(self.header) >= SIGNATURE_LENGTH and detect_image_type(self.header) is None:
+                self.reject(self.field_name, "Uploaded file is not a valid image.")
+        if start + len(raw_data) > self.limit_for(self.field_name):
+            self.reject(
+                self.field_name,
+                f"Image size cannot exceed {format_size(self.limit_for(self.field_name))}."
+            )
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if detect_image_type(self.header) is None:
+            self.reject(self.field_name, "Uploaded file is not a valid image.")
+        file, self.file = self.file, None
+        file.seek(0)
+        file.size = file_size
+        return file
+
+    def upload_interrupted(self):
+        self.discard()
+
+
+# Resumable chunked uploads
+
+def chunk_max_size():
+    return getattr(settings, 'CHUNKED_UPLOAD_MAX_CHUNK_SIZE', 5 * 1024 * 1024)
+
+
+def chunk_directory():
+    return str(getattr(settings, 'CHUNKED_UPLOAD_DIR', os.path.join(settings.BASE_DIR, 'upload_chunks')))
+
+
+def parse_content_range(header):
+    """
+    Parse a ``Content-Range: bytes start-end/total`` header.
+
+    Returns:
+        tuple: (start, end, total) with ``end`` inclusive, or None if malformed
+    """
+    try:
+        unit, _, spec = header.strip().partition(' ')
+        byte_range, _, total = spec.partition('/')
+        start, _, end = byte_range.partition('-')
+        if unit != 'bytes':
+            return None
+        start, end, total = int(start), int(end), int(total)
+    except (AttributeError, ValueError):
+        return None
+    if start < 0 or end < start or end >= total:
+        return None
+    return start, end, total
+
+
+def write_chunk(session, stream, length, read_size=64 * 1024):
+    """
+    Append ``length`` bytes from ``stream`` to the session's partial file.
+
+    The body is copied in small blocks so the chunk never sits in memory as a
+    whole; the first bytes of the upload are checked against the image magic
+    numbers before anything is written.
+
+    Raises:
+        UploadRejected: if the data is not an image or the stream ends early
+    """
+    path = session.part_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    remaining = length
+    written = 0
+    with open(path, 'ab') as part:
+        part.seek(session.offset)
+        part.truncate()
+        while remaining > 0:
+            block = stream.read(min(read_size, remaining))
+            if not block:
+                break
+            if session.offset == 0 and written == 0:
+                header = block[:SIGNATURE_LENGTH]
+                if detect_image_type(header) is None:
+                    raise UploadRejected('upload', "Uploaded file is not a valid image.")
+            part.write(block)
+            written += len(block)
+            remaining -= len(block)
+    if remaining:
+        # Keep only complete chunks so the client can resume from the last offset
+        with open(path, 'ab') as part:
+            part.truncate(session.offset)
+        raise UploadRejected('upload', "Chunk ended before Content-Range was satisfied.")
+    return written
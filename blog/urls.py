@@ -4,15 +4,22 @@ from .api import (
     PostInteractionViewSet,
     PostDetailApi,
     PostSavedListApi,
+    HomeTimelineApi,
+    FollowApi,
     ProfileListApi,
     NotificationAPI,
+    NotificationInboxApi,
     CreateProfileApi,
     EditProfileApi,
     PostEditApi,
     CommentViewSet,
-    ModifyToolkitTokensView
+    ModifyToolkitTokensView,
+    ChunkedUploadApi,
+    ChunkedUploadDetailApi
 )
 from .views_fix import edit_profile, create_profile
+from .realtime import notification_stream
+from . import async_views
 from .enhanced_registration_views import (
     EnhancedRegistrationView,
     PreRegistrationEmailVerificationView
@@ -30,14 +37,22 @@ urlpatterns = [
         'post': 'comment'
     }), name='post-comment'),
     path('posts/saved/', PostSavedListApi.as_view({'get': 'list'}), name='saved-posts'),
+    path('posts/following/', HomeTimelineApi.as_view(), name='home-timeline'),
     path('posts/<int:post_id>/edit/', PostEditApi.as_view(), name='post-edit'),
 
+    # Resumable chunked uploads (post images)
+    path('uploads/', ChunkedUploadApi.as_view(), name='upload-create'),
+    path('uploads/<uuid:upload_id>/', ChunkedUploadDetailApi.as_view(), name='upload-detail'),
+
     # Comment related endpoints
     path('comments/<int:pk>/', CommentViewSet.as_view({
         'patch': 'partial_update',
         'delete': 'destroy'
     }), name='comment-detail'),
 
+    # Follow graph
+    path('users/<str:username>/follow/', FollowApi.as_view(), name='user-follow'),
+
     # Profile related endpoints
     path('profile/<str:username>/', ProfileListApi.as_view(), name='profile-detail'),
     path('profile/create/', CreateProfileApi.as_view(), name='profile-create'),
@@ -47,9 +62,18 @@ urlpatterns = [
 
     # Notification endpoints
     path('notifications/', NotificationAPI.as_view({'get': 'list'}), name='notifications'),
+    path('notifications/stream/', notification_stream, name='notification-stream'),
+    path('notifications/inbox/', NotificationInboxApi.as_view(), name='notification-inbox'),
+    path('notifications/mark-read/', NotificationAPI.as_view({'post': 'mark_many_read'}), name='mark-notifications-read'),
     path('notifications/<int:pk>/mark-read/', NotificationAPI.as_view({'post': 'mark_read'}), name='mark-notification-read'),
     path('notifications/mark-all-read/', NotificationAPI.as_view({'post': 'mark_all_read'}), name='mark-all-notifications-read'),
     
+    # Async versions of the read endpoints, for the ASGI server
+    path('async/posts/', async_views.post_list, name='async-post-list'),
+    path('async/posts/<int:pk>/', async_views.post_detail, name='async-post-detail'),
+    path('async/profile/<str:username>/', async_views.profile_detail, name='async-profile-detail'),
+    path('async/notifications/', async_views.notification_list, name='async-notifications'),
+    
     # Enhanced registration endpoints
     path('auth/enhanced-registration/', EnhancedRegistrationView.as_view(), name='enhanced-registration'),
     path('auth/pre-registration-verify/', PreRegistrationEmailVerificationView.as_view(), name='pre-registration-verify'),
@@ -0,0 +1,207 @@
+"""
+Storage for email verification codes.
+
+``DatabaseCodeStore`` keeps every code as an ``EmailVerification`` row, which
+costs a delete and an insert per request, an update per verification and a
+periodic sweep by ``cleanup_verification_codes``. ``CacheCodeStore`` keeps
+the code of each (email, type) pair as one cache entry that expires with
+the code; with ``audit`` enabled it still records the codes in the database.
+
+The store is selected with the ``EMAIL_VERIFICATION_CODE_STORE`` setting.
+Both return ``EmailVerification`` instances (unsaved ones from the cache), so
+callers can read ``code``, ``created_at`` and ``expires_at`` either way.
+"""
+import hashlib
+import threading
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import EmailVerification
+
+INVALID = 'invalid'
+EXPIRED = 'expired'
+VERIFIED = 'verified'
+
+
+class DatabaseCodeStore:
+    """Codes as ``EmailVerification`` rows"""
+
+    def issue(self, email, verification_type, code, expires_at, user=None):
+        """
+        Replace any unused code for the email and type.
+
+        Returns:
+            EmailVerification: The new code
+        """
+        EmailVerification.objects.filter(
+            email=email,
+            verification_type=verification_type,
+            is_used=False
+        ).delete()
+        return EmailVerification.objects.create(
+            email=email,
+            code=code,
+            verification_type=verification_type,
+            user=user,
+            expires_at=expires_at
+        )
+
+    def consume(self, email, code, verification_type):
+        """
+        Mark a matching code as used; only one caller can consume it.
+
+        Returns:
+            tuple: (status: INVALID, EXPIRED or VERIFIED, verification: EmailVerification or None)
+        """
+        verification = EmailVerification.objects.filter(
+            email=email,
+            code=code,
+            verification_type=verification_type,
+            is_used=False
+        ).first()
+        if not verification:
+            return INVALID, None
+        if verification.is_expired():
+            return EXPIRED, None
+        claimed = EmailVerification.objects.filter(pk=verification.pk, is_used=False).update(is_used=True)
+        if not claimed:
+            return INVALID, None
+        verification.is_used = True
+        return VERIFIED, verification
+
+    def active(self, email, verification_type):
+        """The unused, unexpired code for the email and type, if any"""
+        return EmailVerification.objects.filter(
+            email=email,
+            verification_type=verification_type,
+            is_used=False,
+            expires_at__gt=timezone.now()
+        ).first()
+
+    def discard(self, email, verification_type):
+        EmailVerification.objects.filter(email=email, verification_type=verification_type).delete()
+
+
+class CacheCodeStore:
+    """
+    Codes as cache entries that expire together with the code.
+
+    A code is consumed by ``cache.add`` of a marker key, which succeeds for
+    exactly one caller on the shared cache backends (Redis, Memcached,
+    database and local memory), before the entry is deleted.
+    """
+
+    def __init__(self, cache='default', audit=False):
+        self.cache_alias = cache
+        self.audit = audit
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    @staticmethod
+    def key(email, verification_type):
+        digest = hashlib.sha256(email.strip().lower().encode()).hexdigest()
+        return f'verification_code:v1:{verification_type}:{digest}'
+
+    def issue(self, email, verification_type, code, expires_at, user=None):
+        now = timezone.now()
+        entry = {
+            'code': code,
+            'user_id': user.pk if user else None,
+            'created_at': now.isoformat(),
+            'expires_at': expires_at.isoformat(),
+        }
+        self.cache.set(self.key(email, verification_type), entry, timeout=self.ttl(expires_at))
+        if self.audit:
+            return DatabaseCodeStore().issue(email, verification_type, code, expires_at, user)
+        return self.to_verification(email, verification_type, entry)
+
+    def consume(self, email, code, verification_type):
+        key = self.key(email, verification_type)
+        entry = self.cache.get(key)
+        if not entry or entry['code'] != code:
+            return INVALID, None
+        verification = self.to_verification(email, verification_type, entry)
+        if verification.is_expired():
+            return EXPIRED, None
+        # Only the first caller adds the marker; everyone else sees the code as used
+        if not self.cache.add(f'{key}:used:{code}:{entry["created_at"]}', True, timeout=self.ttl(verification.expires_at)):
+            return INVALID, None
+        self.cache.delete(key)
+        verification.is_used = True
+        if self.audit:
+            EmailVerification.objects.filter(
+                email=email,
+                code=code,
+                verification_type=verification_type,
+                is_used=False
+            ).update(is_used=True)
+        return VERIFIED, verification
+
+    def active(self, email, verification_type):
+        entry = self.cache.get(self.key(email, verification_type))
+        if not entry:
+            return None
+        verification = self.to_verification(email, verification_type, entry)
+        return None if verification.is_expired() else verification
+
+    def discard(self, email, verification_type):
+        self.cache.delete(self.key(email, verification_type))
+        if self.audit:
+            DatabaseCodeStore().discard(email, verification_type)
+
+    @staticmethod
+    def ttl(expires_at):
+        return max(1, int((expires_at - timezone.now()).total_seconds()) + 1)
+
+    @staticmethod
+    def to_verification(email, verification_type, entry):
+        return EmailVerification(
+            email=email,
+            code=entry['code'],
+            verification_type=verification_type,
+            user_id=entry['user_id'],
+            created_at=datetime.fromisoformat(entry['created_at']),
+            expires_at=datetime.fromisoformat(entry['expires_at']),
+        )
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_code_store():
+    """The configured code store, created on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = getattr(settings, 'EMAIL_VERIFICATION_CODE_STORE', {})
+                backend = import_string(config.get('BACKEND', 'blog.verification_codes.DatabaseCodeStore'))
+                _store = backend(**config.get('OPTIONS', {}))
+    return _store
+
+
+def reset_code_store():
+    """Forget the store so the next use picks up changed settings"""
+    global _store
+    _store = None
+
+
+@receiver(setting_changed)
+def reset_on_setting_change(setting, **kwargs):
+    if setting == 'EMAIL_VERIFICATION_CODE_STORE':
+        reset_code_store()
+
+
+def uses_database():
+    """Whether codes (or their audit records) end up in the database"""
+    store = get_code_store()
+    return isinstance(store, DatabaseCodeStore) or getattr(store, 'audit', False)
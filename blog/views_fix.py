@@ -1,18 +1,17 @@
 from rest_framework.decorators import api_view, permission_classes, authentication_classes, parser_classes
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.authentication import TokenAuthentication
+from .authentication import CachedTokenAuthentication, StatelessJWTAuthentication
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser
+from .renderers import FastJSONParser
 from .models import Profile
 from .serializer import ProfileSerializer
 
-print("views_fix.py is being imported!")
-
 @api_view(['POST'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication, StatelessJWTAuthentication])
 @permission_classes([IsAuthenticated])
-@parser_classes([JSONParser, MultiPartParser, FormParser])
+@parser_classes([FastJSONParser, MultiPartParser, FormParser])
 def create_profile(request):
     """Create a new profile for the currently logged-in user"""
     try:
@@ -58,9 +57,9 @@ def create_profile(request):
         )
 
 @api_view(['POST', 'PUT', 'PATCH'])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([CachedTokenAuthentication, StatelessJWTAuthentication])
 @permission_classes([IsAuthenticated])
-@parser_classes([JSONParser, MultiPartParser, FormParser])
+@parser_classes([FastJSONParser, MultiPartParser, FormParser])
 def edit_profile(request):
     """Update the profile of the currently logged-in user"""
     try:
@@ -72,6 +71,8 @@ def edit_profile(request):
             )
 
         profile = request.user.user_profile
+        request.user.track_changes()
+        profile.track_changes()
 
         # Update user fields (first_name, last_name)
         user_updated = False
@@ -83,19 +84,12 @@ def edit_profile(request):
             user_updated = True
         
         if user_updated:
-            request.user.save()
+            request.user.save_changes()
 
         # Update profile data
-        if 'job_title' in request.data:
-            profile.job_title = request.data['job_title']
-        if 'job_status' in request.data:
-            profile.job_status = request.data['job_status']
-        if 'brief' in request.data:
-            profile.brief = request.data['brief']
-        if 'years_of_experience' in request.data:
-            profile.years_of_experience = request.data['years_of_experience']
-        if 'phone_number' in request.data:
-            profile.phone_number = request.data['phone_number']
+        for field in ('job_title', 'job_status', 'brief', 'years_of_experience', 'phone_number'):
+            if field in request.data:
+                setattr(profile, field, request.data[field])
 
         # Handle profile image update (supporting both profile_image and profile_picture field names)
         profile_image_key = None
@@ -105,13 +99,13 @@ def edit_profile(request):
             profile_image_key = 'profile_picture'
         
         if profile_image_key:
-            # Delete old image if it exists
+            # Release the old image; unreferenced files are removed by cleanup_orphaned_media
             if profile.profile_image:
-                profile.profile_image.delete()
+                profile.profile_image.delete(save=False)
             profile.profile_image = request.FILES[profile_image_key]
 
-        # Save the updated profile
-        profile.save()
+        # Save only the fields that changed
+        profile.save_changes()
 
         # Return the updated profile data
         serializer = ProfileSerializer(profile)
@@ -3,6 +3,9 @@ ASGI config for project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Long-lived endpoints such as the notification stream (``/api/notifications/stream/``)
+need this entry point, e.g. ``uvicorn project.asgi:application``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -64,15 +64,36 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 # Rest Framework settings
+# API authentication: 'token' uses DRF tokens cached for AUTH_TOKEN_CACHE_TIMEOUT
+# seconds (see blog/authentication.py), 'jwt' issues SimpleJWT access tokens
+# that are checked without a database lookup
+API_AUTH = os.getenv('API_AUTH', 'token')
+AUTH_TOKEN_CACHE_TIMEOUT = 60
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'blog.authentication.StatelessJWTAuthentication' if API_AUTH == 'jwt'
+        else 'blog.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed JSON with the same output; falls back to the stdlib when
+    # orjson is missing or FAST_JSON is off (see blog/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'blog.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'blog.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
+FAST_JSON = os.getenv('FAST_JSON', 'true').lower() == 'true'
+# Serve feed pages with blog.feed.FeedSerializer (same output as PostListSerializer)
+FAST_FEED = os.getenv('FAST_FEED', 'true').lower() == 'true'
 
 # dj-rest-auth settings
 REST_AUTH = {
@@ -83,6 +104,11 @@ REST_AUTH = {
     'PASSWORD_CHANGE_SERIALIZER': 'dj_rest_auth.serializers.PasswordChangeSerializer',
     'REGISTER_SERIALIZER': 'blog.serializer.CustomRegisterSerializer',
     'LOGIN_SERIALIZER': 'blog.serializer.CustomLoginSerializer',
+    'USE_JWT': API_AUTH == 'jwt',
+    'JWT_TOKEN_CLAIMS_SERIALIZER': 'blog.authentication.UserClaimsTokenSerializer',
+    'JWT_AUTH_COOKIE': 'my-app-auth',
+    'JWT_AUTH_REFRESH_COOKIE': 'my-refresh-token',
+    'JWT_AUTH_HTTPONLY': False,  # Clients read the refresh token from the response body
 }
 
 # Authentication settings
@@ -92,10 +118,10 @@ ACCOUNT_USERNAME_REQUIRED = True
 ACCOUNT_AUTHENTICATION_METHOD = 'email'
 ACCOUNT_EMAIL_VERIFICATION = 'optional'  # Change to 'mandatory' if you want to require email verification
 
-# JWT settings (optional, if you want to use JWT tokens)
-REST_USE_JWT = True
-JWT_AUTH_COOKIE = 'my-app-auth'
-JWT_AUTH_REFRESH_COOKIE = 'my-refresh-token'
+# JWT settings, used with API_AUTH = 'jwt' (dj-rest-auth reads them from REST_AUTH)
+REST_USE_JWT = REST_AUTH['USE_JWT']
+JWT_AUTH_COOKIE = REST_AUTH['JWT_AUTH_COOKIE']
+JWT_AUTH_REFRESH_COOKIE = REST_AUTH['JWT_AUTH_REFRESH_COOKIE']
 
 # Simple JWT settings
 from datetime import timedelta
@@ -121,7 +147,24 @@ DEFAULT_FROM_EMAIL = f"CyMate <{CYMATE_EMAIL_USERNAME}>"
 SERVER_EMAIL = CYMATE_EMAIL_USERNAME
 EMAIL_TIMEOUT = 60
 
+# Outbound email queue (blog/email_queue.py): emails are stored and sent by a
+# background thread per process, or by `manage.py send_queued_emails` when
+# EMAIL_QUEUE_BACKGROUND is off
+EMAIL_QUEUE_BACKGROUND = os.getenv('EMAIL_QUEUE_BACKGROUND', 'true').lower() == 'true'
+EMAIL_QUEUE_BATCH_SIZE = 20
+EMAIL_QUEUE_MAX_ATTEMPTS = 5
+EMAIL_QUEUE_RETRY_DELAY = 30  # Seconds, doubled after every failed attempt
+EMAIL_QUEUE_IDLE_TIMEOUT = 30  # Close the SMTP connection after this many idle seconds
+
 # Email verification settings
+# Codes live in EmailVerification rows by default. With
+# {'BACKEND': 'blog.verification_codes.CacheCodeStore', 'OPTIONS': {'cache': 'default', 'audit': False}}
+# they are kept in a shared cache (use Redis or Memcached with several
+# workers) and expire there; 'audit': True also records them in the database
+EMAIL_VERIFICATION_CODE_STORE = {
+    'BACKEND': os.getenv('EMAIL_VERIFICATION_CODE_STORE', 'blog.verification_codes.DatabaseCodeStore'),
+    'OPTIONS': {},
+}
 EMAIL_VERIFICATION_FROM_NAME = 'CyMate Team'
 EMAIL_VERIFICATION_SUPPORT_EMAIL = 'cymate@gmail.com'
 
@@ -129,10 +172,13 @@ EMAIL_VERIFICATION_SUPPORT_EMAIL = 'cymate@gmail.com'
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Compresses the response body, so it runs after (sits above) anything that changes it
+    'blog.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'blog.db_routing.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
@@ -176,6 +222,22 @@ DATABASES = {
     }
 }
 
+# Read replica (see blog/db_routing.py). Set DATABASE_REPLICA_NAME (and
+# DATABASE_REPLICA_HOST for a PostgreSQL replica on another server) to send
+# the reads of the list views there; unset, everything uses default.
+if os.getenv('DATABASE_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DATABASE_REPLICA_NAME'),
+        'TEST': {'MIRROR': 'default'},
+    }
+    if os.getenv('DATABASE_REPLICA_HOST'):
+        DATABASES['replica']['HOST'] = os.getenv('DATABASE_REPLICA_HOST')
+
+DATABASE_ROUTERS = ['blog.db_routing.ReplicaRouter']
+REPLICA_DATABASE = 'replica'
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '5'))  # Users read their own writes from default
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -219,6 +281,69 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL= '/media/'
 MEDIA_ROOT= BASE_DIR / "media"
 
+STORAGES = {
+    # Uploads are named by content hash and deduplicated, see blog/storage.py
+    'default': {
+        'BACKEND': 'blog.storage.ContentAddressedStorage',
+    },
+    # Content-hashed names plus .gz/.br copies, see blog/storage.py
+    'staticfiles': {
+        'BACKEND': 'blog.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Response compression (see blog/compression.py); Brotli needs the brotli package
+COMPRESSION_MIN_SIZE = 1024  # Bytes; smaller responses are sent as they are
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Serve STATIC_ROOT from Django when no proxy does (see blog/serving.py)
+SERVE_STATIC = os.getenv('SERVE_STATIC', 'false').lower() == 'true'
+STATIC_MAX_AGE = 60 * 60  # Seconds, for names without a content hash
+
+# How MEDIA_URL is served (see blog/serving.py): 'django' streams files itself,
+# 'x-accel-redirect' (nginx) and 'x-sendfile' (Apache, lighttpd) hand them to the proxy
+MEDIA_SERVING = os.getenv('MEDIA_SERVING', 'django')
+MEDIA_ACCEL_PREFIX = '/protected-media/'  # nginx internal location aliased to MEDIA_ROOT
+MEDIA_MAX_AGE = 24 * 60 * 60  # Seconds, for names without a content hash
+
+# Image variant generation (see blog/image_processing.py and blog/image_worker.py)
+IMAGE_PROCESSING_BACKGROUND = True  # Generate variants off-request; False renders inline
+IMAGE_WORKER_PROCESSES = 2  # Process pool size for Pillow work, 0 renders in the worker thread
+IMAGE_WORKER_THREADS = 2
+
+# Streaming and resumable uploads (see blog/uploads.py)
+POST_IMAGE_MAX_SIZE = 10 * 1024 * 1024  # 10MB
+PROFILE_IMAGE_MAX_SIZE = 5 * 1024 * 1024  # 5MB
+CHUNKED_UPLOAD_DIR = BASE_DIR / "upload_chunks"  # Partial uploads, kept outside MEDIA_ROOT
+CHUNKED_UPLOAD_MAX_CHUNK_SIZE = 5 * 1024 * 1024
+
+# Cache
+# Use a shared backend (Redis/Memcached) when running several workers so that
+# invalidations reach every process.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'cymate'),
+    }
+}
+
+# Author cards (see blog/author_cards.py)
+AUTHOR_CARD_CACHE_TIMEOUT = 60 * 60  # 1 hour
+
+# Home timelines (see blog/timelines.py)
+TIMELINE_FANOUT_LIMIT = 5000  # Authors with more followers are merged in at read time
+TIMELINE_FANOUT_BATCH_SIZE = 1000
+TIMELINE_BACKFILL_SIZE = 50  # Recent posts copied into a timeline on follow
+
+# Realtime notifications (see blog/realtime.py)
+# LocalBroker only reaches streams served by the same process; with several
+# workers use {'BACKEND': 'blog.realtime.RedisBroker', 'OPTIONS': {'url': ...}}
+NOTIFICATION_BROKER = {
+    'BACKEND': os.getenv('NOTIFICATION_BROKER_BACKEND', 'blog.realtime.LocalBroker'),
+    'OPTIONS': {'url': os.getenv('NOTIFICATION_BROKER_URL')} if os.getenv('NOTIFICATION_BROKER_URL') else {},
+}
+NOTIFICATION_STREAM_KEEPALIVE = 15  # Seconds between keepalive comments on idle streams
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
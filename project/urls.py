@@ -14,12 +14,14 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
 from django.shortcuts import redirect
 from dj_rest_auth.views import PasswordResetConfirmView
+from blog.serving import serve_media, serve_static
 
 urlpatterns = [
     path('', lambda request: redirect('/admin/', permanent=False), name='home'),
@@ -37,4 +39,12 @@ urlpatterns = [
     
     # Email verification URLs
     path('api/email-verification/', include('blog.email_verification_urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+    # Uploads, streamed or handed off to the proxy (MEDIA_SERVING)
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media),
+]
+
+if settings.SERVE_STATIC:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.STATIC_URL.lstrip('/')), serve_static),
+    ]